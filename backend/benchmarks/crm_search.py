@@ -0,0 +1,101 @@
+"""
+Benchmark for CRM call log search (core/search.py, migration 0018).
+
+Seeds a throwaway SQLite database with synthetic call logs and compares
+the FTS5 ranked search against the icontains (LIKE '%...%') scan it replaces.
+
+    python benchmarks/crm_search.py                    # 1,000,000 call logs
+    python benchmarks/crm_search.py --logs 200000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel.settings')
+
+import django
+from django.conf import settings
+
+WORDS = (
+    'order late cold refund booking table birthday allergy peanut delivery rider wrong meal spicy '
+    'vegetarian invoice payment mpesa receipt complaint praise waiter friday weekend parking event '
+    'catering wedding chapati pilau nyama choma ugali sukuma juice cake reservation cancel change'
+).split()
+NAMES = 'Wanjiru Otieno Achieng Kamau Njeri Mutua Akinyi Kiprop Wafula Chebet'.split()
+
+
+def seed(logs, batch=20000):
+    from core.models import User, ReceptionistProfile, CRMCallLog
+
+    rng = random.Random(42)
+    # Zipf-like vocabulary: the domain words plus a long tail, as in real notes
+    vocabulary = WORDS + [f'{rng.choice(WORDS)[:3]}{i}' for i in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(weights)
+    cumulative = list(itertools.accumulate(weights))
+    desks = [
+        ReceptionistProfile.objects.create(user=User.objects.create(email=f'desk{i}@bench.local', role='receptionist'))
+        for i in range(10)
+    ]
+    for start in range(0, logs, batch):
+        CRMCallLog.objects.bulk_create(
+            CRMCallLog(
+                receptionist=rng.choice(desks),
+                customer_name=f'{rng.choice(NAMES)} {rng.choice(NAMES)}',
+                phone_number=f'07{rng.randint(10000000, 99999999)}',
+                reason_for_call=' '.join(rng.choices(WORDS, k=3)),
+                notes=' '.join(rng.choices(vocabulary, cum_weights=cumulative, k=25)),
+            )
+            for _ in range(min(batch, logs - start))
+        )
+
+
+def measure(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logs', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='hotel-bench-') as db_dir:
+        benchmark(args, db_dir)
+
+
+def benchmark(args, db_dir):
+    settings.DATABASES['default']['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+    django.setup()
+
+    from django.core.management import call_command
+    from core.models import CRMCallLog
+    from core.search import search_call_logs, _search_by_scan
+
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    seed(args.logs)
+    print(f"Seeded {args.logs:,} call logs in {time.perf_counter() - started:.1f}s\n")
+
+    queries = ['peanut allergy', '"cold chapati"', 'wedding cater', 'mpesa receipt refund']
+    print(f"{'query':25} {'LIKE scan ms':>13} {'FTS5 ms':>9} {'speedup':>8}")
+    for query in queries:
+        scan = measure(lambda: _search_by_scan(query.strip('"'), CRMCallLog.objects.all(), 50), args.repeat)
+        fts = measure(lambda: search_call_logs(query, limit=50), args.repeat)
+        print(f"{query:25} {scan:13.1f} {fts:9.1f} {scan / fts:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Simulation benchmark for the courier dispatcher (core/dispatch.py).
+
+Spreads couriers around the kitchen, feeds an hour of ready orders in
+one-minute batches (with a lunch-rush burst), releases couriers as their
+deliveries finish, and reports assignment latency for the grid index
+against a brute-force scan over every courier.
+
+    python benchmarks/dispatch.py                      # 500 couriers, 10k orders/hour
+    python benchmarks/dispatch.py --couriers 2000 --orders-per-hour 40000
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel.settings')
+
+import django
+
+django.setup()
+
+from core.dispatch import Dispatcher, distance_km, LOAD_PENALTY_KM  # noqa: E402
+
+
+def random_point(rng, origin, radius_km):
+    # Uniform over a disc, converted from km to degrees around the origin
+    r = radius_km * math.sqrt(rng.random())
+    theta = rng.random() * 2 * math.pi
+    lat = origin[0] + (r * math.cos(theta)) / 111.32
+    lng = origin[1] + (r * math.sin(theta)) / (111.32 * math.cos(math.radians(origin[0])))
+    return lat, lng
+
+
+def brute_force_nearest(index, point, trip_km):
+    # What a naive dispatcher does: score every courier on every order
+    best, best_cost = None, math.inf
+    for courier in index.couriers.values():
+        if courier.load >= courier.capacity or not courier.can_reach(trip_km):
+            continue
+        cost = distance_km(point, courier.position) + courier.load * LOAD_PENALTY_KM
+        if cost < best_cost:
+            best, best_cost = courier, cost
+    return best
+
+
+def simulate(couriers, orders_per_hour, minutes, seed, brute_force=False):
+    rng = random.Random(seed)
+    dispatcher = Dispatcher()
+    pickup = dispatcher.pickup
+    if brute_force:
+        dispatcher.index.nearest = lambda point, trip_km=None: brute_force_nearest(dispatcher.index, point, trip_km)
+
+    transports = ['bike'] * 6 + ['car'] * 3 + ['walk']
+    for courier_id in range(couriers):
+        dispatcher.index.upsert(courier_id, rng.choice(transports), random_point(rng, pickup, 8))
+
+    per_minute = orders_per_hour / 60
+    backlog = []
+    returns = []  # (minute, courier_id) heap of deliveries finishing
+    next_order_id = 0
+    assigned = 0
+    call_ms, per_order_us = [], []
+
+    for minute in range(minutes):
+        while returns and returns[0][0] <= minute:
+            _, courier_id = heapq.heappop(returns)
+            courier = dispatcher.index.couriers[courier_id]
+            # Couriers end up somewhere new after a drop-off
+            dispatcher.index.upsert(courier_id, courier.transport, random_point(rng, pickup, 8), courier.load - 1)
+
+        # Lunch rush: triple volume for a quarter of the hour
+        rate = per_minute * (3 if minutes // 3 <= minute < minutes // 3 + minutes // 4 else 1)
+        arrivals = int(rate) + (1 if rng.random() < rate % 1 else 0)
+        for _ in range(arrivals):
+            backlog.append((next_order_id, random_point(rng, pickup, 6)))
+            next_order_id += 1
+
+        started = time.perf_counter()
+        assignments = dispatcher.plan(backlog)
+        elapsed = time.perf_counter() - started
+        call_ms.append(elapsed * 1000)
+        if backlog:
+            per_order_us.append(elapsed * 1e6 / len(backlog))
+
+        for order_id, courier_id in assignments.items():
+            heapq.heappush(returns, (minute + rng.randint(8, 20), courier_id))
+        assigned += len(assignments)
+        backlog = [order for order in backlog if order[0] not in assignments]
+
+    return {
+        'orders': next_order_id,
+        'assigned': assigned,
+        'left_waiting': len(backlog),
+        'batch_p50_ms': statistics.median(call_ms),
+        'batch_max_ms': max(call_ms),
+        'per_order_p50_us': statistics.median(per_order_us),
+        'per_order_p99_us': statistics.quantiles(per_order_us, n=100)[98],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=500)
+    parser.add_argument('--orders-per-hour', type=int, default=10_000)
+    parser.add_argument('--minutes', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.couriers} couriers, {args.orders_per_hour:,} orders/hour, {args.minutes} simulated minutes\n")
+    for label, brute in (('grid index', False), ('brute force', True)):
+        result = simulate(args.couriers, args.orders_per_hour, args.minutes, args.seed, brute)
+        print(
+            f"{label:12} orders={result['orders']:,} assigned={result['assigned']:,} "
+            f"waiting={result['left_waiting']:,} | per order p50={result['per_order_p50_us']:.1f}us "
+            f"p99={result['per_order_p99_us']:.1f}us | batch p50={result['batch_p50_ms']:.2f}ms "
+            f"max={result['batch_max_ms']:.2f}ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Benchmark for the order/feedback/clock-in indexes (migrations 0012, 0017).
+
+Seeds a throwaway SQLite database, times the queries behind the hot
+endpoints with the indexes dropped (and the plain FK indexes on Order they
+replaced put back), recreates them and times them again.
+
+    python benchmarks/order_indexes.py                 # 1,000,000 orders
+    python benchmarks/order_indexes.py --orders 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel.settings')
+
+import django
+from django.conf import settings
+from django.db.models import BaseConstraint, Index
+
+INDEX_NAMES = {
+    'order_customer_created_idx',
+    'order_courier_status_idx',
+    'order_status_created_idx',
+    'feedback_meal_created_idx',
+    'clockin_one_open_shift',  # partial unique constraint, also the open-shift index
+}
+# The single-column FK indexes on Order that migration 0012 dropped in favour of the composites
+FK_INDEXES = [
+    Index(fields=['customer'], name='bench_order_customer_fk'),
+    Index(fields=['delivery_person'], name='bench_order_courier_fk'),
+]
+
+
+def seed(orders, customers, couriers, meals, batch=20000):
+    from django.db import connection
+    from django.utils import timezone
+    from core.models import User, Meal, Order, Feedback, ClockInRecord
+
+    rng = random.Random(42)
+    now = timezone.now()
+
+    User.objects.bulk_create(
+        [User(email=f'customer{i}@bench.local', role='online_customer', password='!') for i in range(customers)]
+        + [User(email=f'courier{i}@bench.local', role='delivery', password='!') for i in range(couriers)]
+        + [User(email=f'waiter{i}@bench.local', role='waiter', password='!') for i in range(couriers)]
+    )
+    customer_ids = list(User.objects.filter(role='online_customer').values_list('id', flat=True))
+    courier_ids = list(User.objects.filter(role='delivery').values_list('id', flat=True))
+    waiter_ids = list(User.objects.filter(role='waiter').values_list('id', flat=True))
+
+    Meal.objects.bulk_create(Meal(name=f'Meal {i}', description='', price=100 + i) for i in range(meals))
+    meal_ids = list(Meal.objects.values_list('id', flat=True))
+
+    statuses = [s for s, _ in Order.STATUS_CHOICES]
+    for start in range(0, orders, batch):
+        Order.objects.bulk_create(
+            Order(
+                customer_id=rng.choice(customer_ids),
+                meal_id=rng.choice(meal_ids),
+                status=rng.choice(statuses),
+                is_delivery=True,
+                delivery_person_id=rng.choice(courier_ids),
+            )
+            for _ in range(min(batch, orders - start))
+        )
+    # auto_now_add ignores explicit values, so spread the timestamps over a year afterwards
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE core_order SET created_at = "
+            "datetime('now', '-' || (abs(random()) % 31536000) || ' seconds')"
+        )
+
+    delivered = Order.objects.filter(status='delivered').values_list('id', 'customer_id', 'meal_id')
+    Feedback.objects.bulk_create(
+        (Feedback(order_id=o, customer_id=c, meal_id=m, rating=rng.randint(1, 5), tip=rng.randint(0, 200))
+         for o, c, m in delivered.iterator()),
+        batch_size=batch,
+    )
+
+    ClockInRecord.objects.bulk_create(
+        ClockInRecord(user_id=w, clock_in_time=now - timedelta(days=d), clock_out_time=now - timedelta(days=d, hours=-8))
+        for w in waiter_ids for d in range(1, 365)
+    )
+    ClockInRecord.objects.bulk_create(ClockInRecord(user_id=w) for w in waiter_ids[::2])
+
+    return customer_ids, courier_ids, meal_ids, waiter_ids
+
+
+def scenarios(customer_ids, courier_ids, meal_ids, waiter_ids):
+    from core.models import Order, Feedback, ClockInRecord
+
+    rng = random.Random(7)
+    return {
+        'my_orders (customer, -created_at)': lambda: list(
+            Order.objects.filter(customer_id=rng.choice(customer_ids)).order_by('-created_at').values('id')
+        ),
+        'courier orders (delivery_person, status)': lambda: list(
+            Order.objects.filter(delivery_person_id=rng.choice(courier_ids), status='ready').values('id')
+        ),
+        'status board (status, -created_at)': lambda: list(
+            Order.objects.filter(status='pending').order_by('-created_at').values('id')[:50]
+        ),
+        'meal_feedback (meal, -created_at)': lambda: list(
+            Feedback.objects.filter(meal_id=rng.choice(meal_ids)).order_by('-created_at').values('id')[:50]
+        ),
+        'open shift (user, clock_out IS NULL)': lambda: ClockInRecord.objects.filter(
+            user_id=rng.choice(waiter_ids), clock_out_time__isnull=True
+        ).first(),
+    }
+
+
+def benchmarked_indexes():
+    from core.models import Order, Feedback, ClockInRecord
+
+    return [
+        (model, index)
+        for model in (Order, Feedback, ClockInRecord)
+        for index in [*model._meta.indexes, *model._meta.constraints]
+        if index.name in INDEX_NAMES
+    ]
+
+
+def drop(editor, model, index):
+    if isinstance(index, BaseConstraint):
+        editor.remove_constraint(model, index)
+    else:
+        editor.remove_index(model, index)
+
+
+def create(editor, model, index):
+    if isinstance(index, BaseConstraint):
+        editor.add_constraint(model, index)
+    else:
+        editor.add_index(model, index)
+
+
+def measure(cases, repeat):
+    results = {}
+    for name, run in cases.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--couriers', type=int, default=200)
+    parser.add_argument('--meals', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='hotel-bench-') as db_dir:
+        benchmark(args, db_dir)
+
+
+def benchmark(args, db_dir):
+    settings.DATABASES['default']['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from core.models import Order
+
+    call_command('migrate', verbosity=0)
+    indexes = benchmarked_indexes()
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            drop(editor, model, index)
+        for index in FK_INDEXES:
+            editor.add_index(Order, index)
+
+    started = time.perf_counter()
+    ids = seed(args.orders, args.customers, args.couriers, args.meals)
+    print(f"Seeded {args.orders:,} orders in {time.perf_counter() - started:.1f}s")
+
+    cases = scenarios(*ids)
+    before = measure(cases, args.repeat)
+
+    with connection.schema_editor() as editor:
+        for index in FK_INDEXES:
+            editor.remove_index(Order, index)
+        for model, index in indexes:
+            create(editor, model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    after = measure(cases, args.repeat)
+
+    print(f"\n{'query':45} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in cases:
+        print(f"{name:45} {before[name]:10.2f} {after[name]:10.2f} {before[name] / after[name]:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
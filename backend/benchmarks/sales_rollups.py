@@ -0,0 +1,108 @@
+"""
+Benchmark for the sales rollups (core/sales.py, migration 0021).
+
+Seeds a throwaway SQLite database with a year of delivered orders and tips,
+builds the rollups, then compares reports answered from them against the
+same GROUP BY over orders joined with meals and feedback.
+
+    python benchmarks/sales_rollups.py                 # 1,000,000 orders
+    python benchmarks/sales_rollups.py --orders 200000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel.settings')
+
+import django
+from django.conf import settings
+
+
+def seed(orders, batch=20000):
+    from django.utils import timezone
+    from core.models import User, Meal, Order, Feedback
+
+    rng = random.Random(42)
+    User.objects.bulk_create(User(email=f'rider{i}@bench.local', role='delivery', password='!') for i in range(40))
+    User.objects.bulk_create(User(email=f'guest{i}@bench.local', role='online_customer', password='!') for i in range(2000))
+    couriers = list(User.objects.filter(role='delivery').values_list('id', flat=True)) + [None]
+    customers = list(User.objects.filter(role='online_customer').values_list('id', flat=True))
+    Meal.objects.bulk_create(
+        Meal(name=f'Meal {i}', description='...', price=Decimal(rng.randrange(50, 1500, 10))) for i in range(60)
+    )
+    meals = list(Meal.objects.values_list('id', flat=True))
+
+    now = timezone.now()
+    for start in range(0, orders, batch):
+        created = Order.objects.bulk_create(
+            Order(
+                customer_id=rng.choice(customers), meal_id=rng.choice(meals), status='delivered',
+                delivery_person_id=rng.choice(couriers), delivered_at=now - timedelta(minutes=rng.randrange(525600)),
+            )
+            for _ in range(min(batch, orders - start))
+        )
+        Feedback.objects.bulk_create(
+            Feedback(order=order, meal_id=order.meal_id, customer_id=order.customer_id, rating=5, tip=rng.choice((20, 50, 100)))
+            for order in created if rng.random() < 0.3
+        )
+    return now
+
+
+def measure(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='hotel-bench-') as db_dir:
+        benchmark(args, db_dir)
+
+
+def benchmark(args, db_dir):
+    settings.DATABASES['default']['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+    django.setup()
+
+    from django.core.management import call_command
+    from core.models import Order
+    from core.sales import rebuild, rollup_rows, sales_report
+
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    now = seed(args.orders)
+    print(f"Seeded {args.orders:,} delivered orders in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    rows = rebuild()
+    print(f"Built {rows:,} rollup rows in {time.perf_counter() - started:.1f}s\n")
+
+    week, year = now - timedelta(days=7), now - timedelta(days=365)
+    cases = [
+        ('per meal per hour, week', 'hour', week, ['meal']),
+        ('per courier per day, year', 'day', year, ['staff']),
+        ('per meal per day, year', 'day', year, ['meal']),
+    ]
+    print(f"{'report':28} {'orders GROUP BY ms':>19} {'rollup ms':>10} {'speedup':>8}")
+    for label, period, start, group in cases:
+        raw = measure(lambda: list(rollup_rows(Order.objects.filter(delivered_at__gte=start, delivered_at__lt=now), period)), args.repeat)
+        rolled = measure(lambda: list(sales_report(start, now, period, group)), args.repeat)
+        print(f"{label:28} {raw:19.1f} {rolled:10.1f} {raw / rolled:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
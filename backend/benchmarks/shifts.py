@@ -0,0 +1,87 @@
+"""
+Benchmark for the shift analytics report (core/shifts.py).
+
+Seeds a throwaway SQLite database with several years of clock-in records
+for a few hundred staff, then times shift_report() over growing ranges:
+the aggregation alone (fetching the clipped shifts and sweeping them for
+hours, overtime and headcount) and the whole report around it.
+
+    python benchmarks/shifts.py                        # 300 staff, 3 years
+    python benchmarks/shifts.py --staff 800 --years 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel.settings')
+
+import django
+from django.conf import settings
+
+
+def seed(staff, years, batch=20000):
+    from django.utils import timezone
+    from core.models import User, ClockInRecord
+
+    rng = random.Random(42)
+    User.objects.bulk_create(User(email=f'waiter{i}@bench.local', role='waiter', password='!') for i in range(staff))
+    waiter_ids = list(User.objects.filter(role='waiter').values_list('id', flat=True))
+
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    records = []
+    for user_id in waiter_ids:
+        for day in range(1, 365 * years):
+            if rng.random() < 0.3:  # days off
+                continue
+            start = today - timedelta(days=day, hours=-rng.choice((6, 10, 14)), minutes=-rng.randint(0, 59))
+            records.append(ClockInRecord(
+                user_id=user_id, clock_in_time=start, clock_out_time=start + timedelta(hours=rng.uniform(4, 11)),
+            ))
+    ClockInRecord.objects.bulk_create(records, batch_size=batch)
+    return len(records), today
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--staff', type=int, default=300)
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='hotel-bench-') as db_dir:
+        benchmark(args, db_dir)
+
+
+def benchmark(args, db_dir):
+    settings.DATABASES['default']['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+    django.setup()
+
+    from django.core.management import call_command
+    from core.shifts import aggregate, clipped_shifts, shift_report
+
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    count, today = seed(args.staff, args.years)
+    print(f"Seeded {count:,} clock-in records in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'range':10} {'shifts':>9} {'sweep ms':>9} {'report ms':>10}")
+    for label, days in (('1 week', 7), ('1 month', 30), ('1 year', 365), (f'{args.years} years', 365 * args.years)):
+        start = today - timedelta(days=days)
+        shifts = clipped_shifts(start, today)
+
+        started = time.perf_counter()
+        aggregate(shifts)
+        queried = time.perf_counter()
+        shift_report(start, today)
+        reported = time.perf_counter()
+
+        print(f"{label:10} {shifts.count():9,} {(queried - started) * 1000:9.1f} {(reported - queried) * 1000:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
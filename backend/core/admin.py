@@ -1,8 +1,11 @@
 from django.contrib import admin
+
+from .search import search_call_logs
 from .models import (
     User,
     Meal,
     Order,
+    OrderEvent,
     WaiterProfile,
     Feedback,
     ClockInRecord,
@@ -36,6 +39,19 @@ class OrderAdmin(admin.ModelAdmin):
             kwargs["queryset"] = User.objects.filter(role__in=['onsite_customer', 'online_customer'])
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ('order', 'from_status', 'to_status', 'actor', 'delivery_person', 'created_at')
+    list_filter = ('to_status',)
+    raw_id_fields = ('order', 'actor', 'delivery_person')
+
+    # Append-only: transitions are written by core/order_state.py
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
     list_display = ('order', 'rating', 'tip', 'created_at')
@@ -48,16 +64,10 @@ class FeedbackAdmin(admin.ModelAdmin):
 
 @admin.register(WaiterProfile)
 class WaiterProfileAdmin(admin.ModelAdmin):
-    list_display = ["user", "age", "gender", "table_assigned", "total_tips", "votes_received"]  # ✅
-    readonly_fields = ['get_total_tips', 'age', 'gender', 'get_votes']
-
-    def get_total_tips(self, obj):
-        return obj.total_tips() 
-    get_total_tips.short_description = "Total Tips"
-
-    def get_votes(self, obj):
-        return obj.votes_received() 
-    get_votes.short_description = "Votes"
+    # Running totals are stored on the profile (core/ledger.py), no per-row aggregates
+    list_display = ["user", "age", "gender", "table_assigned", "tips_earned", "votes"]
+    list_select_related = ["user"]
+    readonly_fields = ['tips_earned', 'age', 'gender', 'votes']
 
 
 @admin.register(ClockInRecord)
@@ -89,6 +99,13 @@ class CRMCallLogAdmin(admin.ModelAdmin):
     search_fields = ('customer_name',)
     exclude = ('notes',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index over name, reason and notes (core/search.py) instead of LIKE scans
+        if not search_term.strip():
+            return queryset, False
+        ids = [log.id for log in search_call_logs(search_term, queryset, limit=1000)]
+        return queryset.filter(id__in=ids), False
+
 @admin.register(OnlineCustomerProfile)
 class OnlineCustomerAdmin(admin.ModelAdmin):
     list_display = ['user', 'full_name', 'location', 'member_since']
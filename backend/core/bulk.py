@@ -0,0 +1,335 @@
+# core/bulk.py
+
+import codecs
+import csv
+import json
+from datetime import date, datetime
+from itertools import count, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .crm import find_customers, get_follow_up_scheduler
+from .menu import bump_menu_version
+from .models import User, Meal, OnlineCustomerProfile, CRMCallLog
+from .phones import normalize_phone
+from .stats import bump, role_key
+from .utils import Echo, csv_safe, csv_unsafe
+
+CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+INVALID_PHONE = "Enter a valid phone number, e.g. 0712 345 678 or +254712345678."
+# Spreadsheets write booleans many ways; BooleanField itself only takes True/False/t/f/1/0
+BOOLEANS = {'true': True, 'yes': True, 'y': True, 'false': False, 'no': False, 'n': False}
+
+
+def format_for(filename):
+    """'csv' or 'ndjson' from a file name's extension, or None."""
+    for extension, fmt in EXTENSIONS.items():
+        if filename.lower().endswith(extension):
+            return fmt
+    return None
+
+
+def read_records(lines, fmt):
+    """
+    (line number, record) pairs from an iterable of text lines: CSV with a
+    header row, or one JSON object per line. A line that cannot be parsed
+    comes back as a ValidationError instead of a dict.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, {column: csv_unsafe(value) for column, value in record.items()}
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, ValidationError("Not valid JSON.")
+            continue
+        if not isinstance(record, dict):
+            yield number, ValidationError("Expected a JSON object.")
+            continue
+        yield number, record
+
+
+def first_undecodable_line(stream, encoding='utf-8-sig'):
+    """
+    Number of the first line of a binary stream that is not valid `encoding`,
+    or None. Rewinds the stream, so the import can then read it from the top.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        for number, line in enumerate(stream, 1):
+            try:
+                decoder.decode(line)
+            except UnicodeDecodeError:
+                return number
+        try:
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return number  # the file ends mid-character
+        return None
+    finally:
+        stream.seek(0)
+
+
+def error_dict(error):
+    if hasattr(error, 'error_dict'):
+        return error.message_dict
+    return {'non_field_errors': error.messages}
+
+
+class Dataset:
+    """
+    One importable/exportable table. Rows are validated one by one in Python
+    (model field validation, no queries), then per chunk against the database
+    (foreign keys, uniqueness), and the valid ones inserted with bulk_create.
+    bulk_create skips save() and signals, so insert() does their work here.
+    """
+    model = None
+    columns = ()         # accepted on import
+    export_columns = ()  # (header, values() lookup)
+    foreign_keys = ()    # columns holding ids, checked per chunk instead of per row
+
+    def build(self, record):
+        instance = self.model()
+        errors = {}
+        for column in self.columns:
+            value = record.get(column)
+            if value is None or value == '':
+                continue  # leaves the model default; clean_fields() flags required ones
+            field = self.model._meta.get_field(column)
+            if isinstance(value, str) and field.get_internal_type() == 'BooleanField':
+                value = BOOLEANS.get(value.strip().lower(), value)
+            if column in self.foreign_keys:
+                try:
+                    value = field.target_field.to_python(value)
+                except ValidationError as exc:
+                    errors[column] = exc.messages
+                    continue
+            setattr(instance, field.attname, value)
+        try:
+            instance.clean_fields(exclude=[*self.foreign_keys, *self.skip_validation()])
+        except ValidationError as exc:
+            errors.update(exc.message_dict)
+        if errors:
+            raise ValidationError(errors)
+        return instance
+
+    def skip_validation(self):
+        return ()
+
+    def check(self, rows):
+        """{line: errors} for rows that are fine alone but not against the database."""
+        errors = {}
+        for column in self.foreign_keys:
+            field = self.model._meta.get_field(column)
+            ids = {getattr(instance, field.attname) for _, instance in rows}
+            found = set(field.related_model.objects.filter(pk__in=ids - {None}).values_list('pk', flat=True))
+            for line, instance in rows:
+                value = getattr(instance, field.attname)
+                if value is None:
+                    errors.setdefault(line, {})[column] = ["This field is required."]
+                elif value not in found:
+                    errors.setdefault(line, {})[column] = [f"No {field.related_model._meta.verbose_name} with id {value}."]
+        return errors
+
+    def insert(self, instances):
+        return self.model.objects.bulk_create(instances)
+
+    def export_queryset(self):
+        return self.model.objects.order_by('pk')
+
+
+class MealDataset(Dataset):
+    model = Meal
+    columns = ('name', 'description', 'price', 'is_available')
+    export_columns = (
+        ('id', 'id'), ('name', 'name'), ('description', 'description'), ('price', 'price'),
+        ('is_available', 'is_available'), ('created_at', 'created_at'),
+    )
+
+    def skip_validation(self):
+        return ('image',)
+
+    def insert(self, instances):
+        created = super().insert(instances)
+        bump({'meals': len(created)})
+        transaction.on_commit(bump_menu_version)
+        return created
+
+
+class CustomerDataset(Dataset):
+    """Online customers: each row creates the login (without a usable password) and the profile."""
+    model = OnlineCustomerProfile
+    columns = ('full_name', 'gender', 'date_of_birth', 'location', 'phone_number')
+    export_columns = (
+        ('email', 'user__email'), ('full_name', 'full_name'), ('gender', 'gender'),
+        ('date_of_birth', 'date_of_birth'), ('location', 'location'), ('phone_number', 'phone_number'),
+        ('member_since', 'member_since'),
+    )
+
+    def build(self, record):
+        errors = {}
+        try:
+            instance = super().build(record)
+        except ValidationError as exc:
+            instance, errors = None, exc.message_dict
+        email = User.objects.normalize_email(str(record.get('email') or '').strip())
+        try:
+            validate_email(email)
+        except ValidationError as exc:
+            errors['email'] = exc.messages
+        if record.get('phone_number') and not normalize_phone(str(record['phone_number'])):
+            errors['phone_number'] = [INVALID_PHONE]
+        if errors:
+            raise ValidationError(errors)
+        instance.email = email
+        return instance
+
+    def skip_validation(self):
+        return ('user',)
+
+    def check(self, rows):
+        errors = {}
+        seen = set(User.objects.filter(email__in=[instance.email for _, instance in rows]).values_list('email', flat=True))
+        for line, instance in rows:
+            if instance.email in seen:
+                errors[line] = {'email': ["A user with this email already exists."]}
+            seen.add(instance.email)
+        return errors
+
+    def insert(self, instances):
+        users = User.objects.bulk_create(
+            User(email=instance.email, role='online_customer', password=make_password(None)) for instance in instances
+        )
+        for instance, user in zip(instances, users):
+            instance.user_id = user.pk
+            instance.phone_e164 = normalize_phone(instance.phone_number)
+        created = super().insert(instances)
+        bump({'users': len(users), role_key('online_customer'): len(users)})
+        return created
+
+
+class CallLogDataset(Dataset):
+    model = CRMCallLog
+    columns = ('receptionist', 'customer_name', 'phone_number', 'call_time', 'reason_for_call', 'notes', 'follow_up_date')
+    foreign_keys = ('receptionist',)
+    export_columns = (
+        ('id', 'id'), ('receptionist', 'receptionist_id'), ('customer_name', 'customer_name'),
+        ('phone_number', 'phone_number'), ('phone_e164', 'phone_e164'), ('call_time', 'call_time'),
+        ('reason_for_call', 'reason_for_call'), ('notes', 'notes'), ('follow_up_date', 'follow_up_date'),
+        ('follow_up_done_at', 'follow_up_done_at'),
+    )
+
+    def build(self, record):
+        instance = super().build(record)
+        if not normalize_phone(instance.phone_number):
+            raise ValidationError({'phone_number': [INVALID_PHONE]})
+        if timezone.is_naive(instance.call_time):
+            instance.call_time = timezone.make_aware(instance.call_time)
+        return instance
+
+    def skip_validation(self):
+        return ('customer', 'follow_up_claimed_by')
+
+    def insert(self, instances):
+        # What CRMCallLog.save() does per row: E.164 copy and the customer link
+        for instance in instances:
+            instance.phone_e164 = normalize_phone(instance.phone_number)
+        customers = find_customers(instance.phone_e164 for instance in instances)
+        for instance in instances:
+            instance.customer_id = customers.get(instance.phone_e164)
+        created = super().insert(instances)
+        scheduler = get_follow_up_scheduler()
+        transaction.on_commit(lambda: [scheduler.schedule(log) for log in created if log.follow_up_date])
+        return created
+
+
+DATASETS = {
+    'meals': MealDataset(),
+    'customers': CustomerDataset(),
+    'call-logs': CallLogDataset(),
+}
+
+
+def import_records(dataset, records, chunk_size=CHUNK_SIZE):
+    """
+    Imports (line, record) pairs chunk by chunk, each chunk in its own
+    transaction. Invalid rows are skipped; yields one report per chunk:
+    {'chunk', 'rows', 'created', 'errors': [{'line', 'errors'}]}.
+    """
+    records = iter(records)
+    for number in count(1):
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        rows, errors = [], {}
+        for line, record in chunk:
+            try:
+                if isinstance(record, ValidationError):
+                    raise record
+                rows.append((line, dataset.build(record)))
+            except ValidationError as exc:
+                errors[line] = error_dict(exc)
+
+        created = 0
+        try:
+            with transaction.atomic():
+                errors.update(dataset.check(rows))
+                valid = [instance for line, instance in rows if line not in errors]
+                if valid:
+                    created = len(dataset.insert(valid))
+        except IntegrityError as exc:
+            # Lost a race with a concurrent writer (e.g. the same email); nothing from this chunk was kept
+            created = 0
+            for line, _ in rows:
+                errors.setdefault(line, {'non_field_errors': [str(exc)]})
+        yield {
+            'chunk': number,
+            'rows': len(chunk),
+            'created': created,
+            'errors': [{'line': line, 'errors': errors[line]} for line in sorted(errors)],
+        }
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return csv_safe(value)
+
+
+def export_lines(dataset, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the whole table as CSV or NDJSON text, a chunk of rows at a time,
+    straight off a database cursor (values_list().iterator()): memory stays
+    flat however many rows there are.
+    """
+    headers = [header for header, _ in dataset.export_columns]
+    rows = dataset.export_queryset().values_list(*[lookup for _, lookup in dataset.export_columns])
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(headers)
+    lines = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        if fmt == 'csv':
+            lines.append(writer.writerow([_csv_value(value) for value in row]))
+        else:
+            lines.append(json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n')
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
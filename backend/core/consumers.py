@@ -0,0 +1,78 @@
+# core/consumers.py
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from rest_framework.authtoken.models import Token
+
+from .crm import get_follow_up_scheduler
+from .realtime import get_broker
+
+ORDER_BOARD_ROLES = ['admin', 'waiter', 'cook', 'manager']
+FOLLOW_UP_ROLES = ['admin', 'receptionist']
+
+
+@sync_to_async
+def start_follow_up_scheduler():
+    # Loads pending follow-ups from the database; a no-op once it is running
+    get_follow_up_scheduler().start()
+
+
+@sync_to_async
+def get_token_user(key):
+    try:
+        return Token.objects.select_related('user').get(key=key).user
+    except Token.DoesNotExist:
+        return None
+
+
+async def order_board(scope, receive, send):
+    """
+    Raw ASGI WebSocket endpoint pushing order creation and status changes.
+    Connect with ws://host/ws/orders/?token=<api token>.
+    """
+    await _stream_events(scope, receive, send, ORDER_BOARD_ROLES, 'order.')
+
+
+async def follow_up_board(scope, receive, send):
+    """
+    Pushes CRM follow-ups to receptionist screens as they fall due (core/crm.py).
+    Connect with ws://host/ws/follow-ups/?token=<api token>. The first
+    connection starts the scheduler in this process.
+    """
+    await _stream_events(scope, receive, send, FOLLOW_UP_ROLES, 'crm.', on_accept=start_follow_up_scheduler)
+
+
+async def _stream_events(scope, receive, send, roles, prefix, on_accept=None):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    params = parse_qs(scope.get('query_string', b'').decode())
+    user = await get_token_user(params.get('token', [''])[0])
+    if user is None or not user.is_active or (user.role not in roles and not user.is_staff):
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    await send({'type': 'websocket.accept'})
+    if on_accept is not None:
+        await on_accept()
+    with get_broker().subscribe() as subscription:
+        forward = asyncio.ensure_future(_forward(subscription, send, prefix))
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+        finally:
+            forward.cancel()
+
+
+async def _forward(subscription, send, prefix):
+    # One broker carries every event; each board only forwards its own kind
+    while True:
+        event = await subscription.get()
+        if event['event'].startswith(prefix):
+            await send({'type': 'websocket.send', 'text': json.dumps(event)})
@@ -0,0 +1,304 @@
+# core/crm.py
+
+import heapq
+import logging
+import threading
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CRMCallLog, Order, OnlineCustomerProfile, OnsiteCustomerProfile
+from .phones import normalize_phone
+from .realtime import get_broker
+
+logger = logging.getLogger(__name__)
+
+RECENT_LIMIT = 10
+QUEUE_LIMIT = 100
+# A follow-up falls due at this local time on its follow_up_date
+FOLLOW_UP_TIME = time(8, 0)
+# A claim nobody completed or released within this long can be taken over
+CLAIM_SECONDS = 30 * 60
+
+
+def find_customer(phone_e164):
+    """The online or onsite customer profile registered with this number, or None."""
+    if not phone_e164:
+        return None
+    for model in (OnlineCustomerProfile, OnsiteCustomerProfile):
+        profile = model.objects.select_related('user').filter(phone_e164=phone_e164).first()
+        if profile is not None:
+            return profile
+    return None
+
+
+def find_customers(phones):
+    """{phone_e164: user id} for many numbers at once; online profiles win, as in find_customer()."""
+    phones = set(phones) - {''}
+    customers = {}
+    for model in (OnsiteCustomerProfile, OnlineCustomerProfile):
+        customers.update(model.objects.filter(phone_e164__in=phones).values_list('phone_e164', 'user_id'))
+    return customers
+
+
+def lookup_caller(phone, limit=RECENT_LIMIT):
+    """
+    Everything a receptionist needs while the phone rings, in three indexed
+    queries (four when the number belongs to an onsite customer, who is looked
+    up after the online profiles): who the number belongs to, their recent
+    calls (by number, so unregistered callers have history too) and their
+    recent orders.
+    Returns None when `phone` is not a valid number.
+    """
+    phone_e164 = normalize_phone(phone)
+    if not phone_e164:
+        return None
+
+    profile = find_customer(phone_e164)
+    calls = list(
+        CRMCallLog.objects.filter(phone_e164=phone_e164)
+        .order_by('-call_time')
+        .values('id', 'customer_name', 'call_time', 'reason_for_call', 'follow_up_date', 'receptionist__full_name')[:limit]
+    )
+    orders = []
+    if profile is not None:
+        orders = list(
+            Order.objects.filter(customer_id=profile.user_id)
+            .order_by('-created_at')
+            .values('id', 'meal__name', 'status', 'is_delivery', 'created_at')[:limit]
+        )
+
+    customer = None
+    if profile is not None:
+        customer = {
+            'id': profile.user_id,
+            'email': profile.user.email,
+            'full_name': profile.full_name,
+            'type': 'online' if isinstance(profile, OnlineCustomerProfile) else 'onsite',
+        }
+    return {'phone': phone_e164, 'customer': customer, 'recent_calls': calls, 'recent_orders': orders}
+
+
+# Follow-up queue
+
+def follow_up_due_at(follow_up_date):
+    due = getattr(settings, 'CRM_FOLLOW_UP_TIME', FOLLOW_UP_TIME)
+    return timezone.make_aware(datetime.combine(follow_up_date, due))
+
+
+def open_follow_ups():
+    # Matches the condition of crm_open_follow_up_idx so that index is used
+    return CRMCallLog.objects.filter(follow_up_date__isnull=False, follow_up_done_at__isnull=True)
+
+
+def claim_expiry(now=None):
+    return (now or timezone.now()) - timedelta(seconds=getattr(settings, 'CRM_FOLLOW_UP_CLAIM_SECONDS', CLAIM_SECONDS))
+
+
+def claimable_by(receptionist, now=None):
+    """Unclaimed, claimed by `receptionist` already, or claimed so long ago the claim lapsed."""
+    return (
+        Q(follow_up_claimed_by__isnull=True)
+        | Q(follow_up_claimed_by=receptionist)
+        | Q(follow_up_claimed_at__lt=claim_expiry(now))
+    )
+
+
+def due_follow_ups(receptionist, today=None, limit=QUEUE_LIMIT):
+    """
+    The work queue shown to one receptionist: open follow-ups due today or
+    overdue that nobody else holds, most overdue first, each with `overdue`.
+    """
+    today = today or timezone.localdate()
+    logs = list(
+        open_follow_ups()
+        .filter(claimable_by(receptionist), follow_up_date__lte=today)
+        .select_related('receptionist', 'follow_up_claimed_by')
+        .order_by('follow_up_date', 'call_time')[:limit]
+    )
+    for log in logs:
+        log.overdue = log.follow_up_date < today
+    return logs
+
+
+def claim_follow_up(log_id, receptionist):
+    """
+    Takes a due follow-up with one conditional UPDATE, so when two receptionists
+    claim the same row at once exactly one of them gets it. Re-claiming your
+    own refreshes the claim. Returns True if `receptionist` now holds it.
+    """
+    now = timezone.now()
+    return bool(
+        open_follow_ups()
+        .filter(claimable_by(receptionist, now), pk=log_id, follow_up_date__lte=timezone.localdate())
+        .update(follow_up_claimed_by=receptionist, follow_up_claimed_at=now)
+    )
+
+
+def release_follow_up(log_id, receptionist):
+    return bool(
+        open_follow_ups()
+        .filter(pk=log_id, follow_up_claimed_by=receptionist)
+        .update(follow_up_claimed_by=None, follow_up_claimed_at=None)
+    )
+
+
+def complete_follow_up(log_id, receptionist):
+    """Only the current holder can mark a follow-up done. Returns True if it did."""
+    return bool(
+        open_follow_ups()
+        .filter(pk=log_id, follow_up_claimed_by=receptionist)
+        .update(follow_up_done_at=timezone.now())
+    )
+
+
+def follow_up_event(logs):
+    return {
+        'event': 'crm.follow_up_due',
+        'follow_ups': [
+            {
+                'id': log.id,
+                'customer_name': log.customer_name,
+                'phone_number': log.phone_number,
+                'follow_up_date': log.follow_up_date.isoformat(),
+                'receptionist': log.receptionist_id,
+            }
+            for log in logs
+        ],
+    }
+
+
+class FollowUpScheduler:
+    """
+    Announces follow-ups on the realtime broker (core/realtime.py) the moment
+    they fall due. Pending due times sit in a heap, filled from the database
+    once at start and then by the CRMCallLog save/delete signals; the thread
+    sleeps until the earliest one, with no polling in between.
+    When an entry pops, the row is re-read and skipped if it was completed or
+    moved to another date meanwhile.
+
+    It runs in the process that serves the /ws/follow-ups/ clients, since the
+    broker is in-process: the first connection starts it (core/consumers.py).
+    Call logs saved by another process (a management command, a second
+    worker) are only picked up when it next starts.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.queued = set()  # heap entries, so a re-save does not announce twice
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopping = False
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.stopping = False
+            self.load()
+            self.thread = threading.Thread(target=self.run, name='crm-follow-ups', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def load(self):
+        """Queues everything not yet due, read through crm_open_follow_up_idx."""
+        now = timezone.now()
+        rows = open_follow_ups().filter(follow_up_date__gte=timezone.localdate()).values_list('id', 'follow_up_date')
+        entries = [(follow_up_due_at(day), log_id) for log_id, day in rows.iterator()]
+        with self.condition:
+            for entry in entries:
+                if entry[0] > now:
+                    self._push(entry)
+            self.condition.notify()
+
+    def _push(self, entry):
+        # Call with the condition held
+        if entry not in self.queued:
+            self.queued.add(entry)
+            heapq.heappush(self.heap, entry)
+
+    def schedule(self, log):
+        """Called after a call log is saved; only future due times need a wake-up."""
+        if not self.running or log.follow_up_date is None or log.follow_up_done_at is not None:
+            return
+        due_at = follow_up_due_at(log.follow_up_date)
+        if due_at <= timezone.now():
+            return
+        with self.condition:
+            self._push((due_at, log.id))
+            if self.heap[0] == (due_at, log.id):
+                self.condition.notify()
+
+    def cancel(self, log_id, follow_up_date):
+        """Called after a call log is deleted; drops its pending entry."""
+        if follow_up_date is None:
+            return
+        entry = (follow_up_due_at(follow_up_date), log_id)
+        with self.condition:
+            if entry in self.queued:
+                self.queued.discard(entry)
+                self.heap.remove(entry)
+                heapq.heapify(self.heap)
+
+    def pop_due(self):
+        """Blocks until something is due; returns [(due_at, id)], or [] when stopping."""
+        with self.condition:
+            while not self.stopping:
+                now = timezone.now()
+                if self.heap and self.heap[0][0] <= now:
+                    due = []
+                    while self.heap and self.heap[0][0] <= now:
+                        entry = heapq.heappop(self.heap)
+                        self.queued.discard(entry)
+                        due.append(entry)
+                    return due
+                self.condition.wait((self.heap[0][0] - now).total_seconds() if self.heap else None)
+            return []
+
+    def run(self):
+        while True:
+            due = self.pop_due()
+            if self.stopping:
+                return
+            try:
+                self.announce(due)
+            except Exception:
+                logger.exception("Could not announce due follow-ups")
+            finally:
+                close_old_connections()
+
+    def announce(self, due):
+        due_at = {log_id: at for at, log_id in due}
+        logs = [
+            log for log in open_follow_ups().filter(pk__in=due_at).order_by('follow_up_date', 'call_time')
+            if follow_up_due_at(log.follow_up_date) == due_at[log.id]
+        ]
+        if logs:
+            get_broker().publish(follow_up_event(logs))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_follow_up_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FollowUpScheduler()
+    return _scheduler
@@ -0,0 +1,331 @@
+# core/dispatch.py
+
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+# Orders a courier can carry at once, and how far from the kitchen they can deliver (km)
+CAPACITY = {'walk': 1, 'bike': 3, 'car': 5}
+MAX_RANGE_KM = {'walk': 2.0, 'bike': 10.0, 'car': None}
+LOAD_PENALTY_KM = 1.5     # one order already carried "costs" as much as 1.5 km of extra distance
+CELL_DEGREES = 0.01       # ~1.1 km grid cells
+REFRESH_SECONDS = 30      # rebuild the index from the database at most this often
+
+_COORDINATES = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*[, ]\s*(-?\d+(?:\.\d+)?)\s*$')
+
+
+def parse_location(text):
+    """Parses 'lat,lng' (or 'lat lng') into a float pair, or None for free-text locations."""
+    match = _COORDINATES.match(text or '')
+    if not match:
+        return None
+    lat, lng = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def distance_km(a, b):
+    """
+    Equirectangular distance between two (lat, lng) points. Within a city it is
+    indistinguishable from haversine and several times cheaper per courier.
+    """
+    x = (b[1] - a[1]) * math.cos(math.radians((a[0] + b[0]) / 2))
+    y = b[0] - a[0]
+    return 111.32 * math.hypot(x, y)
+
+
+class Courier:
+    __slots__ = ('id', 'transport', 'position', 'load', 'cell')
+
+    def __init__(self, id, transport, position, load=0):
+        self.id = id
+        self.transport = transport
+        self.position = position
+        self.load = load
+        self.cell = None
+
+    @property
+    def capacity(self):
+        return CAPACITY.get(self.transport, 1)
+
+    def can_reach(self, trip_km):
+        limit = MAX_RANGE_KM.get(self.transport)
+        return limit is None or trip_km is None or trip_km <= limit
+
+
+class CourierIndex:
+    """
+    Uniform lat/lng grid of couriers with spare capacity (full couriers are
+    unlinked until a delivery frees a slot). nearest() searches rings of cells
+    outward from the query point and stops once no unexplored ring can beat the
+    best candidate, so a lookup touches a handful of cells, not every courier.
+    """
+
+    def __init__(self, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.couriers = {}
+        self.available = 0
+        self.bounds = None  # (min_i, max_i, min_j, max_j) of cells ever occupied
+
+    def __len__(self):
+        return len(self.couriers)
+
+    def _cell(self, position):
+        return (math.floor(position[0] / self.cell_degrees), math.floor(position[1] / self.cell_degrees))
+
+    def upsert(self, courier_id, transport, position, load=None):
+        courier = self.couriers.get(courier_id)
+        if courier is None:
+            courier = self.couriers[courier_id] = Courier(courier_id, transport, position, load or 0)
+        else:
+            courier.transport = transport
+            courier.position = position
+            if load is not None:
+                courier.load = load
+        self._place(courier)
+        return courier
+
+    def add_load(self, courier, delta):
+        courier.load = max(courier.load + delta, 0)
+        self._place(courier)
+
+    def remove(self, courier_id):
+        courier = self.couriers.pop(courier_id, None)
+        if courier is not None:
+            self._unlink(courier)
+
+    def _place(self, courier):
+        cell = self._cell(courier.position) if courier.load < courier.capacity else None
+        if courier.cell == cell:
+            return
+        self._unlink(courier)
+        if cell is not None:
+            self.cells.setdefault(cell, set()).add(courier)
+            courier.cell = cell
+            self.available += 1
+            self._extend_bounds(cell)
+
+    def _unlink(self, courier):
+        if courier.cell is None:
+            return
+        members = self.cells[courier.cell]
+        members.discard(courier)
+        if not members:
+            del self.cells[courier.cell]
+        courier.cell = None
+        self.available -= 1
+
+    def _extend_bounds(self, cell):
+        i, j = cell
+        if self.bounds is None:
+            self.bounds = (i, i, j, j)
+        else:
+            min_i, max_i, min_j, max_j = self.bounds
+            self.bounds = (min(min_i, i), max(max_i, i), min(min_j, j), max(max_j, j))
+
+    def nearest(self, point, trip_km=None):
+        """Cheapest courier with spare capacity by distance + load penalty, or None."""
+        if not self.cells:
+            return None
+        ci, cj = self._cell(point)
+        min_i, max_i, min_j, max_j = self.bounds
+        max_ring = max(abs(ci - min_i), abs(ci - max_i), abs(cj - min_j), abs(cj - max_j))
+
+        # When few couriers are free, scanning them beats walking mostly empty rings
+        if (2 * max_ring + 1) ** 2 > 4 * self.available:
+            return self._best(point, trip_km, (c for members in self.cells.values() for c in members))
+
+        # Smallest cell side in km at this latitude, for the ring lower bound
+        cell_km = self.cell_degrees * 111.32 * max(math.cos(math.radians(point[0])), 0.01)
+        best, best_cost = None, math.inf
+        for ring in range(max_ring + 1):
+            if (ring - 1) * cell_km >= best_cost:
+                break
+            candidates = (c for cell in self._ring(ci, cj, ring) for c in self.cells.get(cell, ()))
+            courier, cost = self._best(point, trip_km, candidates, with_cost=True)
+            if cost < best_cost:
+                best, best_cost = courier, cost
+        return best
+
+    @staticmethod
+    def _best(point, trip_km, candidates, with_cost=False):
+        best, best_cost = None, math.inf
+        for courier in candidates:
+            if not courier.can_reach(trip_km):
+                continue
+            cost = distance_km(point, courier.position) + courier.load * LOAD_PENALTY_KM
+            if cost < best_cost:
+                best, best_cost = courier, cost
+        return (best, best_cost) if with_cost else best
+
+    @staticmethod
+    def _ring(ci, cj, ring):
+        if ring == 0:
+            yield (ci, cj)
+            return
+        for d in range(-ring, ring + 1):
+            yield (ci - ring, cj + d)
+            yield (ci + ring, cj + d)
+        for d in range(-ring + 1, ring):
+            yield (ci + d, cj - ring)
+            yield (ci + d, cj + ring)
+
+
+class Dispatcher:
+    """
+    Assigns ready delivery orders to couriers from an in-memory CourierIndex.
+    The index is rebuilt from the database every REFRESH_SECONDS and kept current
+    in between by location updates and the assignments made here.
+    """
+
+    def __init__(self):
+        self.index = CourierIndex()
+        self.pickup = parse_location(getattr(settings, 'DISPATCH_PICKUP_LOCATION', '')) or (0.0, 0.0)
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        from .models import DeliveryPersonnelProfile, Order
+
+        loads = dict(
+            Order.objects.filter(status='ready', delivery_person__isnull=False)
+            .values_list('delivery_person').order_by().annotate(n=models.Count('id'))
+        )
+        index = CourierIndex()
+        profiles = DeliveryPersonnelProfile.objects.filter(user__is_active=True).values_list(
+            'user_id', 'transport_method', 'current_location'
+        )
+        for user_id, transport, location in profiles.iterator():
+            position = parse_location(location)
+            if position is not None:
+                index.upsert(user_id, transport, position, loads.get(user_id, 0))
+        self.index = index
+        self.loaded_at = time.monotonic()
+
+    def update_courier(self, user_id, transport, location):
+        position = parse_location(location)
+        with self.lock:
+            if position is None:
+                self.index.remove(user_id)
+            else:
+                self.index.upsert(user_id, transport, position)
+
+    def move_courier(self, user_id, position):
+        """Moves an indexed courier without touching transport or load."""
+        with self.lock:
+            courier = self.index.couriers.get(user_id)
+            if courier is not None:
+                self.index.upsert(user_id, courier.transport, position)
+
+    def release(self, user_id):
+        """Frees one slot when a courier completes a delivery."""
+        with self.lock:
+            courier = self.index.couriers.get(user_id)
+            if courier is not None:
+                self.index.add_load(courier, -1)
+
+    def plan(self, orders):
+        """
+        Greedy batch assignment, oldest order first. Each pick raises that courier's
+        load, so a burst of ready orders spreads across nearby couriers instead of
+        piling onto the closest one. Returns {order_id: courier_id}; unmatched orders are left out.
+        """
+        assignments = {}
+        for order_id, dropoff in orders:
+            trip_km = distance_km(self.pickup, dropoff) if dropoff else None
+            courier = self.index.nearest(self.pickup, trip_km)
+            if courier is None:
+                continue
+            self.index.add_load(courier, 1)
+            assignments[order_id] = courier.id
+        return assignments
+
+    def dispatch(self, orders=None):
+        """
+        Assigns the given (or all) ready, unassigned delivery orders and writes the
+        result with one conditional UPDATE per courier. Orders that someone else
+        assigned (or moved on) meanwhile are left alone and give the courier's slot
+        back. Each assignment is logged as an OrderEvent and published to the order
+        board. Returns {order_id: courier_id} for the orders actually assigned.
+        """
+        from .models import Order, OrderEvent
+        from .realtime import publish_order_event
+
+        pending = Order.objects.filter(status='ready', is_delivery=True, delivery_person__isnull=True)
+        if orders is not None:
+            pending = pending.filter(pk__in=[o.pk for o in orders])
+        rows = pending.order_by('created_at').values_list(
+            'id', 'customer__online_profile__location', 'meal_id', 'customer_id'
+        )
+        batch, details = [], {}
+        for order_id, location, meal_id, customer_id in rows:
+            batch.append((order_id, parse_location(location)))
+            details[order_id] = (meal_id, customer_id)
+        if not batch:
+            return {}
+
+        with self.lock:
+            if time.monotonic() - self.loaded_at > REFRESH_SECONDS:
+                self.refresh()
+            planned = self.plan(batch)
+
+        by_courier = {}
+        for order_id, courier_id in planned.items():
+            by_courier.setdefault(courier_id, []).append(order_id)
+        assignments, lost = {}, {}
+        now = timezone.now()
+        with transaction.atomic():
+            for courier_id, order_ids in by_courier.items():
+                # Someone may have assigned by hand meanwhile; never overwrite that
+                updated = Order.objects.filter(pk__in=order_ids, status='ready', delivery_person__isnull=True).update(
+                    delivery_person_id=courier_id, updated_at=now
+                )
+                if updated < len(order_ids):
+                    # Lost a race for some: keep those that carry our write
+                    won = set(Order.objects.filter(
+                        pk__in=order_ids, delivery_person_id=courier_id, updated_at=now
+                    ).values_list('id', flat=True))
+                    lost[courier_id] = len(order_ids) - len(won)
+                    order_ids = [order_id for order_id in order_ids if order_id in won]
+                assignments.update((order_id, courier_id) for order_id in order_ids)
+            OrderEvent.objects.bulk_create(
+                OrderEvent(order_id=order_id, from_status='ready', to_status='ready', delivery_person_id=courier_id)
+                for order_id, courier_id in assignments.items()
+            )
+
+        if lost:
+            with self.lock:
+                for courier_id, count in lost.items():
+                    courier = self.index.couriers.get(courier_id)
+                    if courier is not None:
+                        self.index.add_load(courier, -count)
+
+        assigned = [
+            Order(
+                id=order_id, status='ready', meal_id=details[order_id][0], customer_id=details[order_id][1],
+                delivery_person_id=courier_id, is_delivery=True, updated_at=now,
+            )
+            for order_id, courier_id in assignments.items()
+        ]
+        transaction.on_commit(lambda: [publish_order_event(order, 'order.assigned', 'ready') for order in assigned])
+        return assignments
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = Dispatcher()
+    return _dispatcher
@@ -0,0 +1,163 @@
+# core/images.py
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .models import Meal, ProofOfDelivery, DeliveryPersonnelProfile, ReceptionistProfile
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in px of each generated thumbnail
+THUMBNAIL_SIZES = (160, 480)
+THUMBNAIL_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+SAVE_OPTIONS = {
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 80, 'optimize': True},
+}
+# Originals re-encoded to drop their EXIF stay close to the upload
+ORIGINAL_OPTIONS = {
+    'JPEG': {'quality': 92, 'optimize': True},
+    'WEBP': {'quality': 92},
+    'PNG': {'optimize': True},
+}
+
+# model -> (image field, JSON field holding width/height/thumbnails)
+IMAGE_FIELDS = {
+    Meal: ('image', 'image_meta'),
+    ProofOfDelivery: ('image', 'image_meta'),
+    DeliveryPersonnelProfile: ('profile_picture', 'profile_picture_meta'),
+    ReceptionistProfile: ('profile_picture', 'profile_picture_meta'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+                    thread_name_prefix='thumbnails',
+                )
+    return _executor
+
+
+def thumbnail_name(name, size):
+    stem, _ = os.path.splitext(name)
+    extension = 'webp' if THUMBNAIL_FORMAT == 'WEBP' else 'jpg'
+    return f"thumbs/{stem}_{size}.{extension}"
+
+
+def strip_metadata(name, image, image_format, icc_profile=None):
+    """
+    Re-encodes an original that carries EXIF (GPS position, camera serials...)
+    without it, rotation already applied, and returns its new name. The
+    colour profile is kept.
+    """
+    buffer = BytesIO()
+    options = dict(ORIGINAL_OPTIONS.get(image_format, {}))
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(buffer, image_format, **options)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def render_thumbnails(name):
+    """
+    Reads an uploaded image from storage, replaces it with a copy without
+    EXIF if it had any, and writes one thumbnail per size, re-encoded without
+    EXIF/ICC metadata. Returns the meta dict to store; its source is the
+    name of the (possibly new) original.
+    """
+    with default_storage.open(name, 'rb') as f:
+        with Image.open(f) as original:
+            image_format = original.format
+            has_exif = bool(original.getexif())
+            icc_profile = original.info.get('icc_profile')
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    if has_exif:
+        name = strip_metadata(name, image, image_format, icc_profile)
+    width, height = image.size
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    if THUMBNAIL_FORMAT == 'JPEG' and image.mode == 'RGBA':
+        image = image.convert('RGB')
+
+    thumbnails = {}
+    for size in THUMBNAIL_SIZES:
+        thumb = image.copy()
+        thumb.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        # A fresh save carries no exif/icc unless passed explicitly
+        thumb.save(buffer, THUMBNAIL_FORMAT, **SAVE_OPTIONS[THUMBNAIL_FORMAT])
+        # Content-addressed storage: re-rendering identical bytes reuses the file
+        thumbnails[str(size)] = default_storage.save(thumbnail_name(name, size), ContentFile(buffer.getvalue()))
+
+    return {'source': name, 'width': width, 'height': height, 'thumbnails': thumbnails}
+
+
+def is_referenced(name):
+    return any(model.objects.filter(**{image_field: name}).exists() for model, (image_field, _) in IMAGE_FIELDS.items())
+
+
+def process_image(model, pk, name):
+    """
+    Renders thumbnails and stores the meta (and the stripped original, if
+    EXIF had to go), unless the image was replaced meanwhile.
+    """
+    image_field, meta_field = IMAGE_FIELDS[model]
+    meta = render_thumbnails(name)
+    changes = {meta_field: meta}
+    if meta['source'] != name:
+        changes[image_field] = meta['source']
+    if model is Meal:
+        changes['updated_at'] = timezone.now()  # .update() skips auto_now; the menu version reads updated_at
+    updated = model.objects.filter(pk=pk, **{image_field: name}).update(**changes)
+    if updated and model is Meal:
+        from .menu import bump_menu_version
+        bump_menu_version()  # .update() skips post_save, and the menu ships thumbnail URLs
+    if updated and meta['source'] != name and not is_referenced(name):
+        # Content-addressed: another row with the same upload keeps the file until it is processed too
+        default_storage.delete(name)
+    return meta
+
+
+def _run_in_worker(model, pk, name):
+    close_old_connections()
+    try:
+        process_image(model, pk, name)
+    except Exception:
+        logger.exception("Thumbnail generation failed for %s #%s (%s)", model.__name__, pk, name)
+    finally:
+        connection.close()
+
+
+def needs_processing(instance):
+    image_field, meta_field = IMAGE_FIELDS[type(instance)]
+    image = getattr(instance, image_field)
+    return bool(image) and getattr(instance, meta_field).get('source') != image.name
+
+
+def enqueue(instance):
+    """Hands the image to the worker pool once the upload's transaction commits."""
+    image_field, _ = IMAGE_FIELDS[type(instance)]
+    model, pk, name = type(instance), instance.pk, getattr(instance, image_field).name
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, model, pk, name))
+
+
+def thumbnail_urls(meta):
+    return {size: default_storage.url(path) for size, path in (meta or {}).get('thumbnails', {}).items()}
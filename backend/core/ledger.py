@@ -0,0 +1,94 @@
+# core/ledger.py
+
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F
+
+from .models import Feedback, DeliveryPersonnelProfile, WaiterProfile
+
+# A courier is upvoted by feedback rated at least this
+UPVOTE_MIN_RATING = 4
+
+# Feedback columns a ledger entry depends on, in the order credits() takes them
+FEEDBACK_FIELDS = ('tip', 'rating', 'delivery_personnel_id', 'customer_id')
+
+
+def credits(tip, rating, delivery_personnel_id, customer_id):
+    """
+    What one Feedback row adds to each person's running totals:
+    {(profile model, user_id): {field: delta}}. Waiters are credited for
+    feedback filed under them, like WaiterProfile.total_tips() always did.
+    """
+    tip = Decimal(str(tip or 0))
+    entries = {}
+    if delivery_personnel_id:
+        entries[(DeliveryPersonnelProfile, delivery_personnel_id)] = {
+            'tips_earned': tip,
+            'upvotes': int(rating is not None and rating >= UPVOTE_MIN_RATING),
+        }
+    if customer_id:
+        entries[(WaiterProfile, customer_id)] = {'tips_earned': tip, 'votes': 1}
+    return entries
+
+
+def post(new=None, old=None):
+    """
+    Moves the running totals from `old` to `new` (FEEDBACK_FIELDS tuples, None
+    for a create or delete) with one F() UPDATE per affected profile, so
+    concurrent feedback never loses an increment.
+    """
+    deltas = credits(*new) if new else {}
+    for key, fields in (credits(*old) if old else {}).items():
+        merged = deltas.setdefault(key, {})
+        for field, value in fields.items():
+            merged[field] = merged.get(field, 0) - value
+
+    for (model, user_id), fields in deltas.items():
+        changes = {field: F(field) + value for field, value in fields.items() if value}
+        if changes:
+            model.objects.filter(user_id=user_id).update(**changes)
+
+
+def feedback_row(instance):
+    return tuple(getattr(instance, field) for field in FEEDBACK_FIELDS)
+
+
+@transaction.atomic
+def reconcile():
+    """
+    Recomputes every courier's and waiter's totals from Feedback with one
+    grouped query per role and rewrites the profiles that drifted.
+    Returns the number of profiles corrected.
+    """
+    couriers = {
+        row['delivery_personnel']: (row['tips'] or Decimal(0), row['upvotes'])
+        for row in Feedback.objects.filter(delivery_personnel__isnull=False)
+        .values('delivery_personnel').order_by()
+        .annotate(
+            tips=models.Sum('tip'),
+            upvotes=models.Count('id', filter=models.Q(rating__gte=UPVOTE_MIN_RATING)),
+        )
+    }
+    waiters = {
+        row['customer']: (row['tips'] or Decimal(0), row['votes'])
+        for row in Feedback.objects.filter(customer__waiterprofile__isnull=False)
+        .values('customer').order_by()
+        .annotate(tips=models.Sum('tip'), votes=models.Count('id'))
+    }
+
+    corrected = 0
+    for model, totals, fields in (
+        (DeliveryPersonnelProfile, couriers, ('tips_earned', 'upvotes')),
+        (WaiterProfile, waiters, ('tips_earned', 'votes')),
+    ):
+        drifted = []
+        for profile in model.objects.only('id', 'user_id', *fields).iterator():
+            expected = totals.get(profile.user_id, (Decimal(0), 0))
+            if tuple(getattr(profile, field) for field in fields) != expected:
+                for field, value in zip(fields, expected):
+                    setattr(profile, field, value)
+                drifted.append(profile)
+        model.objects.bulk_update(drifted, fields, batch_size=500)
+        corrected += len(drifted)
+    return corrected
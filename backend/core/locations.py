@@ -0,0 +1,113 @@
+# core/locations.py
+
+import logging
+import threading
+
+from django.db import close_old_connections, connection
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+
+from .models import DeliveryPersonnelProfile
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = 5  # how long pings may sit in memory before one bulk UPDATE
+
+
+def format_location(lat, lng):
+    """Stored as "lat,lng" so core/dispatch.parse_location can read it back."""
+    return f"{lat:.6f},{lng:.6f}"
+
+
+class LocationBuffer:
+    """
+    Coalesces courier GPS pings in memory to the latest position per courier and
+    writes the changed ones with a single UPDATE every FLUSH_SECONDS, instead of
+    one serializer round-trip and row save per ping.
+    """
+
+    def __init__(self, flush_seconds=FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self.positions = {}  # user_id -> (lat, lng, recorded_at)
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def ingest(self, user_id, pings):
+        """
+        Keeps only the newest of `pings` (dicts with lat, lng, recorded_at).
+        Returns it, or None if stale. Timestamps from the future are clamped to
+        now, so a phone with a fast clock cannot shut out its later pings.
+        """
+        latest = max(pings, key=lambda p: p['recorded_at'])
+        latest['recorded_at'] = min(latest['recorded_at'], timezone.now())
+        with self.lock:
+            current = self.positions.get(user_id)
+            if current is not None and current[2] >= latest['recorded_at']:
+                return None
+            self.positions[user_id] = (latest['lat'], latest['lng'], latest['recorded_at'])
+            self.dirty.add(user_id)
+            self._schedule_flush()
+        return latest
+
+    def _schedule_flush(self):
+        """Starts the flush timer unless one is pending. Call with the lock held."""
+        if self.timer is None:
+            self.timer = threading.Timer(self.flush_seconds, self._flush_in_background)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def snapshot(self, user_ids=None):
+        """Freshest known position per courier, straight from memory."""
+        with self.lock:
+            if user_ids is None:
+                return dict(self.positions)
+            return {uid: self.positions[uid] for uid in user_ids if uid in self.positions}
+
+    def flush(self):
+        """Writes every changed position in one UPDATE ... CASE statement. Returns the row count."""
+        with self.lock:
+            batch = {uid: self.positions[uid] for uid in self.dirty}
+            self.dirty.clear()
+            if self.timer is not None:
+                self.timer.cancel()  # no-op when the timer itself is flushing
+            self.timer = None
+        if not batch:
+            return 0
+        try:
+            return self._write(batch)
+        except Exception:
+            # Put them back and retry on the next tick, even if no new ping arrives
+            with self.lock:
+                self.dirty.update(batch)
+                self._schedule_flush()
+            raise
+
+    def _write(self, batch):
+        location = Case(
+            *[When(user_id=uid, then=Value(format_location(lat, lng))) for uid, (lat, lng, _) in batch.items()],
+            output_field=CharField(),
+        )
+        return DeliveryPersonnelProfile.objects.filter(user_id__in=batch).update(current_location=location)
+
+    def _flush_in_background(self):
+        close_old_connections()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Courier location flush failed, retrying in %ss", self.flush_seconds)
+        finally:
+            connection.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_location_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = LocationBuffer()
+    return _buffer
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.shifts import close_open_shifts
+
+
+class Command(BaseCommand):
+    help = "Clocks out everyone still on shift (end of day)."
+
+    def handle(self, *args, **options):
+        closed = close_open_shifts()
+        self.stdout.write(self.style.SUCCESS(f"Clocked out {closed} staff."))
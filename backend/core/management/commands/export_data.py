@@ -0,0 +1,24 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from core.bulk import DATASETS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Streams meals, online customers or CRM call logs out as CSV or NDJSON without loading the table into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        if options['output'] is None:
+            target = nullcontext(sys.stdout)
+        else:
+            target = open(options['output'], 'w', encoding='utf-8', newline='')
+        with target as out:
+            for text in export_lines(DATASETS[options['dataset']], options['format']):
+                out.write(text)
@@ -0,0 +1,43 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk import CHUNK_SIZE, DATASETS, EXTENSIONS, first_undecodable_line, format_for, import_records, read_records
+
+
+class Command(BaseCommand):
+    help = "Imports meals, online customers or CRM call logs from CSV (with a header row) or NDJSON, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('path', help="File to read, or - for stdin")
+        parser.add_argument('--format', choices=sorted(set(EXTENSIONS.values())), help="Default: from the file extension")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or format_for(options['path'])
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name, pass --format")
+
+        if options['path'] == '-':
+            source = nullcontext(sys.stdin)
+        else:
+            with open(options['path'], 'rb') as raw:
+                bad_line = first_undecodable_line(raw)
+            if bad_line is not None:
+                raise CommandError(f"Line {bad_line} is not valid UTF-8, nothing was imported")
+            source = open(options['path'], encoding='utf-8-sig', newline='')
+        rows = created = 0
+        with source as lines:
+            reports = import_records(DATASETS[options['dataset']], read_records(lines, fmt), options['chunk_size'])
+            for report in reports:
+                rows += report['rows']
+                created += report['created']
+                for error in report['errors']:
+                    self.stderr.write(f"line {error['line']}: {error['errors']}")
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"chunk {report['chunk']}: {report['created']}/{report['rows']} created")
+
+        style = self.style.SUCCESS if created == rows else self.style.WARNING
+        self.stdout.write(style(f"Imported {created} of {rows} {options['dataset']} rows, {rows - created} rejected."))
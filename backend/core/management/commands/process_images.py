@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.images import IMAGE_FIELDS, needs_processing, process_image
+
+
+class Command(BaseCommand):
+    help = "Generates missing thumbnails for uploaded images, synchronously."
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        for model, (image_field, _) in IMAGE_FIELDS.items():
+            for instance in model.objects.exclude(**{image_field: ''}).iterator():
+                if not needs_processing(instance):
+                    continue
+                name = getattr(instance, image_field).name
+                try:
+                    process_image(model, instance.pk, name)
+                    done += 1
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} #{instance.pk} ({name}): {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} images, {failed} failed."))
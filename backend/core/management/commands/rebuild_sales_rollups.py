@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recomputes the hourly and daily sales rollups from delivered orders and their tips."
+
+    def handle(self, *args, **options):
+        written = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Sales rollups rebuilt, {written} rows."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the admin statistics rollup from the source tables."
+
+    def handle(self, *args, **options):
+        totals = rebuild_stats()
+        for key, value in sorted(totals.items()):
+            self.stdout.write(f"{key}: {value}")
+        self.stdout.write(self.style.SUCCESS("Stats rollup rebuilt."))
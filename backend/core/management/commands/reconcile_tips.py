@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recomputes courier and waiter tip/vote totals from Feedback."
+
+    def handle(self, *args, **options):
+        corrected = reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Tip ledger reconciled, {corrected} profiles corrected."))
@@ -0,0 +1,64 @@
+# core/menu.py
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+
+from .models import Meal
+from .serializers import MealSerializer
+
+MENU_VERSION_KEY = 'menu:version'
+MENU_SNAPSHOT_KEY = 'menu:snapshot:{version}'
+MENU_SNAPSHOT_TIMEOUT = 60 * 60  # 1 hour, old versions simply expire
+# Meal writes replace the version right away; the timeout only bounds how long
+# another process can serve a stale one when the cache is not shared (LocMemCache)
+MENU_VERSION_TIMEOUT = 5 * 60
+
+
+def compute_menu_version():
+    """
+    Menu version derived from the meals table itself: any save bumps
+    updated_at (auto_now), and a create or delete changes the count.
+    One aggregate query.
+    """
+    state = Meal.objects.aggregate(
+        latest=Max('updated_at'),
+        meals=Count('id'),
+        available=Count('id', filter=Q(is_available=True)),
+    )
+    fingerprint = f"{state['latest'] and state['latest'].isoformat()}|{state['meals']}|{state['available']}"
+    return hashlib.blake2b(fingerprint.encode(), digest_size=8).hexdigest()
+
+
+def get_menu_version():
+    """The cached menu version; the database is only read on a cache miss."""
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        version = compute_menu_version()
+        # add(), not set(): a bump that landed meanwhile wins over this older read
+        if not cache.add(MENU_VERSION_KEY, version, MENU_VERSION_TIMEOUT):
+            version = cache.get(MENU_VERSION_KEY, version)
+    return version
+
+
+def bump_menu_version():
+    """Stores the version of the meals as committed. Call after every Meal write (on commit)."""
+    cache.set(MENU_VERSION_KEY, compute_menu_version(), MENU_VERSION_TIMEOUT)
+
+
+def menu_etag(version):
+    """Strong ETag for a given menu version."""
+    return f'"menu-{version}"'
+
+
+def get_menu_snapshot(version=None):
+    """Returns (version, payload) for the available meals, serializing only on a miss."""
+    version = version or get_menu_version()
+    key = MENU_SNAPSHOT_KEY.format(version=version)
+    payload = cache.get(key)
+    if payload is None:
+        meals = Meal.objects.filter(is_available=True)
+        payload = list(MealSerializer(meals, many=True).data)
+        cache.set(key, payload, MENU_SNAPSHOT_TIMEOUT)
+    return version, payload
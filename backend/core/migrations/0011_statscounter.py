@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:51
+
+from django.db import migrations, models
+
+
+def seed_stats(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Order = apps.get_model('core', 'Order')
+    Meal = apps.get_model('core', 'Meal')
+    Feedback = apps.get_model('core', 'Feedback')
+    StatsCounter = apps.get_model('core', 'StatsCounter')
+
+    totals = {
+        'users': User.objects.count(),
+        'orders': Order.objects.count(),
+        'meals': Meal.objects.count(),
+        'feedback': Feedback.objects.count(),
+        'tips': Feedback.objects.aggregate(total=models.Sum('tip'))['total'] or 0,
+    }
+    for row in User.objects.values('role').order_by().annotate(count=models.Count('id')):
+        totals[f"users:{row['role']}"] = row['count']
+    StatsCounter.objects.bulk_create(StatsCounter(key=k, value=v) for k, v in totals.items())
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_waiterprofile_age_waiterprofile_gender'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(seed_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_orderevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverypersonnelprofile',
+            name='profile_picture_meta',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='image_meta',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proofofdelivery',
+            name='image_meta',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='receptionistprofile',
+            name='profile_picture_meta',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
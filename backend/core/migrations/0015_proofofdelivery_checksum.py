@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_image_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proofofdelivery',
+            name='checksum',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
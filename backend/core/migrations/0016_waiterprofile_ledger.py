@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:09
+
+from django.db import migrations, models
+
+
+def seed_ledger(apps, schema_editor):
+    Feedback = apps.get_model('core', 'Feedback')
+    WaiterProfile = apps.get_model('core', 'WaiterProfile')
+    DeliveryPersonnelProfile = apps.get_model('core', 'DeliveryPersonnelProfile')
+
+    grouped = Feedback.objects.values('customer').order_by().annotate(tips=models.Sum('tip'), votes=models.Count('id'))
+    for row in grouped.filter(customer__waiterprofile__isnull=False):
+        WaiterProfile.objects.filter(user_id=row['customer']).update(tips_earned=row['tips'] or 0, votes=row['votes'])
+
+    grouped = Feedback.objects.filter(delivery_personnel__isnull=False).values('delivery_personnel').order_by().annotate(
+        tips=models.Sum('tip'), upvotes=models.Count('id', filter=models.Q(rating__gte=4))
+    )
+    DeliveryPersonnelProfile.objects.update(tips_earned=0, upvotes=0)
+    for row in grouped:
+        DeliveryPersonnelProfile.objects.filter(user_id=row['delivery_personnel']).update(
+            tips_earned=row['tips'] or 0, upvotes=row['upvotes']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_proofofdelivery_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waiterprofile',
+            name='tips_earned',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='waiterprofile',
+            name='votes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(seed_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:13
+
+from django.db import migrations, models
+
+
+def close_duplicate_open_shifts(apps, schema_editor):
+    # Double taps left some users with several open shifts; keep the newest open
+    # and close each older one when the next one started
+    ClockInRecord = apps.get_model('core', 'ClockInRecord')
+    duplicated = (
+        ClockInRecord.objects.filter(clock_out_time__isnull=True)
+        .values('user').order_by().annotate(open=models.Count('id')).filter(open__gt=1)
+        .values_list('user', flat=True)
+    )
+    for user_id in list(duplicated):
+        shifts = list(ClockInRecord.objects.filter(user_id=user_id, clock_out_time__isnull=True).order_by('clock_in_time', 'id'))
+        for shift, following in zip(shifts, shifts[1:]):
+            shift.clock_out_time = following.clock_in_time
+            shift.save(update_fields=['clock_out_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_waiterprofile_ledger'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='clockinrecord',
+            name='clockin_open_shift_idx',
+        ),
+        migrations.RunPython(close_duplicate_open_shifts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='clockinrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('clock_out_time__isnull', True)), fields=('user',), name='clockin_one_open_shift'),
+        ),
+    ]
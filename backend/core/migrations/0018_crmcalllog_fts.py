@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# External-content FTS5 index over the searchable call log text, kept in
+# sync by triggers (so bulk_create/update/raw SQL are covered too). SQLite
+# only; core/search.py falls back to LIKE scans on other databases.
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE core_crmcalllog_fts USING fts5(
+        customer_name, reason_for_call, notes,
+        content='core_crmcalllog', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_crmcalllog_fts_insert AFTER INSERT ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(rowid, customer_name, reason_for_call, notes)
+        VALUES (new.id, new.customer_name, new.reason_for_call, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER core_crmcalllog_fts_delete AFTER DELETE ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(core_crmcalllog_fts, rowid, customer_name, reason_for_call, notes)
+        VALUES ('delete', old.id, old.customer_name, old.reason_for_call, old.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER core_crmcalllog_fts_update AFTER UPDATE OF customer_name, reason_for_call, notes ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(core_crmcalllog_fts, rowid, customer_name, reason_for_call, notes)
+        VALUES ('delete', old.id, old.customer_name, old.reason_for_call, old.notes);
+        INSERT INTO core_crmcalllog_fts(rowid, customer_name, reason_for_call, notes)
+        VALUES (new.id, new.customer_name, new.reason_for_call, new.notes);
+    END
+    """,
+    "INSERT INTO core_crmcalllog_fts(core_crmcalllog_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_update",
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_delete",
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_insert",
+    "DROP TABLE IF EXISTS core_crmcalllog_fts",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_clockin_one_open_shift'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:35
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Adding the customer FK rebuilds core_crmcalllog on SQLite, which drops the
+# full-text search triggers from 0018; the index itself keeps its rows (ids
+# are copied). Copied here rather than imported so this migration never changes.
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER core_crmcalllog_fts_insert AFTER INSERT ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(rowid, customer_name, reason_for_call, notes)
+        VALUES (new.id, new.customer_name, new.reason_for_call, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER core_crmcalllog_fts_delete AFTER DELETE ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(core_crmcalllog_fts, rowid, customer_name, reason_for_call, notes)
+        VALUES ('delete', old.id, old.customer_name, old.reason_for_call, old.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER core_crmcalllog_fts_update AFTER UPDATE OF customer_name, reason_for_call, notes ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(core_crmcalllog_fts, rowid, customer_name, reason_for_call, notes)
+        VALUES ('delete', old.id, old.customer_name, old.reason_for_call, old.notes);
+        INSERT INTO core_crmcalllog_fts(rowid, customer_name, reason_for_call, notes)
+        VALUES (new.id, new.customer_name, new.reason_for_call, new.notes);
+    END
+    """,
+]
+DROP_FTS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_update",
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_delete",
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_insert",
+]
+
+
+def restore_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_FTS_TRIGGERS + FTS_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+# core.phones.normalize_phone as of this migration, frozen so later changes
+# to it cannot change what this data migration writes
+_EXTENSION = re.compile(r'\s*(?:ext\.?|x|#)\s*\d+\s*$', re.IGNORECASE)
+
+
+def normalize_phone(raw):
+    if not raw:
+        return ''
+    country = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '254')
+    national_length = getattr(settings, 'PHONE_NATIONAL_LENGTH', 9)
+
+    text = _EXTENSION.sub('', raw.strip())
+    digits = re.sub(r'\D', '', text)
+    if text.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith(country) and len(digits) == len(country) + national_length:
+        pass
+    elif digits.startswith('0') and len(digits) == national_length + 1:
+        digits = country + digits[1:]
+    elif len(digits) == national_length:
+        digits = country + digits
+    else:
+        return ''
+
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return ''
+    return '+' + digits
+
+
+def normalize_call_log_phones(apps, schema_editor):
+    # Customer profiles get their first phone numbers with this migration, so
+    # there is nothing to link calls to yet; new calls link themselves on save
+    CRMCallLog = apps.get_model('core', 'CRMCallLog')
+    batch = []
+    for log in CRMCallLog.objects.only('id', 'phone_number').iterator(chunk_size=2000):
+        log.phone_e164 = normalize_phone(log.phone_number)
+        batch.append(log)
+        if len(batch) == 2000:
+            CRMCallLog.objects.bulk_update(batch, ['phone_e164'])
+            batch = []
+    CRMCallLog.objects.bulk_update(batch, ['phone_e164'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_crmcalllog_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='crmcalllog',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='crm_calls', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='crmcalllog',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='onlinecustomerprofile',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='onlinecustomerprofile',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='onsitecustomerprofile',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='onsitecustomerprofile',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(normalize_call_log_phones, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='crmcalllog',
+            index=models.Index(fields=['phone_e164', '-call_time'], name='crm_phone_call_time_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Adding the claimed_by FK rebuilds core_crmcalllog on SQLite, which drops the
+# full-text search triggers from 0018; the index itself keeps its rows (ids
+# are copied). Copied here rather than imported so this migration never changes.
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER core_crmcalllog_fts_insert AFTER INSERT ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(rowid, customer_name, reason_for_call, notes)
+        VALUES (new.id, new.customer_name, new.reason_for_call, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER core_crmcalllog_fts_delete AFTER DELETE ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(core_crmcalllog_fts, rowid, customer_name, reason_for_call, notes)
+        VALUES ('delete', old.id, old.customer_name, old.reason_for_call, old.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER core_crmcalllog_fts_update AFTER UPDATE OF customer_name, reason_for_call, notes ON core_crmcalllog BEGIN
+        INSERT INTO core_crmcalllog_fts(core_crmcalllog_fts, rowid, customer_name, reason_for_call, notes)
+        VALUES ('delete', old.id, old.customer_name, old.reason_for_call, old.notes);
+        INSERT INTO core_crmcalllog_fts(rowid, customer_name, reason_for_call, notes)
+        VALUES (new.id, new.customer_name, new.reason_for_call, new.notes);
+    END
+    """,
+]
+DROP_FTS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_update",
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_delete",
+    "DROP TRIGGER IF EXISTS core_crmcalllog_fts_insert",
+]
+
+
+def restore_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_FTS_TRIGGERS + FTS_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_phone_e164'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='crmcalllog',
+            name='follow_up_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='crmcalllog',
+            name='follow_up_claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_follow_ups', to='core.receptionistprofile'),
+        ),
+        migrations.AddField(
+            model_name='crmcalllog',
+            name='follow_up_done_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='crmcalllog',
+            index=models.Index(condition=models.Q(('follow_up_date__isnull', False), ('follow_up_done_at__isnull', True)), fields=['follow_up_date'], name='crm_open_follow_up_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:46
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+
+# core.sales.PERIODS and rollup_rows() as of this migration, frozen so later
+# changes there cannot change what this migration seeds
+PERIODS = ('hour', 'day')
+
+
+def rollup_rows(orders, period):
+    return (
+        orders.filter(status='delivered', delivered_at__isnull=False)
+        .annotate(bucket=Trunc('delivered_at', period, tzinfo=timezone.get_current_timezone()))
+        .values('bucket', 'meal_id', 'delivery_person_id')
+        .order_by()
+        .annotate(
+            count=models.Count('id'),
+            revenue=Coalesce(models.Sum('meal__price'), Decimal(0), output_field=models.DecimalField()),
+            tips=Coalesce(models.Sum('feedback__tip'), Decimal(0), output_field=models.DecimalField()),
+        )
+    )
+
+
+def seed_rollups(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    OrderEvent = apps.get_model('core', 'OrderEvent')
+    SalesRollup = apps.get_model('core', 'SalesRollup')
+
+    # Delivered before delivered_at existed: the logged transition, else the last update
+    delivered_event = OrderEvent.objects.filter(order=models.OuterRef('pk'), to_status='delivered').order_by('created_at')
+    Order.objects.filter(status='delivered').update(
+        delivered_at=Coalesce(models.Subquery(delivered_event.values('created_at')[:1]), models.F('updated_at'))
+    )
+    SalesRollup.objects.bulk_create(
+        (
+            SalesRollup(
+                period=period, bucket_start=row['bucket'], meal_id=row['meal_id'], staff_id=row['delivery_person_id'],
+                orders=row['count'], revenue=row['revenue'], tips=row['tips'],
+            )
+            for period in PERIODS
+            for row in rollup_rows(Order.objects.all(), period).iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_crmcalllog_follow_up_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('tips', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('meal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.meal')),
+                ('staff', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('staff__isnull', False)), fields=('period', 'bucket_start', 'meal', 'staff'), name='sales_rollup_bucket'), models.UniqueConstraint(condition=models.Q(('staff__isnull', True)), fields=('period', 'bucket_start', 'meal'), name='sales_rollup_bucket_no_staff')],
+                'indexes': [models.Index(fields=['period', 'bucket_start'], name='sales_rollup_period_idx')],
+            },
+        ),
+        migrations.RunPython(seed_rollups, migrations.RunPython.noop),
+    ]
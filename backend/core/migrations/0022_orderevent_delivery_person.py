@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderevent',
+            name='delivery_person',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:20
+
+from django.db import migrations
+
+# Statuses written before the order state machine (the old admin board offered
+# "Out for Delivery"), mapped onto the closest state that can still move on.
+# Frozen here: later edits to Order.STATUS_TRANSITIONS must not change history.
+LEGACY_STATUSES = {
+    'out_for_delivery': 'ready',
+}
+
+
+def map_legacy_statuses(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    for legacy, status in LEGACY_STATUSES.items():
+        Order.objects.filter(status=legacy).update(status=status)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_orderevent_delivery_person'),
+    ]
+
+    operations = [
+        migrations.RunPython(map_legacy_statuses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_order_legacy_statuses'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clockinrecord',
+            index=models.Index(fields=['clock_out_time', 'clock_in_time', 'user'], name='clockin_range_idx'),
+        ),
+    ]
@@ -1,8 +1,8 @@
 from django.db import models
-from django.db.models import Sum
 from django.contrib.auth.models import User, UserManager
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from .phones import normalize_phone
 from django.contrib.auth.models import BaseUserManager
 # ========================
 # Custom UserManager Model
@@ -53,15 +53,34 @@ class User(AbstractBaseUser, PermissionsMixin):
 # ========================
 # Meal  Model
 # ========================
+class MealQuerySet(models.QuerySet):
+    def with_feedback_summary(self, top=3):
+        """Annotates rating aggregates and prefetches the latest comments with their customers."""
+        latest_comments = (
+            Feedback.objects.exclude(comment='')
+            .select_related('customer')
+            .order_by('-created_at')[:top]
+        )
+        return self.annotate(
+            average_rating=models.Avg('feedback__rating'),
+            feedback_count=models.Count('feedback'),
+        ).prefetch_related(
+            models.Prefetch('feedback_set', queryset=latest_comments, to_attr='top_feedbacks')
+        )
+
+
 class Meal(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=8, decimal_places=2)
     image = models.ImageField(upload_to='meals/', null=True, blank=True)
+    image_meta = models.JSONField(default=dict, blank=True, editable=False)  # filled by core/images.py
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MealQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -79,18 +98,66 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # Legal status changes, applied by core/order_state.py
+    STATUS_TRANSITIONS = {
+        'pending': ['preparing', 'cancelled'],
+        'preparing': ['ready', 'cancelled'],
+        'ready': ['delivered'],
+        'delivered': [],
+        'cancelled': [],
+    }
     
-    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    # No single-column FK indexes: order_customer_created_idx and order_courier_status_idx lead with these
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     meal = models.ForeignKey(Meal, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     is_delivery = models.BooleanField(default=False)
-    delivery_person = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries')
+    delivery_person = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries', db_index=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    delivered_at = models.DateTimeField(null=True, blank=True, editable=False)  # sales rollups bucket on this
 
     def __str__(self):
         return f"Order #{self.id} - {self.meal.name}"
 
+    def allowed_transitions(self):
+        labels = dict(self.STATUS_CHOICES)
+        return [(status, labels[status]) for status in self.STATUS_TRANSITIONS.get(self.status, [])]
+
+    class Meta:
+        indexes = [
+            # my_orders / CustomerOrderHistoryView / my_orders_view
+            models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'),
+            # mark_order_delivered / UploadProofView, narrowed by status
+            models.Index(fields=['delivery_person', 'status'], name='order_courier_status_idx'),
+            # kitchen / admin boards filtered by status, newest first
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ]
+
+
+class OrderEvent(models.Model):
+    """Append-only log of order status transitions."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_events')
+    # Set when the event hands the order to a courier (dispatch or a manual change)
+    delivery_person = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order events are append-only.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
 
 # ========================
 # Feedback Model
@@ -115,6 +182,11 @@ class Feedback(models.Model):
     def __str__(self):
         return f"Feedback by {self.customer.email} - Rating {self.rating}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['meal', '-created_at'], name='feedback_meal_created_idx'),
+        ]
+
 
 # ========================
 # Clock-In Records for Waiters
@@ -127,6 +199,21 @@ class ClockInRecord(models.Model):
     def __str__(self):
         return f"{self.user.email} - In: {self.clock_in_time} Out: {self.clock_out_time}"
 
+    class Meta:
+        constraints = [
+            # Partial unique index: at most one open shift per user, and the
+            # lookup index for clock-out (see ClockInView / ClockOutView)
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(clock_out_time__isnull=True),
+                name='clockin_one_open_shift',
+            ),
+        ]
+        indexes = [
+            # Shifts overlapping a range (core/shifts.py) without reading the table
+            models.Index(fields=['clock_out_time', 'clock_in_time', 'user'], name='clockin_range_idx'),
+        ]
+
 
 # ========================
 # Delivery Profile
@@ -140,6 +227,7 @@ class DeliveryPersonnelProfile(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='deliverypersonnelprofile')
     profile_picture = models.ImageField(upload_to='delivery_profiles/', null=True, blank=True)
+    profile_picture_meta = models.JSONField(default=dict, blank=True, editable=False)
     transport_method = models.CharField(max_length=10, choices=TRANSPORT_CHOICES, default='bike')
     current_location = models.CharField(max_length=255, blank=True)
     upvotes = models.IntegerField(default=0)
@@ -155,15 +243,15 @@ class WaiterProfile(models.Model):
     table_assigned = models.CharField(max_length=20, default="Unassigned")
     age = models.PositiveIntegerField(null=True, blank=True)
     gender = models.CharField(max_length=10, choices=[("Male", "Male"), ("Female", "Female")], blank=True)
-    
-    
+    # Running totals kept by core/ledger.py (repair drift with `reconcile_tips`)
+    tips_earned = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    votes = models.PositiveIntegerField(default=0, editable=False)
+
     def total_tips(self):
-        # Use 'tip' instead of 'tip_amount'
-        result = self.user.feedback_set.aggregate(total=Sum('tip'))['total']
-        return result if result is not None else 0  # Handle None case
+        return self.tips_earned
 
     def votes_received(self):
-        return self.user.feedback_set.count()
+        return self.votes
 
     def __str__(self):
         return f"{getattr(self.user, 'email', 'No Email')} - Table {self.table_assigned}"
@@ -172,6 +260,8 @@ class WaiterProfile(models.Model):
 class ProofOfDelivery(models.Model):
     order = models.OneToOneField('Order', on_delete=models.CASCADE, related_name='proof')
     image = models.ImageField(upload_to='proofs/')
+    image_meta = models.JSONField(default=dict, blank=True, editable=False)
+    checksum = models.CharField(max_length=64, blank=True, editable=False)  # SHA-256 of the uploaded bytes, before EXIF is stripped
     notes = models.TextField(blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
@@ -183,6 +273,7 @@ class ReceptionistProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=255, default="Receptionist User")
     profile_picture = models.ImageField(upload_to='receptionists/', blank=True, null=True)
+    profile_picture_meta = models.JSONField(default=dict, blank=True, editable=False)
     gender = models.CharField(max_length=10, choices=[('Male', 'Male'), ('Female', 'Female')], blank=True)
     clock_in_time = models.DateTimeField(blank=True, null=True)
     clock_out_time = models.DateTimeField(blank=True, null=True)
@@ -207,15 +298,54 @@ class CRMCallLog(models.Model):
     receptionist = models.ForeignKey(ReceptionistProfile, on_delete=models.CASCADE)
     customer_name = models.CharField(max_length=255)
     phone_number = models.CharField(max_length=20)
+    phone_e164 = models.CharField(max_length=16, blank=True, editable=False)  # set from phone_number on save
+    customer = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='crm_calls',
+    )
     call_time = models.DateTimeField(default=timezone.now)  # Make sure this exists
     notes = models.TextField(blank=True)
     reason_for_call = models.TextField()
     follow_up_date = models.DateField(blank=True, null=True)
+    # Follow-up queue (core/crm.py): claimed by one receptionist at a time, then done
+    follow_up_claimed_by = models.ForeignKey(
+        ReceptionistProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_follow_ups',
+    )
+    follow_up_claimed_at = models.DateTimeField(blank=True, null=True)
+    follow_up_done_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Call with {self.customer_name} at {self.call_time}"
 
+    class Meta:
+        indexes = [
+            # Caller history: every call from a number, newest first
+            models.Index(fields=['phone_e164', '-call_time'], name='crm_phone_call_time_idx'),
+            # Open follow-ups only, by due date; done ones drop out of the index
+            models.Index(
+                fields=['follow_up_date'], name='crm_open_follow_up_idx',
+                condition=models.Q(follow_up_date__isnull=False, follow_up_done_at__isnull=True),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' not in update_fields:
+            return super().save(*args, **kwargs)
+        phone_e164 = normalize_phone(self.phone_number)
+        # An edited number may belong to someone else, so the customer is looked up again
+        renumbered = not self._state.adding and phone_e164 != (
+            CRMCallLog.objects.filter(pk=self.pk).values_list('phone_e164', flat=True).first()
+        )
+        if self.customer_id is None or renumbered:
+            from .crm import find_customer
+            profile = find_customer(phone_e164)
+            self.customer_id = profile.user_id if profile else None
+        self.phone_e164 = phone_e164
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164', 'customer'}
+        super().save(*args, **kwargs)
+
 
 #online  customer
 User = get_user_model()
@@ -231,8 +361,14 @@ class OnlineCustomerProfile(models.Model):
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES)
     date_of_birth = models.DateField(null=True, blank=True)
     location = models.CharField(max_length=200)  # town, estate, etc
+    phone_number = models.CharField(max_length=20, blank=True)
+    phone_e164 = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
     member_since = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone(self.phone_number)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.full_name
     
@@ -250,8 +386,72 @@ class OnsiteCustomerProfile(models.Model):
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES)
     table_number = models.CharField(max_length=20)
     waiter = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={'role': 'waiter'})
+    phone_number = models.CharField(max_length=20, blank=True)
+    phone_e164 = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
     joined_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone(self.phone_number)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.full_name} at Table {self.table_number}"
 
+
+
+# ========================
+# Admin statistics rollup
+# ========================
+class StatsCounter(models.Model):
+    """One running total per key (e.g. 'orders', 'users:waiter', 'tips'), kept current by signals."""
+    key = models.CharField(max_length=50, unique=True)
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+# ========================
+# Sales rollup
+# ========================
+class SalesRollup(models.Model):
+    """
+    Delivered orders, revenue and tips per hour or day, meal and courier,
+    updated as orders are delivered (core/sales.py). `staff` is the courier,
+    or null for orders nobody delivered.
+    """
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='+')
+    # No FK constraint: totals outlive a deleted courier until the next rebuild
+    staff = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+',
+    )
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    tips = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.period} {self.bucket_start:%Y-%m-%d %H:%M} meal {self.meal_id}: {self.revenue}"
+
+    class Meta:
+        constraints = [
+            # One row per bucket; NULLs never collide in a plain unique index, so pickups get their own
+            models.UniqueConstraint(
+                fields=['period', 'bucket_start', 'meal', 'staff'], condition=models.Q(staff__isnull=False),
+                name='sales_rollup_bucket',
+            ),
+            models.UniqueConstraint(
+                fields=['period', 'bucket_start', 'meal'], condition=models.Q(staff__isnull=True),
+                name='sales_rollup_bucket_no_staff',
+            ),
+        ]
+        indexes = [
+            # Range reads; the partial unique indexes only serve queries naming staff
+            models.Index(fields=['period', 'bucket_start'], name='sales_rollup_period_idx'),
+        ]
@@ -0,0 +1,74 @@
+# core/order_state.py
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderEvent
+from .realtime import publish_order_event
+from .dispatch import get_dispatcher
+from .sales import record_delivery
+
+
+class IllegalTransition(Exception):
+    """The requested status cannot follow the order's current status."""
+
+
+class TransitionConflict(Exception):
+    """The order changed (or stopped matching) between read and write."""
+
+
+def apply_transition(order, to_status, actor=None, **conditions):
+    """
+    Moves `order` from the status it was read with to `to_status` using one
+    conditional UPDATE ... WHERE status = <expected>, and logs an OrderEvent.
+    Extra `conditions` (e.g. delivery_person=user) are added to the WHERE clause.
+    Raises IllegalTransition or TransitionConflict; never locks or retries.
+    """
+    from_status = order.status
+    if to_status not in Order.STATUS_TRANSITIONS.get(from_status, []):
+        raise IllegalTransition(f"Cannot move order from '{from_status}' to '{to_status}'.")
+
+    now = timezone.now()
+    changes = {'status': to_status, 'updated_at': now}
+    if to_status == 'delivered':
+        changes['delivered_at'] = now
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order.pk, status=from_status, **conditions).update(**changes)
+        if not updated:
+            raise TransitionConflict("Order was updated by someone else, reload and try again.")
+        OrderEvent.objects.create(order_id=order.pk, from_status=from_status, to_status=to_status, actor=actor)
+        for field, value in changes.items():
+            setattr(order, field, value)
+        if to_status == 'delivered':
+            # .update() skips post_save, so count the sale here, in the same transaction
+            record_delivery(order)
+
+    # .update() skips post_save, so notify the order board here
+    transaction.on_commit(lambda: publish_order_event(order, 'order.status', from_status))
+    if to_status == 'ready' and order.is_delivery and not order.delivery_person_id:
+        transaction.on_commit(lambda: get_dispatcher().dispatch([order]))
+    elif to_status == 'delivered' and order.delivery_person_id:
+        transaction.on_commit(lambda: get_dispatcher().release(order.delivery_person_id))
+    return order
+
+
+def reassign_courier(order, courier, expected_status='pending', actor=None):
+    """
+    Swaps the delivery person only while the order is still in `expected_status`,
+    logs it as an OrderEvent and notifies the order board.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order.pk, status=expected_status).update(
+            delivery_person=courier, updated_at=now
+        )
+        if not updated:
+            raise TransitionConflict("Cannot change delivery person after order is processed.")
+        OrderEvent.objects.create(
+            order_id=order.pk, from_status=expected_status, to_status=expected_status,
+            actor=actor, delivery_person=courier,
+        )
+    order.delivery_person = courier
+    order.updated_at = now
+    transaction.on_commit(lambda: publish_order_event(order, 'order.assigned', expected_status))
+    return order
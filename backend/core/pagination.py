@@ -0,0 +1,86 @@
+# core/pagination.py
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id), newest first.
+    Every page is a single indexed range scan, so page 1,000 costs the same as page 1.
+    DRF's own cursor keeps only the first field and steps over ties with an
+    offset, which skips rows when paging back; the id in the position avoids that.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(queryset.model, current_position, ordering))
+
+        # One extra row tells whether another page follows
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if has_following_position else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        field = ordering[0].lstrip('-')
+        if isinstance(instance, dict):
+            return f"{instance[field]}|{instance['id']}"
+        return f"{getattr(instance, field)}|{instance.pk}"
+
+    def _after(self, model, position, ordering):
+        """Rows past `position` in `ordering`, which ends with the id in the same direction."""
+        field = ordering[0].lstrip('-')
+        # Parsed here rather than left to the query, so a tampered cursor is a 404 and not a 500
+        try:
+            value, pk = position.rsplit('|', 1)
+            value, pk = model._meta.get_field(field).to_python(value), int(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+        return Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk})
+
+
+class ShiftRosterCursorPagination(CreatedAtCursorPagination):
+    # Many shifts share a date; the id in the position keeps them apart
+    ordering = ('-shift_date', '-id')
+
+
+class MemberSinceCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-member_since', '-id')
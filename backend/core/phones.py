@@ -0,0 +1,43 @@
+# core/phones.py
+
+import re
+
+from django.conf import settings
+
+# Numbers typed without a country code are read as local (Kenyan by default)
+DEFAULT_COUNTRY_CODE = '254'
+NATIONAL_LENGTH = 9  # digits after the country code / trunk 0, e.g. 712 345 678
+
+_EXTENSION = re.compile(r'\s*(?:ext\.?|x|#)\s*\d+\s*$', re.IGNORECASE)
+
+
+def normalize_phone(raw):
+    """
+    E.164 form ('+254712345678') of a phone number typed any of the usual
+    ways: '0712 345 678', '712345678', '254712345678', '+254 (712) 345-678',
+    '00254712345678'. Extensions are dropped. Returns '' when the input
+    cannot be a phone number.
+    """
+    if not raw:
+        return ''
+    country = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', DEFAULT_COUNTRY_CODE)
+    national_length = getattr(settings, 'PHONE_NATIONAL_LENGTH', NATIONAL_LENGTH)
+
+    text = _EXTENSION.sub('', raw.strip())
+    digits = re.sub(r'\D', '', text)
+    if text.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith(country) and len(digits) == len(country) + national_length:
+        pass
+    elif digits.startswith('0') and len(digits) == national_length + 1:
+        digits = country + digits[1:]
+    elif len(digits) == national_length:
+        digits = country + digits
+    else:
+        return ''
+
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return ''
+    return '+' + digits
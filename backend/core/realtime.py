@@ -0,0 +1,103 @@
+# core/realtime.py
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+ORDER_EVENTS_BROKER = 'core.realtime.InProcessBroker'
+
+
+class Subscription:
+    """A bounded per-connection queue; the oldest event is dropped if a screen falls behind."""
+
+    def __init__(self, broker, maxsize):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, message):
+        # Always runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InProcessBroker:
+    """
+    Fan-out pub/sub for a single ASGI process.
+    publish() is safe to call from sync views/signals running in worker threads.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, maxsize=100):
+        subscription = Subscription(self, maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # Event loop already closed, the connection is gone
+                self.unsubscribe(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Returns the process-wide broker named by settings.ORDER_EVENTS_BROKER."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'ORDER_EVENTS_BROKER', ORDER_EVENTS_BROKER)
+                _broker = import_string(path)()
+    return _broker
+
+
+def order_event(order, event, previous_status=None):
+    """Builds the message pushed to kitchen and waiter screens (ids only, no extra queries)."""
+    return {
+        'event': event,
+        'order': {
+            'id': order.id,
+            'status': order.status,
+            'previous_status': previous_status,
+            'meal': order.meal_id,
+            'customer': order.customer_id,
+            'delivery_person': order.delivery_person_id,
+            'is_delivery': order.is_delivery,
+            'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+        },
+    }
+
+
+def publish_order_event(order, event, previous_status=None):
+    get_broker().publish(order_event(order, event, previous_status))
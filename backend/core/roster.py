@@ -0,0 +1,124 @@
+# core/roster.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from .models import ReceptionistProfile, ShiftRoster
+
+MAX_ROSTER_DAYS = 62  # a month template, with room for a month that straddles two
+
+
+class RosterConflict(Exception):
+    """Some shifts overlap each other or shifts already on the roster."""
+
+    def __init__(self, conflicts):
+        super().__init__(f"{len(conflicts)} overlapping shifts")
+        self.conflicts = conflicts
+
+
+def shift_interval(shift_date, shift_start, shift_end):
+    """Wall-clock [start, end); an end at or before the start runs past midnight."""
+    start = datetime.combine(shift_date, shift_start)
+    end = datetime.combine(shift_date, shift_end)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def find_overlaps(shifts):
+    """
+    Sorted sweep per receptionist over ShiftRoster instances (saved or not).
+    Each shift that starts before the furthest-reaching earlier shift of the
+    same receptionist ends is reported once: [(shift, overlapping shift)].
+    """
+    by_receptionist = defaultdict(list)
+    for shift in shifts:
+        start, end = shift_interval(shift.shift_date, shift.shift_start, shift.shift_end)
+        by_receptionist[shift.receptionist_id].append((start, end, shift))
+
+    conflicts = []
+    for intervals in by_receptionist.values():
+        intervals.sort(key=lambda interval: interval[:2])
+        reach, reaching = None, None
+        for start, end, shift in intervals:
+            if reach is not None and start < reach:
+                conflicts.append((shift, reaching))
+            if reach is None or end > reach:
+                reach, reaching = end, shift
+    return conflicts
+
+
+def existing_shifts(receptionist_ids, first_day, last_day, exclude=None):
+    # One day either side catches overnight shifts crossing into the range
+    rows = ShiftRoster.objects.filter(
+        receptionist_id__in=receptionist_ids,
+        shift_date__range=(first_day - timedelta(days=1), last_day + timedelta(days=1)),
+    )
+    if exclude is not None:
+        rows = rows.exclude(pk=exclude)
+    return list(rows)
+
+
+def expand_template(start_date, end_date, entries):
+    """
+    Turns a week or month template into unsaved ShiftRoster rows for every
+    day in [start_date, end_date]. Each entry names a receptionist, the days
+    it applies to (`weekdays`, 0 = Monday, and/or `days` of the month) and
+    the shift times.
+    """
+    rows = []
+    day = start_date
+    while day <= end_date:
+        for entry in entries:
+            if day.weekday() in entry.get('weekdays', ()) or day.day in entry.get('days', ()):
+                rows.append(ShiftRoster(
+                    receptionist_id=entry['receptionist'].pk,
+                    shift_date=day,
+                    shift_start=entry['shift_start'],
+                    shift_end=entry['shift_end'],
+                    is_on_duty=entry.get('is_on_duty', False),
+                ))
+        day += timedelta(days=1)
+    return rows
+
+
+def create_roster(rows, replace=False):
+    """
+    Inserts `rows` in one transaction after checking them against each other
+    and against the roster already stored for the same receptionists and days.
+    With `replace`, those stored shifts are deleted instead of conflicting.
+    Raises RosterConflict; returns the created rows.
+    """
+    if not rows:
+        return []
+    receptionist_ids = {row.receptionist_id for row in rows}
+    first_day = min(row.shift_date for row in rows)
+    last_day = max(row.shift_date for row in rows)
+
+    with transaction.atomic():
+        # Serialises concurrent roster writes for the same receptionists
+        list(ReceptionistProfile.objects.select_for_update().filter(pk__in=receptionist_ids).values_list('pk'))
+        if replace:
+            ShiftRoster.objects.filter(
+                receptionist_id__in=receptionist_ids, shift_date__range=(first_day, last_day)
+            ).delete()
+        conflicts = [
+            # Old clashes between stored shifts are not this request's problem
+            (shift, other) for shift, other in find_overlaps(existing_shifts(receptionist_ids, first_day, last_day) + rows)
+            if shift.pk is None or other.pk is None
+        ]
+        if conflicts:
+            raise RosterConflict(conflicts)
+        return ShiftRoster.objects.bulk_create(rows, batch_size=500)
+
+
+def describe(shift):
+    return {
+        'id': shift.pk,
+        'receptionist': shift.receptionist_id,
+        'shift_date': shift.shift_date.isoformat(),
+        'shift_start': shift.shift_start.isoformat(timespec='minutes'),
+        'shift_end': shift.shift_end.isoformat(timespec='minutes'),
+    }
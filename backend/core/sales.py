@@ -0,0 +1,156 @@
+# core/sales.py
+
+import csv
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+
+from .models import Order, Meal, Feedback, SalesRollup
+from .utils import Echo, csv_safe
+
+PERIODS = ('hour', 'day')
+# group name -> (rollup column, label column joined in for readability)
+GROUPS = {
+    'meal': ('meal_id', 'meal__name'),
+    'staff': ('staff_id', 'staff__email'),
+}
+
+
+def bucket_start(moment, period):
+    """Start of the local-time hour or day `moment` falls in."""
+    local = timezone.localtime(moment)
+    if period == 'day':
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return local.replace(minute=0, second=0, microsecond=0)
+
+
+def add(delivered_at, meal_id, staff_id, orders=0, revenue=0, tips=0):
+    """
+    Adds to the hour and the day bucket of one meal/courier with F() updates,
+    creating the rows on first use and dropping them when their last order is
+    taken back. Negative amounts never create rows.
+    """
+    changes = {
+        field: F(field) + value
+        for field, value in (('orders', orders), ('revenue', revenue), ('tips', tips))
+        if value
+    }
+    if not changes:
+        return
+    for period in PERIODS:
+        key = {'period': period, 'bucket_start': bucket_start(delivered_at, period), 'meal_id': meal_id, 'staff_id': staff_id}
+        if SalesRollup.objects.filter(**key).update(**changes):
+            if orders < 0:
+                # The last order of the bucket went away; a rebuild would not have the row either
+                SalesRollup.objects.filter(**key, orders=0).delete()
+            continue
+        if min(orders, revenue, tips) < 0:
+            continue  # nothing there to take back from
+        _, created = SalesRollup.objects.get_or_create(
+            **key, defaults={'orders': orders, 'revenue': revenue, 'tips': tips},
+        )
+        if not created:
+            # Someone created it between our UPDATE and INSERT
+            SalesRollup.objects.filter(**key).update(**changes)
+
+
+def record_delivery(order, sign=1, delivered_at=None):
+    """
+    Counts a delivered order (price from its meal now, plus any tip already
+    left); sign=-1 takes it back. `delivered_at` overrides the order's own,
+    for an order that has just left the delivered status.
+    """
+    price = Meal.objects.filter(pk=order.meal_id).values_list('price', flat=True).first() or Decimal(0)
+    tip = Feedback.objects.filter(order_id=order.pk).values_list('tip', flat=True).first() or Decimal(0)
+    add(
+        delivered_at or order.delivered_at, order.meal_id, order.delivery_person_id,
+        orders=sign, revenue=sign * price, tips=sign * tip,
+    )
+
+
+def record_tip(order_id, delta):
+    """Moves a tip change onto the bucket its order was delivered in; tips on undelivered orders wait for delivery."""
+    if not delta:
+        return
+    order = Order.objects.filter(pk=order_id, status='delivered', delivered_at__isnull=False).values(
+        'delivered_at', 'meal_id', 'delivery_person_id'
+    ).first()
+    if order is not None:
+        add(order['delivered_at'], order['meal_id'], order['delivery_person_id'], tips=delta)
+
+
+def rollup_rows(orders, period):
+    """
+    Rollup rows aggregated straight from `orders` (a queryset of Order, or of
+    the historical model in a migration): one GROUP BY per period.
+    """
+    return (
+        orders.filter(status='delivered', delivered_at__isnull=False)
+        .annotate(bucket=Trunc('delivered_at', period, tzinfo=timezone.get_current_timezone()))
+        .values('bucket', 'meal_id', 'delivery_person_id')
+        .order_by()
+        .annotate(
+            count=models.Count('id'),
+            revenue=Coalesce(models.Sum('meal__price'), Decimal(0), output_field=models.DecimalField()),
+            tips=Coalesce(models.Sum('feedback__tip'), Decimal(0), output_field=models.DecimalField()),
+        )
+    )
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Replaces the rollups with totals recomputed from orders at today's meal
+    prices, repairing drift (e.g. deleted couriers or edited orders).
+    Returns the number of rows written.
+    """
+    SalesRollup.objects.all().delete()
+    rows = [
+        SalesRollup(
+            period=period, bucket_start=row['bucket'], meal_id=row['meal_id'], staff_id=row['delivery_person_id'],
+            orders=row['count'], revenue=row['revenue'], tips=row['tips'],
+        )
+        for period in PERIODS
+        for row in rollup_rows(Order.objects.all(), period).iterator()
+    ]
+    SalesRollup.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def sales_report(start, end, period='day', group=(), meals=None, staff=None):
+    """
+    Totals per bucket in [start, end) from the rollup, split by the `group`
+    dimensions ('meal', 'staff'). Whole buckets only: a bucket counts if it
+    starts inside the range. Returns a values() queryset, bucket order.
+    """
+    rows = SalesRollup.objects.filter(period=period, bucket_start__gte=start, bucket_start__lt=end)
+    if meals:
+        rows = rows.filter(meal_id__in=meals)
+    if staff:
+        rows = rows.filter(staff_id__in=staff)
+    columns = [column for name in group for column in GROUPS[name]]
+    keys = ['bucket_start'] + [GROUPS[name][0] for name in group]
+    return (
+        rows.values('bucket_start', *columns)
+        .order_by(*keys)
+        .annotate(orders=models.Sum('orders'), revenue=models.Sum('revenue'), tips=models.Sum('tips'))
+    )
+
+
+def report_csv(rows, group=(), chunk_size=2000):
+    """Streams sales_report() rows as CSV text straight off the cursor."""
+    headers = ['bucket_start'] + [column for name in group for column in GROUPS[name]] + ['orders', 'revenue', 'tips']
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    lines = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        row['bucket_start'] = timezone.localtime(row['bucket_start']).isoformat()
+        lines.append(writer.writerow([csv_safe(row[header]) for header in headers]))
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
@@ -0,0 +1,92 @@
+# core/search.py
+
+import re
+
+from django.db import connection, models
+
+from .models import CRMCallLog
+
+FTS_TABLE = 'core_crmcalllog_fts'
+# bm25 weights per indexed column: customer_name, reason_for_call, notes
+WEIGHTS = (3.0, 2.0, 1.0)
+SNIPPET_TOKENS = 12
+
+_TERMS = re.compile(r'"([^"]+)"|(\w+)', re.UNICODE)
+
+
+def match_expression(text):
+    """
+    Turns free text into a safe FTS5 query: "quoted phrases" stay phrases,
+    other words are ANDed and the last one is a prefix (as the receptionist
+    types). FTS5 operators and syntax typed by the user are treated as text.
+    Returns None when there is nothing to search for.
+    """
+    terms = []
+    for phrase, word in _TERMS.findall(text or ''):
+        words = re.findall(r'\w+', phrase or word)
+        if words:
+            terms.append('"%s"' % ' '.join(words))
+    if not terms:
+        return None
+    if not text.rstrip().endswith('"'):
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_call_logs(text, queryset=None, limit=50):
+    """
+    Ranked full-text search over call logs. Returns CRMCallLog instances
+    (from `queryset`, default all) best match first, each with `rank`,
+    `reason_snippet` and `notes_snippet` attributes; matches are wrapped in
+    [brackets].
+    """
+    queryset = CRMCallLog.objects.all() if queryset is None else queryset
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    if connection.vendor != 'sqlite':
+        return _search_by_scan(text, queryset, limit)
+
+    # Rank inside the index first, then load just the winning rows. The
+    # queryset's own filters (e.g. one receptionist) are applied as a subquery;
+    # the unary + keeps SQLite from pushing that IN into the FTS5 table as a
+    # rowid constraint, which re-runs the MATCH once per allowed row.
+    allowed_sql, allowed_params = queryset.order_by().values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid, bm25({FTS_TABLE}, %s, %s, %s) AS rank,
+                   snippet({FTS_TABLE}, 1, '[', ']', '…', %s),
+                   snippet({FTS_TABLE}, 2, '[', ']', '…', %s)
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s AND +rowid IN ({allowed_sql})
+            ORDER BY rank
+            LIMIT %s
+            """,
+            [*WEIGHTS, SNIPPET_TOKENS, SNIPPET_TOKENS, expression, *allowed_params, limit],
+        )
+        hits = cursor.fetchall()
+
+    logs = queryset.in_bulk([row[0] for row in hits])
+    results = []
+    for log_id, rank, reason_snippet, notes_snippet in hits:
+        log = logs.get(log_id)
+        if log is not None:
+            log.rank, log.reason_snippet, log.notes_snippet = rank, reason_snippet, notes_snippet
+            results.append(log)
+    return results
+
+
+def _search_by_scan(text, queryset, limit):
+    # Without FTS5 every word must appear somewhere; no ranking, newest first
+    condition = models.Q()
+    for word in re.findall(r'\w+', text):
+        condition &= (
+            models.Q(customer_name__icontains=word)
+            | models.Q(reason_for_call__icontains=word)
+            | models.Q(notes__icontains=word)
+        )
+    results = list(queryset.filter(condition).order_by('-call_time')[:limit])
+    for log in results:
+        log.rank, log.reason_snippet, log.notes_snippet = None, log.reason_for_call[:120], log.notes[:120]
+    return results
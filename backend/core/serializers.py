@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .images import thumbnail_urls
+from .phones import normalize_phone
+from .roster import MAX_ROSTER_DAYS, existing_shifts, find_overlaps
 from .models import (
     Meal, Order, Feedback, ClockInRecord, ShiftRoster,ReceptionistProfile,
     DeliveryPersonnelProfile, OnsiteCustomerProfile, 
@@ -8,6 +11,20 @@ from .models import (
 
 User = get_user_model()
 
+
+def validate_phone(value):
+    """Blank is allowed where the model allows it; anything else must normalize to E.164."""
+    if value and not normalize_phone(value):
+        raise serializers.ValidationError("Enter a valid phone number, e.g. 0712 345 678 or +254712345678.")
+    return value
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """Exposes {size: url} from an *_meta JSON field once the thumbnails exist."""
+
+    def to_representation(self, value):
+        return thumbnail_urls(value)
+
 # ----------------------
 # User Serializer
 # ----------------------
@@ -30,12 +47,14 @@ class UserSerializer(serializers.ModelSerializer):
 # ----------------------
 class DeliveryProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer()
+    profile_picture_thumbnails = ThumbnailsField(source='profile_picture_meta')
 
     class Meta:
         model = DeliveryPersonnelProfile
         fields = [
             'user',
             'profile_picture',
+            'profile_picture_thumbnails',
             'transport_method',
             'current_location',
             'upvotes',
@@ -50,6 +69,17 @@ class DeliveryProfileSerializer(serializers.ModelSerializer):
         profile = DeliveryPersonnelProfile.objects.create(user=user, **validated_data)
         return profile
 
+# ----------------------
+# Courier location pings
+# ----------------------
+class LocationPingSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField(required=False)
+
+class LocationBatchSerializer(serializers.Serializer):
+    pings = LocationPingSerializer(many=True, allow_empty=False, max_length=500)
+
 # ----------------------
 # Clock In / Out
 # ----------------------
@@ -57,7 +87,7 @@ class ClockInRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClockInRecord
         fields = '__all__'
-        read_only_fields = ['waiter', 'clock_in_time']
+        read_only_fields = ['user', 'clock_in_time']
 
 # ----------------------
 # Meal + Feedback
@@ -66,25 +96,26 @@ class MealWithFeedbackSerializer(serializers.ModelSerializer):
     average_rating = serializers.SerializerMethodField()
     top_feedback = serializers.SerializerMethodField()
 
+    feedback_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Meal
-        fields = ['id', 'name', 'description', 'price', 'average_rating', 'top_feedback']
+        fields = ['id', 'name', 'description', 'price', 'average_rating', 'feedback_count', 'top_feedback']
 
+    # Expects Meal.objects.with_feedback_summary() so both fields are query-free
     def get_average_rating(self, meal):
-        feedbacks = Feedback.objects.filter(meal=meal)
-        if feedbacks.exists():
-            return round(sum(f.rating for f in feedbacks) / feedbacks.count(), 2)
-        return None
+        if meal.average_rating is None:
+            return None
+        return round(meal.average_rating, 2)
 
     def get_top_feedback(self, meal):
-        feedbacks = Feedback.objects.filter(meal=meal).order_by('-created_at')[:3]
-        return [f"{f.customer.username}: {f.comment}" for f in feedbacks if f.comment]
+        return [f"{f.customer.email}: {f.comment}" for f in meal.top_feedbacks]
 
 # ----------------------
 # Feedback
 # ----------------------
 class FeedbackSerializer(serializers.ModelSerializer):
-    customer_name = serializers.CharField(source='customer.username', read_only=True)
+    customer_name = serializers.CharField(source='customer.email', read_only=True)
     comment = serializers.CharField(required=False)
     tip = serializers.DecimalField(required=False, max_digits=10, decimal_places=2)
 
@@ -101,22 +132,36 @@ class FeedbackSerializer(serializers.ModelSerializer):
 # Meals
 # ----------------------
 class MealSerializer(serializers.ModelSerializer):
+    thumbnails = ThumbnailsField(source='image_meta')
+
     class Meta:
         model = Meal
-        fields = ['id', 'name', 'description', 'price', 'image', 'category', 'is_available']
+        fields = ['id', 'name', 'description', 'price', 'image', 'thumbnails', 'is_available']
 
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
 
+# ----------------------
+# Bulk / cart orders
+# ----------------------
+class BulkOrderItemSerializer(serializers.Serializer):
+    meal_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=20, default=1)
+
+class BulkOrderSerializer(serializers.Serializer):
+    items = BulkOrderItemSerializer(many=True, allow_empty=False, max_length=50)
+
 # ----------------------
 # Proof of Delivery Upload
 # ----------------------
 class ProofOfDeliverySerializer(serializers.ModelSerializer):
+    thumbnails = ThumbnailsField(source='image_meta')
+
     class Meta:
         model = ProofOfDelivery
-        fields = ['id', 'order', 'image', 'uploaded_at']
+        fields = ['id', 'order', 'image', 'thumbnails', 'uploaded_at']
         read_only_fields = ['uploaded_at']
 
 
@@ -124,18 +169,19 @@ class ProofOfDeliverySerializer(serializers.ModelSerializer):
 class ReceptionistProfileSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source='user.email', read_only=True)
     full_name = serializers.CharField(source='user.full_name', read_only=True)
+    profile_picture_thumbnails = ThumbnailsField(source='profile_picture_meta')
 
     class Meta:
         model = ReceptionistProfile
         fields = [
-            'id', 'email', 'full_name', 'profile_picture',
+            'id', 'email', 'full_name', 'profile_picture', 'profile_picture_thumbnails',
             'gender', 'clock_in_time', 'clock_out_time',
         ]
 
 
 # ShiftRosterSerializer
 class ShiftRosterSerializer(serializers.ModelSerializer):
-    receptionist_name = serializers.CharField(source='receptionist.user.full_name', read_only=True)
+    receptionist_name = serializers.CharField(source='receptionist.full_name', read_only=True)
 
     class Meta:
         model = ShiftRoster
@@ -144,17 +190,94 @@ class ShiftRosterSerializer(serializers.ModelSerializer):
             'shift_date', 'shift_start', 'shift_end', 'is_on_duty',
         ]
 
+    def validate(self, data):
+        # Same overlap rule as the bulk roster (core/roster.py)
+        fields = ('receptionist', 'shift_date', 'shift_start', 'shift_end')
+        shift = ShiftRoster(**{field: data.get(field, getattr(self.instance, field, None)) for field in fields})
+        others = existing_shifts(
+            [shift.receptionist_id], shift.shift_date, shift.shift_date, exclude=getattr(self.instance, 'pk', None)
+        )
+        for new, other in find_overlaps(others + [shift]):
+            if shift is new or shift is other:
+                clash = other if shift is new else new
+                raise serializers.ValidationError(
+                    f"Overlaps the {clash.shift_start:%H:%M}-{clash.shift_end:%H:%M} shift on {clash.shift_date}."
+                )
+        return data
+
+
+class RosterTemplateEntrySerializer(serializers.Serializer):
+    receptionist = serializers.PrimaryKeyRelatedField(queryset=ReceptionistProfile.objects.all())
+    weekdays = serializers.ListField(child=serializers.IntegerField(min_value=0, max_value=6), required=False)
+    days = serializers.ListField(child=serializers.IntegerField(min_value=1, max_value=31), required=False)
+    shift_start = serializers.TimeField()
+    shift_end = serializers.TimeField()
+    is_on_duty = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data.get('weekdays') and not data.get('days'):
+            raise serializers.ValidationError("Give the weekdays (0 = Monday) or days of the month this shift repeats on.")
+        if data['shift_start'] == data['shift_end']:
+            raise serializers.ValidationError("A shift cannot start and end at the same time.")
+        return data
+
+
+class RosterTemplateSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    replace = serializers.BooleanField(default=False)
+    entries = RosterTemplateEntrySerializer(many=True, allow_empty=False, max_length=200)
+
+    def validate(self, data):
+        span = (data['end_date'] - data['start_date']).days
+        if span < 0:
+            raise serializers.ValidationError("end_date must not be before start_date.")
+        if span >= MAX_ROSTER_DAYS:
+            raise serializers.ValidationError(f"A roster can cover at most {MAX_ROSTER_DAYS} days.")
+        return data
+
 #CRMCallLogSerializer
 class CRMCallLogSerializer(serializers.ModelSerializer):
-    receptionist_name = serializers.CharField(source='receptionist.user.full_name', read_only=True)
+    receptionist_name = serializers.CharField(source='receptionist.full_name', read_only=True)
 
     class Meta:
         model = CRMCallLog
         fields = [
             'id', 'receptionist', 'receptionist_name',
-            'customer_name', 'phone_number', 'reason_for_call',
+            'customer_name', 'phone_number', 'phone_e164', 'customer', 'reason_for_call',
             'follow_up_date', 'created_at', 'call_time','notes',
         ]
+        read_only_fields = ['phone_e164', 'customer']
+
+    def validate_phone_number(self, value):
+        return validate_phone(value)
+
+    def update(self, instance, validated_data):
+        # A new follow-up date is a new piece of work: back in the queue, unclaimed
+        if 'follow_up_date' in validated_data and validated_data['follow_up_date'] != instance.follow_up_date:
+            instance.follow_up_claimed_by = instance.follow_up_claimed_at = instance.follow_up_done_at = None
+        return super().update(instance, validated_data)
+
+
+class CRMFollowUpSerializer(CRMCallLogSerializer):
+    # Set by core/crm.py due_follow_ups()
+    overdue = serializers.BooleanField(read_only=True)
+    claimed_by_name = serializers.CharField(source='follow_up_claimed_by.full_name', read_only=True, default=None)
+
+    class Meta(CRMCallLogSerializer.Meta):
+        fields = CRMCallLogSerializer.Meta.fields + [
+            'overdue', 'follow_up_claimed_by', 'claimed_by_name', 'follow_up_claimed_at',
+        ]
+
+
+class CRMCallLogSearchSerializer(CRMCallLogSerializer):
+    # Set by core/search.py; lower rank is a better match
+    rank = serializers.FloatField(read_only=True)
+    reason_snippet = serializers.CharField(read_only=True)
+    notes_snippet = serializers.CharField(read_only=True)
+
+    class Meta(CRMCallLogSerializer.Meta):
+        fields = CRMCallLogSerializer.Meta.fields + ['rank', 'reason_snippet', 'notes_snippet']
 
 #Online customer
 class OnlineCustomerProfileSerializer(serializers.ModelSerializer):
@@ -162,6 +285,9 @@ class OnlineCustomerProfileSerializer(serializers.ModelSerializer):
         model = OnlineCustomerProfile
         fields = '__all__'
 
+    def validate_phone_number(self, value):
+        return validate_phone(value)
+
 #onsite customer
 class OnsiteCustomerProfileSerializer(serializers.ModelSerializer):
     waiter_name = serializers.SerializerMethodField()
@@ -173,3 +299,6 @@ class OnsiteCustomerProfileSerializer(serializers.ModelSerializer):
 
     def get_waiter_name(self, obj):
         return obj.waiter.full_name if obj.waiter else None
+
+    def validate_phone_number(self, value):
+        return validate_phone(value)
@@ -0,0 +1,135 @@
+# core/shifts.py
+
+from collections import defaultdict
+from datetime import datetime
+from itertools import accumulate
+
+from django.db import models
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import ClockInRecord, User
+
+BUCKET_SECONDS = 15 * 60
+OVERTIME_WEEKLY_HOURS = 40
+WEEK_SECONDS = 7 * 24 * 3600
+EPOCH_MONDAY = 4 * 24 * 3600  # 1970-01-05 was a Monday
+
+
+def clipped_shifts(start, end, user_ids=None):
+    """
+    Clock-in records overlapping [start, end), clipped to it, as a queryset of
+    (user_id, shift_start, shift_end) datetimes. Open shifts run until now
+    (or the end of the range). The WHERE clause only compares stored
+    columns, so it can be answered from clockin_range_idx.
+    """
+    now = timezone.now()
+    overlapping = models.Q(clock_out_time__gt=start) & models.Q(clock_out_time__gt=models.F('clock_in_time'))
+    if start < now:
+        overlapping |= models.Q(clock_out_time__isnull=True, clock_in_time__lt=now)
+    rows = ClockInRecord.objects.filter(overlapping, clock_in_time__lt=end)
+    if start >= end:
+        rows = rows.none()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    return (
+        rows.annotate(
+            shift_start=Greatest('clock_in_time', models.Value(start)),
+            shift_end=Least(Coalesce('clock_out_time', models.Value(now)), models.Value(end)),
+        )
+        .order_by()
+        .values_list('user_id', 'shift_start', 'shift_end')
+    )
+
+
+def aggregate(shifts, weekly_hours=OVERTIME_WEEKLY_HOURS, utc_offset=0, bucket_seconds=BUCKET_SECONDS):
+    """
+    Per-user totals and the headcount series for `shifts` (clipped_shifts()),
+    in a single pass over the rows:
+
+    * staff: [(user_id, shifts, seconds, overtime seconds)], most hours first.
+      Shifts crossing local Monday midnight are split there, summed per user
+      and week, and any week over `weekly_hours` adds its excess to the overtime.
+    * headcount: [(bucket_start, count)] for the buckets where the number of
+      staff on shift changes, a sweep over the sorted +1/-1 change points.
+    """
+    shift = utc_offset - EPOCH_MONDAY
+    counts = defaultdict(int)
+    weekly = defaultdict(int)  # (user, week number) -> seconds
+    changes = defaultdict(int)  # bucket number -> change in staff on shift
+    for user_id, shift_start, shift_end in shifts.iterator(chunk_size=5000):
+        shift_start, shift_end = int(shift_start.timestamp()), int(shift_end.timestamp())
+        if shift_end <= shift_start:  # under a second once truncated
+            continue
+        counts[user_id] += 1
+        changes[shift_start // bucket_seconds] += 1
+        changes[-(-shift_end // bucket_seconds)] -= 1  # first bucket after the shift
+
+        local_start, local_end = shift_start + shift, shift_end + shift
+        week = local_start // WEEK_SECONDS
+        if (local_end - 1) // WEEK_SECONDS == week:  # the common case
+            weekly[(user_id, week)] += local_end - local_start
+            continue
+        while local_start < local_end:
+            boundary = min((week + 1) * WEEK_SECONDS, local_end)
+            weekly[(user_id, week)] += boundary - local_start
+            local_start, week = boundary, week + 1
+
+    limit = weekly_hours * 3600
+    seconds, overtime = defaultdict(int), defaultdict(int)
+    for (user_id, _), total in weekly.items():
+        seconds[user_id] += total
+        overtime[user_id] += max(total - limit, 0)
+    staff = sorted(
+        ((user_id, counts[user_id], seconds[user_id], overtime[user_id]) for user_id in counts),
+        key=lambda row: (-row[2], row[0]),
+    )
+
+    points = sorted(changes)
+    series, last = [], None
+    for point, count in zip(points, accumulate(changes[point] for point in points)):
+        if count != last:
+            series.append((point * bucket_seconds, count))
+            last = count
+    return staff, series
+
+
+def shift_report(start, end, user_ids=None):
+    """Hours, overtime and 15-minute headcount for [start, end)."""
+    offset = int(timezone.localtime(start).utcoffset().total_seconds())
+    totals, series = aggregate(clipped_shifts(start, end, user_ids), utc_offset=offset)
+    emails = dict(User.objects.filter(pk__in=[row[0] for row in totals]).values_list('id', 'email'))
+
+    zone = timezone.get_current_timezone()
+
+    def at(epoch):
+        return datetime.fromtimestamp(epoch, tz=zone).isoformat()
+
+    peak = max(series, key=lambda point: point[1], default=(None, 0))
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket_minutes": BUCKET_SECONDS // 60,
+        "overtime_after_hours_per_week": OVERTIME_WEEKLY_HOURS,
+        "staff": [
+            {
+                "user_id": user_id,
+                "email": emails.get(user_id),
+                "shifts": shift_count,
+                "hours": round(seconds / 3600, 2),
+                "overtime_hours": round(overtime / 3600, 2),
+            }
+            for user_id, shift_count, seconds, overtime in totals
+        ],
+        "headcount": {
+            "peak": peak[1],
+            "peak_at": at(peak[0]) if peak[0] is not None else None,
+            # Each entry holds until the next one
+            "changes": [[at(point), count] for point, count in series],
+        },
+    }
+
+
+def close_open_shifts(at=None):
+    """Clocks out everyone still on shift in one UPDATE. Returns how many were closed."""
+    return ClockInRecord.objects.filter(clock_out_time__isnull=True).update(clock_out_time=at or timezone.now())
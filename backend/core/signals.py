@@ -1,8 +1,199 @@
-from django.db.models.signals import post_save
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import User, WaiterProfile
+from django.utils import timezone
+from .models import User, WaiterProfile, Meal, Order, Feedback, DeliveryPersonnelProfile, CRMCallLog
+from .menu import bump_menu_version
+from .stats import bump, role_key
+from .ledger import FEEDBACK_FIELDS, feedback_row, post
+from .sales import record_delivery, record_tip
+from .realtime import publish_order_event
+from .dispatch import get_dispatcher
+from .images import IMAGE_FIELDS, needs_processing, enqueue
+from .crm import get_follow_up_scheduler
 
 # @receiver(post_save, sender=User)
 # def create_waiter_profile(sender, instance, created, **kwargs):
 #     if created and instance.role == 'waiter':
 #         WaiterProfile.objects.create(user=instance)
+
+
+# Menu version behind the ETag (covers admin, forms and the toggle APIs; see core/menu.py)
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+def bump_menu_version_on_change(sender, instance, **kwargs):
+    transaction.on_commit(bump_menu_version)
+
+
+# Admin stats rollup (see core/stats.py, repair drift with `rebuild_stats`)
+def remember_previous(instance, *fields):
+    """
+    Stashes the stored value of `fields` before an update so post_save can diff
+    it: a single value for one field, a tuple for several.
+    """
+    if instance._state.adding or instance.pk is None:
+        instance._previous_value = None
+    else:
+        instance._previous_value = (
+            type(instance).objects.filter(pk=instance.pk).values_list(*fields, flat=len(fields) == 1).first()
+        )
+
+
+@receiver(pre_save, sender=User)
+def user_stats_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and 'role' not in update_fields:
+        # e.g. the last_login update on every login: the role cannot change, skip the SELECT
+        instance._previous_value = None
+        return
+    remember_previous(instance, 'role')
+
+
+@receiver(post_save, sender=User)
+def user_stats_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        bump({'users': 1, role_key(instance.role): 1})
+    else:
+        previous = getattr(instance, '_previous_value', None)
+        if previous is not None and previous != instance.role:
+            bump({role_key(previous): -1, role_key(instance.role): 1})
+
+
+@receiver(post_delete, sender=User)
+def user_stats_post_delete(sender, instance, **kwargs):
+    bump({'users': -1, role_key(instance.role): -1})
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Meal)
+def count_stats_post_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump({'orders' if sender is Order else 'meals': 1})
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Meal)
+def count_stats_post_delete(sender, instance, **kwargs):
+    bump({'orders' if sender is Order else 'meals': -1})
+
+
+@receiver(pre_save, sender=Feedback)
+def feedback_stats_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        remember_previous(instance, *FEEDBACK_FIELDS)
+
+
+@receiver(post_save, sender=Feedback)
+def feedback_stats_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    tip = Decimal(str(instance.tip or 0))
+    previous = None if created else getattr(instance, '_previous_value', None)
+    if created:
+        bump({'feedback': 1, 'tips': tip})
+    else:
+        previous_tip = previous[0] if previous else 0
+        bump({'tips': tip - (previous_tip or 0)})
+    # Courier and waiter running totals (core/ledger.py, repair with `reconcile_tips`)
+    post(new=feedback_row(instance), old=previous)
+    # Sales rollup bucket of the order (core/sales.py)
+    record_tip(instance.order_id, tip - Decimal(str(previous[0] or 0)) if previous else tip)
+
+
+@receiver(post_delete, sender=Feedback)
+def feedback_stats_post_delete(sender, instance, **kwargs):
+    bump({'feedback': -1, 'tips': -Decimal(str(instance.tip or 0))})
+    post(old=feedback_row(instance))
+    record_tip(instance.order_id, -Decimal(str(instance.tip or 0)))
+
+
+# Sales rollups (core/sales.py, repair with `rebuild_sales_rollups`). Deliveries
+# through apply_transition() are recorded there; these catch plain saves (admin).
+@receiver(pre_save, sender=Order)
+def sales_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.status == 'delivered' and instance.delivered_at is None:
+        instance.delivered_at = timezone.now()
+    elif instance.status != 'delivered' and instance.delivered_at is not None:
+        # Moved back out of delivered: post_save takes it out of this bucket
+        instance._undelivered_at, instance.delivered_at = instance.delivered_at, None
+
+
+@receiver(post_save, sender=Order)
+def sales_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_value', None)
+    undelivered_at = instance.__dict__.pop('_undelivered_at', None)
+    if instance.status == 'delivered':
+        if created or (previous is not None and previous != 'delivered'):
+            record_delivery(instance)
+    elif previous == 'delivered' and undelivered_at is not None:
+        record_delivery(instance, sign=-1, delivered_at=undelivered_at)
+
+
+@receiver(post_delete, sender=Order)
+def sales_post_delete(sender, instance, **kwargs):
+    if instance.status == 'delivered' and instance.delivered_at is not None:
+        record_delivery(instance, sign=-1)
+
+
+# Live order board (core/realtime.py)
+@receiver(pre_save, sender=Order)
+def order_events_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        remember_previous(instance, 'status')
+
+
+@receiver(post_save, sender=Order)
+def order_events_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        transaction.on_commit(lambda: publish_order_event(instance, 'order.created'))
+        return
+    previous = getattr(instance, '_previous_value', None)
+    if previous is not None and previous != instance.status:
+        transaction.on_commit(lambda: publish_order_event(instance, 'order.status', previous))
+
+
+# Courier dispatch index (core/dispatch.py)
+@receiver(post_save, sender=DeliveryPersonnelProfile)
+def dispatch_courier_moved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_dispatcher().update_courier(instance.user_id, instance.transport_method, instance.current_location)
+
+
+@receiver(post_delete, sender=DeliveryPersonnelProfile)
+def dispatch_courier_removed(sender, instance, **kwargs):
+    get_dispatcher().update_courier(instance.user_id, instance.transport_method, '')
+
+
+# CRM follow-ups falling due later get a wake-up in the scheduler (core/crm.py)
+@receiver(post_save, sender=CRMCallLog)
+def schedule_follow_up(sender, instance, raw=False, **kwargs):
+    if not raw and instance.follow_up_date is not None:
+        transaction.on_commit(lambda: get_follow_up_scheduler().schedule(instance))
+
+
+@receiver(post_delete, sender=CRMCallLog)
+def cancel_follow_up(sender, instance, **kwargs):
+    if instance.follow_up_date is not None:
+        log_id, day = instance.pk, instance.follow_up_date
+        transaction.on_commit(lambda: get_follow_up_scheduler().cancel(log_id, day))
+
+
+# Thumbnails for uploaded images, rendered off the request by core/images.py
+def queue_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and needs_processing(instance):
+        enqueue(instance)
+
+
+for image_model in IMAGE_FIELDS:
+    post_save.connect(queue_thumbnails, sender=image_model, dispatch_uid=f'thumbnails-{image_model.__name__}')
@@ -0,0 +1,67 @@
+# core/stats.py
+
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F
+
+from .models import StatsCounter, User, Order, Meal, Feedback
+
+
+def role_key(role):
+    return f'users:{role}'
+
+
+def bump(deltas):
+    """Applies {key: delta} to the rollup with atomic F() updates."""
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        updated = StatsCounter.objects.filter(key=key).update(value=F('value') + delta)
+        if not updated:
+            counter, created = StatsCounter.objects.get_or_create(key=key, defaults={'value': delta})
+            if not created:
+                StatsCounter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def compute_stats():
+    """Recomputes every counter from the source tables."""
+    totals = {
+        'users': User.objects.count(),
+        'orders': Order.objects.count(),
+        'meals': Meal.objects.count(),
+        'feedback': Feedback.objects.count(),
+        'tips': Feedback.objects.aggregate(total=models.Sum('tip'))['total'] or 0,
+    }
+    for row in User.objects.values('role').order_by().annotate(count=models.Count('id')):
+        totals[role_key(row['role'])] = row['count']
+    return totals
+
+
+@transaction.atomic
+def rebuild_stats():
+    """Replaces the rollup with freshly computed totals to repair drift."""
+    totals = compute_stats()
+    StatsCounter.objects.all().delete()
+    StatsCounter.objects.bulk_create(
+        StatsCounter(key=key, value=value) for key, value in totals.items()
+    )
+    return totals
+
+
+def get_stats():
+    """Reads the whole rollup in one query."""
+    counters = dict(StatsCounter.objects.values_list('key', 'value'))
+    users_by_role = {
+        key.split(':', 1)[1]: int(value)
+        for key, value in counters.items()
+        if key.startswith('users:') and value
+    }
+    return {
+        "total_users": int(counters.get('users', 0)),
+        "users_by_role": users_by_role,
+        "total_orders": int(counters.get('orders', 0)),
+        "total_meals": int(counters.get('meals', 0)),
+        "total_feedback": int(counters.get('feedback', 0)),
+        "total_tips": f"{counters.get('tips', Decimal(0)):.2f}",
+    }
@@ -0,0 +1,55 @@
+# core/storage.py
+
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# <dir>/<first two hex digits>/<sha256>.<ext>, as written by ContentAddressedStorage
+HASHED_PATH = re.compile(r'^(?:[\w-]+/)+[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+def file_digest(content):
+    """SHA-256 of a File, reusing the one HashingUploadHandler computed while streaming."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    content.sha256 = hasher.hexdigest()
+    return content.sha256
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file as <upload dir>/<aa>/<sha256>.<ext>. Identical bytes map
+    to the same name, so a repeated upload is not written again, and a name
+    never changes content, which is what lets media be cached as immutable.
+    """
+
+    def content_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = file_digest(content)
+        return os.path.join(directory, digest[:2], f"{digest}{extension}").replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def is_content_addressed(name):
+    return bool(HASHED_PATH.match(name))
@@ -1,3 +1,1324 @@
-from django.test import TestCase
+import asyncio
+import heapq
+import json
+import random
+import tempfile
+import threading
+from base64 import b64encode
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .bulk import DATASETS, import_records, read_records
+from .crm import FollowUpScheduler, follow_up_due_at, get_follow_up_scheduler
+from .dispatch import CourierIndex, Dispatcher, LOAD_PENALTY_KM, distance_km
+from .images import THUMBNAIL_SIZES, _run_in_worker, needs_processing, process_image
+from .ledger import reconcile
+from .locations import LocationBuffer
+from .phones import normalize_phone
+from .realtime import InProcessBroker, get_broker
+from .sales import rebuild as rebuild_sales
+from .search import match_expression, search_call_logs
+from .shifts import shift_report
+from .stats import get_stats
+from .utils import parse_date_range
+from .models import (
+    User, Meal, Order, OrderEvent, Feedback, ProofOfDelivery, DeliveryPersonnelProfile, WaiterProfile,
+    ClockInRecord, ReceptionistProfile, ShiftRoster, CRMCallLog, OnlineCustomerProfile, SalesRollup, StatsCounter,
+)
+from .order_state import apply_transition, IllegalTransition, TransitionConflict
+from .views import media_file
+
+
+class WaiterDashboardQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.waiter = User.objects.create_user(email='waiter@example.com', password='pass', role='waiter')
+        self.customer = User.objects.create_user(email='guest@example.com', password='pass', role='onsite_customer')
+        self.client.force_authenticate(self.waiter)
+
+    def add_meals(self, count):
+        for i in range(count):
+            meal = Meal.objects.create(name=f'Meal {i}', description='...', price=100)
+            for rating in (3, 4, 5, 5):
+                order = Order.objects.create(customer=self.customer, meal=meal, status='delivered')
+                Feedback.objects.create(order=order, meal=meal, customer=self.customer, rating=rating, comment=f'Rated {rating}')
+
+    def test_query_count_is_constant(self):
+        self.add_meals(2)
+        with self.assertNumQueries(2):
+            self.client.get('/api/waiter/dashboard/')
+
+        self.add_meals(20)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/waiter/dashboard/')
+
+        self.assertEqual(len(response.data), 22)
+        meal = response.data[0]
+        self.assertEqual(meal['average_rating'], 4.25)
+        self.assertEqual(meal['feedback_count'], 4)
+        self.assertEqual(len(meal['top_feedback']), 3)
+
+
+class BulkOrderTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        self.pilau = Meal.objects.create(name='Pilau', description='...', price=300)
+        self.chai = Meal.objects.create(name='Chai', description='...', price=50)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def order(self, items):
+        return self.client.post('/api/orders/bulk/', {'items': items}, format='json')
+
+    def test_places_every_item_in_one_request(self):
+        with mock.patch('core.views.publish_order_event') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.order([{'meal_id': self.pilau.pk, 'quantity': 2}, {'meal_id': self.chai.pk}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['order_ids']), 3)
+        orders = Order.objects.filter(pk__in=response.data['order_ids'])
+        self.assertEqual(sorted(orders.values_list('meal_id', flat=True)), sorted([self.pilau.pk] * 2 + [self.chai.pk]))
+        self.assertTrue(all(order.is_delivery and order.customer == self.customer for order in orders))
+        self.assertEqual(publish.call_count, 3)
+        self.assertEqual(get_stats()['total_orders'], 3)
+
+    def test_unavailable_meals_reject_the_whole_order(self):
+        Meal.objects.filter(pk=self.chai.pk).update(is_available=False)
+        response = self.order([{'meal_id': self.pilau.pk}, {'meal_id': self.chai.pk}, {'meal_id': 9999}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['meal_ids'], [self.chai.pk, 9999])
+        self.assertFalse(Order.objects.exists())
+
+    def test_quantity_and_item_limits(self):
+        for quantity in (0, 21):
+            self.assertEqual(self.order([{'meal_id': self.pilau.pk, 'quantity': quantity}]).status_code, 400)
+        self.assertEqual(self.order([]).status_code, 400)
+        self.assertEqual(self.order([{'meal_id': self.pilau.pk}] * 51).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(self.order([{'meal_id': self.pilau.pk, 'quantity': 20}] * 50).status_code, 201)
+        self.assertEqual(Order.objects.count(), 1000)
+
+        self.client.force_authenticate(User.objects.create_user(email='waiter@example.com', password='pass', role='waiter'))
+        self.assertEqual(self.order([{'meal_id': self.pilau.pk}]).status_code, 403)
+
+
+class MyOrdersTests(TestCase):
+    def test_orders_with_meal_name_and_tip_from_one_query(self):
+        customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        other = User.objects.create_user(email='other@example.com', password='pass', role='online_customer')
+        meal = Meal.objects.create(name='Pilau', description='...', price=300)
+        tipped, untipped = Order.objects.create(customer=customer, meal=meal), Order.objects.create(customer=customer, meal=meal)
+        Order.objects.create(customer=other, meal=meal)
+        Feedback.objects.create(order=tipped, meal=meal, customer=customer, rating=5, tip=Decimal('30'))
+        client = APIClient()
+        client.force_authenticate(customer)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/orders/my/')
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results']
+        self.assertEqual([row['id'] for row in rows], [untipped.pk, tipped.pk])
+        self.assertEqual(set(rows[0]), {'id', 'meal', 'status', 'created_at', 'tip'})
+        self.assertEqual((rows[0]['meal'], rows[0]['status'], rows[0]['tip']), ('Pilau', 'pending', Decimal('0')))
+        self.assertEqual(rows[1]['tip'], Decimal('30'))
+
+
+class RealtimeBoardTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch('core.realtime._broker', InProcessBroker()))
+        self.waiter = User.objects.create_user(email='waiter@example.com', password='pass', role='waiter')
+        self.desk = User.objects.create_user(email='desk@example.com', password='pass', role='receptionist')
+        self.guest = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        self.tokens = {user: Token.objects.create(user=user).key for user in (self.waiter, self.desk, self.guest)}
+
+    async def test_broker_fans_out_and_drops_the_oldest_event(self):
+        broker = get_broker()
+        with broker.subscribe(maxsize=2) as first, broker.subscribe() as second:
+            # publish() comes from sync views in worker threads
+            thread = threading.Thread(target=lambda: [broker.publish({'n': n}) for n in range(3)])
+            thread.start()
+            thread.join()
+            self.assertEqual([await second.get() for _ in range(3)], [{'n': 0}, {'n': 1}, {'n': 2}])
+            self.assertEqual([await first.get(), await first.get()], [{'n': 1}, {'n': 2}])
+        broker.publish({'n': 3})
+        self.assertEqual(broker._subscribers, set())
+
+    async def connect(self, path, user=None):
+        """Opens a socket on the ASGI app; returns (messages sent back, inbox, task)."""
+        from hotel.asgi import application
+
+        inbox, sent = asyncio.Queue(), asyncio.Queue()
+        await inbox.put({'type': 'websocket.connect'})
+        query = f'token={self.tokens[user]}' if user else 'token=nope'
+        scope = {'type': 'websocket', 'path': path, 'query_string': query.encode()}
+        task = asyncio.ensure_future(application(scope, inbox.get, sent.put))
+        return sent, inbox, task
+
+    async def test_sockets_need_a_token_for_an_allowed_role(self):
+        for path, user in (('/ws/orders/', None), ('/ws/orders/', self.guest), ('/ws/follow-ups/', self.waiter)):
+            sent, _, task = await self.connect(path, user)
+            self.assertEqual(await asyncio.wait_for(sent.get(), 5), {'type': 'websocket.close', 'code': 4403})
+            await task
+        sent, _, task = await self.connect('/ws/elsewhere/', self.waiter)
+        self.assertEqual((await asyncio.wait_for(sent.get(), 5))['code'], 4404)
+        await task
+
+    async def test_order_board_forwards_only_order_events(self):
+        sent, inbox, task = await self.connect('/ws/orders/', self.waiter)
+        self.assertEqual(await asyncio.wait_for(sent.get(), 5), {'type': 'websocket.accept'})
+        broker = get_broker()
+        while not broker._subscribers:
+            await asyncio.sleep(0.01)
+        broker.publish({'event': 'crm.follow_up_due'})
+        broker.publish({'event': 'order.created', 'order': {'id': 1}})
+        message = await asyncio.wait_for(sent.get(), 5)
+        self.assertEqual(json.loads(message['text'])['event'], 'order.created')
+
+        await inbox.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(broker._subscribers, set())
+
+    async def test_follow_up_board_starts_the_scheduler_on_first_connect(self):
+        with mock.patch('core.consumers.get_follow_up_scheduler') as scheduler:
+            sent, inbox, task = await self.connect('/ws/follow-ups/', self.desk)
+            self.assertEqual(await asyncio.wait_for(sent.get(), 5), {'type': 'websocket.accept'})
+            while not scheduler.return_value.start.called:
+                await asyncio.sleep(0.01)
+            await inbox.put({'type': 'websocket.disconnect'})
+            await asyncio.wait_for(task, 5)
+        scheduler.return_value.start.assert_called_once_with()
+
+
+class OrderStateMachineTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        meal = Meal.objects.create(name='Pilau', description='...', price=300)
+        self.order = Order.objects.create(customer=customer, meal=meal)
+
+    def test_transition_updates_status_and_logs_event(self):
+        apply_transition(self.order, 'preparing')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'preparing')
+        event = OrderEvent.objects.get(order=self.order)
+        self.assertEqual((event.from_status, event.to_status), ('pending', 'preparing'))
+
+    def test_illegal_transition_is_rejected(self):
+        with self.assertRaises(IllegalTransition):
+            apply_transition(self.order, 'delivered')
+        with self.assertRaises(IllegalTransition):
+            apply_transition(self.order, 'out_for_delivery')
+
+    def test_legacy_status_gets_400_and_is_migrated(self):
+        Order.objects.filter(pk=self.order.pk).update(status='out_for_delivery')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='boss@example.com', password='pass', role='admin'))
+        response = client.patch(f'/api/orders/{self.order.pk}/status/', {'status': 'delivered'}, format='json')
+        self.assertEqual((response.status_code, response.data['allowed']), (400, []))
+
+        import_module('core.migrations.0023_order_legacy_statuses').map_legacy_statuses(django_apps, None)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'ready')
+        apply_transition(self.order, 'delivered')
+
+    def test_stale_status_conflicts_instead_of_overwriting(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        apply_transition(self.order, 'cancelled')
+        with self.assertRaises(TransitionConflict):
+            apply_transition(stale, 'preparing')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertEqual(OrderEvent.objects.count(), 1)
+
+
+class ProofUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+        courier = User.objects.create_user(email='rider@example.com', password='pass', role='delivery')
+        customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        meal = Meal.objects.create(name='Pilau', description='...', price=300)
+        self.order = Order.objects.create(customer=customer, meal=meal, is_delivery=True, delivery_person=courier)
+        self.url = f'/api/delivery/orders/{self.order.id}/upload-proof/'
+        self.client = APIClient()
+        self.client.force_authenticate(courier)
+
+    def photo(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), color).save(buffer, 'PNG')
+        return SimpleUploadedFile('door.png', buffer.getvalue(), content_type='image/png')
+
+    def test_identical_reupload_is_deduplicated(self):
+        first = self.client.post(self.url, {'image': self.photo()}, format='multipart')
+        self.assertEqual(first.status_code, 201)
+        second = self.client.post(self.url, {'image': self.photo()}, format='multipart')
+        self.assertEqual(second.status_code, 200)
+
+        proof = ProofOfDelivery.objects.get(order=self.order)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(len(proof.checksum), 64)
+        self.assertIn(proof.checksum, proof.image.name)
+
+        replaced = self.client.post(self.url, {'image': self.photo('blue')}, format='multipart')
+        self.assertEqual(replaced.status_code, 200)
+        self.assertNotEqual(ProofOfDelivery.objects.get(order=self.order).checksum, proof.checksum)
+
+    def test_rejects_non_images_and_oversized_files(self):
+        junk = SimpleUploadedFile('door.png', b'not an image', content_type='image/png')
+        self.assertEqual(self.client.post(self.url, {'image': junk}, format='multipart').status_code, 400)
+
+        with self.settings(PROOF_UPLOAD_MAX_BYTES=32):
+            response = self.client.post(self.url, {'image': self.photo()}, format='multipart')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(ProofOfDelivery.objects.exists())
+
+    def test_stored_extension_comes_from_the_image_format(self):
+        upload = self.photo()
+        upload.name = 'door.html'
+        self.assertEqual(self.client.post(self.url, {'image': upload}, format='multipart').status_code, 201)
+        name = ProofOfDelivery.objects.get(order=self.order).image.name
+        self.assertRegex(name, r'^proofs/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/png'))
+
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, 'BMP')
+        bitmap = SimpleUploadedFile('door.jpg', buffer.getvalue(), content_type='image/jpeg')
+        self.assertEqual(self.client.post(self.url, {'image': bitmap}, format='multipart').status_code, 400)
+
+    def test_dot_segments_cannot_reach_proofs(self):
+        self.assertEqual(self.client.post(self.url, {'image': self.photo()}, format='multipart').status_code, 201)
+        name = ProofOfDelivery.objects.get(order=self.order).image.name
+        for url in (f'/media/meals/%2e%2e/{name}', f'/media/meals/../{name}', f'/media/meals/.%2e/{name}', f'/media/meals//{name}'):
+            self.assertEqual(APIClient().get(url).status_code, 404, url)
+        # The view checks on its own too, whatever route reaches it
+        for path in (f'meals/../{name}', f'meals/./../{name}', f'/{name}', f'{name}/'):
+            with self.assertRaises(Http404):
+                media_file(RequestFactory().get('/'), path)
+
+    def test_proof_photos_are_only_served_to_the_order_parties(self):
+        self.assertEqual(self.client.post(self.url, {'image': self.photo()}, format='multipart').status_code, 201)
+        proof = ProofOfDelivery.objects.get(order=self.order)
+        thumbnail = default_storage.save(f'thumbs/{proof.image.name}', ContentFile(b'thumb'))
+        ProofOfDelivery.objects.filter(pk=proof.pk).update(image_meta={'thumbnails': {'160': thumbnail}})
+        stranger = User.objects.create_user(email='other@example.com', password='pass', role='online_customer')
+        admin = User.objects.create_user(email='boss@example.com', password='pass', role='admin')
+
+        for path in (proof.image.name, thumbnail):
+            url = f'/media/{path}'
+            self.assertEqual(APIClient().get(url).status_code, 401)
+            for user, expected in ((stranger, 403), (self.order.customer, 200), (self.order.delivery_person, 200), (admin, 200)):
+                client = APIClient()
+                client.force_authenticate(user)
+                response = client.get(url)
+                self.assertEqual(response.status_code, expected, (path, user.email))
+            self.assertTrue(response['Cache-Control'].startswith('private'))
+
+        token = Token.objects.create(user=self.order.customer)
+        self.assertEqual(APIClient().get(f'/media/{thumbnail}', HTTP_AUTHORIZATION=f'Token {token.key}').status_code, 200)
+        self.assertEqual(APIClient().get(f'/media/{thumbnail}', HTTP_AUTHORIZATION='Token nope').status_code, 401)
+
+
+class ContentAddressedMediaTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media_root = media.name
+
+    def test_identical_uploads_share_one_file(self):
+        first = default_storage.save('meals/pilau.JPG', ContentFile(b'same bytes'))
+        second = default_storage.save('meals/other-name.jpg', ContentFile(b'same bytes'))
+        third = default_storage.save('meals/pilau.jpg', ContentFile(b'new bytes'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertRegex(first, r'^meals/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(len(default_storage.listdir(first.rsplit('/', 1)[0])[1]), 1)
+
+    def test_hashed_media_is_served_as_immutable(self):
+        name = default_storage.save('meals/pilau.jpg', ContentFile(b'bytes'))
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(response['Cache-Control'].startswith('public'))
+
+        with open(f'{self.media_root}/secret.txt', 'w') as f:
+            f.write('not an upload')
+        self.assertEqual(self.client.get('/media/secret.txt').status_code, 404)
+
+
+class ImageWorkerTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def upload(self, name, content):
+        name = default_storage.save(name, ContentFile(content))
+        return name, Meal.objects.create(name='Pilau', description='...', price=300, image=name)
+
+    def test_thumbnails_meta_and_an_original_without_exif(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees
+        exif[0x010F] = 'Camera Maker'
+        buffer = BytesIO()
+        Image.new('RGB', (80, 40), 'red').save(buffer, 'JPEG', exif=exif)
+        name, meal = self.upload('meals/pilau.jpg', buffer.getvalue())
+
+        process_image(Meal, meal.pk, name)
+        meal.refresh_from_db()
+        meta = meal.image_meta
+        self.assertNotEqual(meal.image.name, name)
+        self.assertEqual(meta['source'], meal.image.name)
+        self.assertEqual((meta['width'], meta['height']), (40, 80))
+        self.assertEqual(set(meta['thumbnails']), {str(size) for size in THUMBNAIL_SIZES})
+        for path in meta['thumbnails'].values():
+            self.assertTrue(default_storage.exists(path))
+        self.assertFalse(default_storage.exists(name))
+        with default_storage.open(meal.image.name) as f, Image.open(f) as stored:
+            self.assertEqual(len(stored.getexif()), 0)
+            self.assertEqual(stored.size, (40, 80))
+        self.assertFalse(needs_processing(meal))
+
+    def test_original_without_exif_is_kept(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (30, 30), 'blue').save(buffer, 'PNG')
+        name, meal = self.upload('meals/pilau.png', buffer.getvalue())
+
+        process_image(Meal, meal.pk, name)
+        meal.refresh_from_db()
+        self.assertEqual(meal.image.name, name)
+        self.assertEqual(meal.image_meta['source'], name)
+
+    def test_broken_image_is_logged_and_left_alone(self):
+        name, meal = self.upload('meals/pilau.jpg', b'not an image')
+        with mock.patch('core.images.close_old_connections'), mock.patch('core.images.connection'):
+            with self.assertLogs('core.images', 'ERROR'):
+                _run_in_worker(Meal, meal.pk, name)
+        meal.refresh_from_db()
+        self.assertEqual(meal.image_meta, {})
+        self.assertTrue(needs_processing(meal))
+
+
+class TipLedgerTests(TestCase):
+    def setUp(self):
+        self.waiter = User.objects.create_user(email='waiter@example.com', password='pass', role='waiter')
+        self.rider = User.objects.create_user(email='rider@example.com', password='pass', role='delivery')
+        self.other_rider = User.objects.create_user(email='rider2@example.com', password='pass', role='delivery')
+        WaiterProfile.objects.create(user=self.waiter)
+        DeliveryPersonnelProfile.objects.create(user=self.rider)
+        DeliveryPersonnelProfile.objects.create(user=self.other_rider)
+        self.meal = Meal.objects.create(name='Pilau', description='...', price=300)
+
+    def feedback(self, rating, tip, courier=None):
+        order = Order.objects.create(customer=self.waiter, meal=self.meal, status='delivered')
+        return Feedback.objects.create(
+            order=order, meal=self.meal, customer=self.waiter, delivery_personnel=courier, rating=rating, tip=tip
+        )
+
+    def totals(self, user):
+        profile = DeliveryPersonnelProfile.objects.get(user=user)
+        return profile.tips_earned, profile.upvotes
+
+    def test_totals_follow_feedback_changes(self):
+        first = self.feedback(5, '50.00', courier=self.rider)
+        self.feedback(2, '10.00', courier=self.rider)
+        self.assertEqual(self.totals(self.rider), (Decimal('60.00'), 1))
+
+        first.rating, first.tip, first.delivery_personnel = 3, Decimal('20.00'), self.other_rider
+        first.save()
+        self.assertEqual(self.totals(self.rider), (Decimal('10.00'), 0))
+        self.assertEqual(self.totals(self.other_rider), (Decimal('20.00'), 0))
+
+        first.delete()
+        self.assertEqual(self.totals(self.other_rider), (Decimal('0.00'), 0))
+        waiter = WaiterProfile.objects.get(user=self.waiter)
+        self.assertEqual((waiter.total_tips(), waiter.votes_received()), (Decimal('10.00'), 1))
+        self.assertEqual(reconcile(), 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.feedback(4, '15.00', courier=self.rider)
+        DeliveryPersonnelProfile.objects.filter(user=self.rider).update(tips_earned=999, upvotes=7)
+        WaiterProfile.objects.update(votes=0)
+        self.assertEqual(reconcile(), 2)
+        self.assertEqual(self.totals(self.rider), (Decimal('15.00'), 1))
+        self.assertEqual(WaiterProfile.objects.get(user=self.waiter).votes, 1)
+
+
+class RoleReportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='boss@example.com', password='pass', role='admin'))
+        meal = Meal.objects.create(name='Pilau', description='...', price=300)
+        self.amina = User.objects.create_user(email='amina@example.com', password='pass', role='online_customer')
+        self.brian = User.objects.create_user(email='brian@example.com', password='pass', role='online_customer')
+        User.objects.create_user(email='waiter@example.com', password='pass', role='waiter')
+        march, april = (
+            Order.objects.create(customer=self.amina, meal=meal),
+            Order.objects.create(customer=self.amina, meal=meal),
+        )
+        Order.objects.filter(pk=march.pk).update(created_at=datetime(2026, 3, 10, 12, tzinfo=dt_timezone.utc))
+        Order.objects.filter(pk=april.pk).update(created_at=datetime(2026, 4, 10, 12, tzinfo=dt_timezone.utc))
+        Feedback.objects.create(order=march, meal=meal, customer=self.amina, rating=5, tip=Decimal('50'))
+        Feedback.objects.create(order=april, meal=meal, customer=self.amina, rating=4, tip=Decimal('20'))
+
+    def report(self, **params):
+        response = self.client.get('/api/admin/reports/', params)
+        if response.status_code != 200:
+            return response.status_code, response.data
+        return 200, json.loads(b''.join(response.streaming_content))
+
+    def test_totals_per_user_from_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            status, body = self.report(role='online_customer')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['user_count'], 2)
+        self.assertEqual((body['start'], body['end']), (None, None))
+        self.assertEqual(body['report'], [
+            {'id': self.amina.pk, 'email': 'amina@example.com', 'total_orders': 2, 'total_tips': 70.0},
+            {'id': self.brian.pk, 'email': 'brian@example.com', 'total_orders': 0, 'total_tips': 0.0},
+        ])
+
+    def test_date_range_scopes_the_orders(self):
+        status, body = self.report(role='online_customer', start='2026-03-01', end='2026-03-31')
+        self.assertEqual(body['report'][0]['total_orders'], 1)
+        self.assertEqual(body['report'][0]['total_tips'], 50.0)
+        self.assertEqual(body['end'], '2026-04-01T00:00:00+00:00')
+
+        self.assertEqual(self.report(role='online_customer', start='last tuesday')[0], 400)
+        self.assertEqual(self.report(role='chef')[0], 400)
+        self.client.force_authenticate(self.brian)
+        self.assertEqual(self.report(role='online_customer')[0], 403)
+
+    def test_parse_date_range(self):
+        self.assertEqual(parse_date_range({}), (None, None))
+        start, end = parse_date_range({'start': '2026-03-01', 'end': '2026-03-31'})
+        self.assertEqual(start, datetime(2026, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2026, 4, 1, tzinfo=dt_timezone.utc))  # a bare end date includes the day
+        start, end = parse_date_range({'from': '2026-03-01T08:30:00', 'to': '2026-03-01T17:00:00+03:00'}, 'from', 'to')
+        self.assertEqual(start, datetime(2026, 3, 1, 8, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2026, 3, 1, 14, tzinfo=dt_timezone.utc))
+        for bad in ('2026-02-30', 'yesterday'):
+            with self.assertRaises(ValueError):
+                parse_date_range({'start': bad})
+
+
+class StatsRollupTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='boss@example.com', password='pass', role='admin')
+        self.guest = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        self.meal = Meal.objects.create(name='Pilau', description='...', price=300)
+
+    def test_counters_follow_saves_role_changes_and_deletes(self):
+        waiter = User.objects.create_user(email='waiter@example.com', password='pass', role='waiter')
+        order = Order.objects.create(customer=self.guest, meal=self.meal)
+        feedback = Feedback.objects.create(order=order, meal=self.meal, customer=self.guest, rating=5, tip=Decimal('50'))
+        feedback.tip = Decimal('80')
+        feedback.save()
+        waiter.role = 'receptionist'
+        waiter.save()
+
+        stats = get_stats()
+        self.assertEqual(stats['total_users'], 3)
+        self.assertEqual(stats['users_by_role'], {'admin': 1, 'online_customer': 1, 'receptionist': 1})
+        self.assertEqual((stats['total_orders'], stats['total_meals'], stats['total_feedback']), (1, 1, 1))
+        self.assertEqual(stats['total_tips'], '80.00')
+
+        feedback.delete()
+        order.delete()
+        waiter.delete()
+        stats = get_stats()
+        self.assertEqual((stats['total_users'], stats['total_orders'], stats['total_feedback']), (2, 0, 0))
+        self.assertEqual(stats['users_by_role'], {'admin': 1, 'online_customer': 1})
+        self.assertEqual(stats['total_tips'], '0.00')
+
+    def test_saves_without_the_role_skip_the_lookup(self):
+        with self.assertNumQueries(1):
+            self.guest.save(update_fields=['last_login'])
+        self.guest.role = 'onsite_customer'
+        with self.assertNumQueries(1):
+            self.guest.save(update_fields=['last_login'])  # role not written, so nothing to count
+        self.guest.save(update_fields=['role'])
+        self.assertEqual(get_stats()['users_by_role'], {'admin': 1, 'onsite_customer': 1})
+
+    def test_rebuild_repairs_drift(self):
+        Order.objects.create(customer=self.guest, meal=self.meal)
+        expected = get_stats()
+        StatsCounter.objects.filter(key='users').update(value=99)
+        StatsCounter.objects.filter(key='orders').delete()
+        User.objects.filter(pk=self.guest.pk).update(role='waiter')  # no signals
+
+        out = StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertIn('Stats rollup rebuilt.', out.getvalue())
+        expected['users_by_role'] = {'admin': 1, 'waiter': 1}
+        self.assertEqual(get_stats(), expected)
+
+
+class ShiftAnalyticsTests(TestCase):
+    def setUp(self):
+        self.ann = User.objects.create_user(email='ann@example.com', password='pass', role='waiter')
+        self.bob = User.objects.create_user(email='bob@example.com', password='pass', role='waiter')
+        self.monday = datetime(2026, 3, 2, tzinfo=dt_timezone.utc)
+
+    def clock(self, user, day, start_hour, hours):
+        clock_in = self.monday + timedelta(days=day, hours=start_hour)
+        ClockInRecord.objects.create(user=user, clock_in_time=clock_in, clock_out_time=clock_in + timedelta(hours=hours))
+
+    def test_hours_overtime_and_headcount(self):
+        for day in range(5):
+            self.clock(self.ann, day, 8, 9)        # 45h in the week
+        self.clock(self.ann, 6, 20, 6)             # Sunday night into the next week: 4h + 2h
+        self.clock(self.bob, 0, 12, 2.25)          # 12:00-14:15, overlaps Ann on Monday
+
+        report = shift_report(self.monday, self.monday + timedelta(days=14))
+        staff = {row['email']: row for row in report['staff']}
+        self.assertEqual(staff['ann@example.com']['hours'], 51)
+        self.assertEqual(staff['ann@example.com']['overtime_hours'], 9)  # 49h in week one
+        self.assertEqual(staff['bob@example.com']['overtime_hours'], 0)
+        self.assertEqual(report['headcount']['peak'], 2)
+        self.assertEqual(report['headcount']['peak_at'], '2026-03-02T12:00:00+00:00')
+        self.assertIn(['2026-03-02T14:15:00+00:00', 1], report['headcount']['changes'])
+
+        clipped = shift_report(self.monday + timedelta(hours=10), self.monday + timedelta(hours=13))
+        self.assertEqual({row['email']: row['hours'] for row in clipped['staff']}, {'ann@example.com': 3, 'bob@example.com': 1})
+
+    def test_endpoint_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(self.ann)
+        self.assertEqual(client.get('/api/admin/shifts/').status_code, 403)
+        client.force_authenticate(User.objects.create_user(email='boss@example.com', password='pass', role='admin'))
+        response = client.get('/api/admin/shifts/', {'start': '2026-03-01', 'end': '2026-03-08'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bucket_minutes'], 15)
+
+
+class ClockInOutTests(TestCase):
+    def setUp(self):
+        self.waiter = User.objects.create_user(email='waiter@example.com', password='pass', role='waiter')
+        self.client = APIClient()
+        self.client.force_authenticate(self.waiter)
+
+    def test_second_clock_in_is_refused_by_the_constraint(self):
+        self.assertEqual(self.client.post('/api/waiter/clock-in/').status_code, 201)
+        self.assertEqual(self.client.post('/api/waiter/clock-in/').status_code, 400)
+        self.assertEqual(ClockInRecord.objects.filter(user=self.waiter).count(), 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.post('/api/waiter/clock-out/').status_code, 200)
+        self.assertEqual(self.client.post('/api/waiter/clock-out/').status_code, 400)
+        self.assertEqual(self.client.post('/api/waiter/clock-in/').status_code, 201)
+        self.assertEqual(ClockInRecord.objects.filter(user=self.waiter).count(), 2)
+
+    def test_clock_out_everyone(self):
+        other = User.objects.create_user(email='waiter2@example.com', password='pass', role='waiter')
+        ClockInRecord.objects.create(user=self.waiter)
+        ClockInRecord.objects.create(user=other)
+        self.assertEqual(self.client.post('/api/admin/clock-out-all/').status_code, 403)
+
+        self.client.force_authenticate(User.objects.create_user(email='boss@example.com', password='pass', role='admin'))
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/admin/clock-out-all/')
+        self.assertEqual(response.data['clocked_out'], 2)
+        self.assertFalse(ClockInRecord.objects.filter(clock_out_time__isnull=True).exists())
+
+
+class AdminOrderBoardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(email='boss@example.com', password='pass', role='admin', is_staff=True)
+        self.client.force_login(admin)
+        customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        meal = Meal.objects.create(name='Pilau', description='...', price=300)
+        self.orders = Order.objects.bulk_create(Order(customer=customer, meal=meal) for _ in range(55))
+        Order.objects.filter(pk=self.orders[0].pk).update(status='ready', created_at=datetime(2026, 3, 1, 9, tzinfo=dt_timezone.utc))
+
+    def test_pages_come_from_one_joined_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dashboard/admin/orders/')
+        self.assertEqual(len(response.context['page_obj']), 50)
+        order_queries = [q['sql'] for q in queries if 'FROM "core_order"' in q['sql']]
+        self.assertEqual(len(order_queries), 2)  # the page's COUNT and its rows, joined with customer/meal/feedback
+        self.assertEqual(len(self.client.get('/dashboard/admin/orders/', {'page': 2}).context['page_obj']), 5)
+
+        response = self.client.get('/dashboard/admin/orders/', {'status': 'ready', 'start': '2026-03-01', 'end': '2026-03-01'})
+        self.assertEqual([order.pk for order in response.context['page_obj']], [self.orders[0].pk])
+        self.assertIn('status=ready', response.context['filter_query'])
+
+    def test_rows_are_cached_until_the_order_changes(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        self.client.get('/dashboard/admin/orders/', {'status': 'ready'})
+        key = make_template_fragment_key('admin_order_row', [order.id, order.updated_at.isoformat()])
+        self.assertIn('ready', cache.get(key))
+
+        self.client.post('/dashboard/admin/orders/?status=ready', {'order_id': order.pk, 'status': 'delivered', 'expected_status': 'ready'})
+        order.refresh_from_db()
+        response = self.client.get('/dashboard/admin/orders/', {'status': 'delivered'})
+        self.assertEqual([row.pk for row in response.context['page_obj']], [order.pk])
+        self.assertIn('delivered', cache.get(make_template_fragment_key('admin_order_row', [order.id, order.updated_at.isoformat()])))
+
+
+class BulkRosterTests(TestCase):
+    def setUp(self):
+        self.desk = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='desk@example.com', password='pass', role='receptionist')
+        )
+        self.night = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='night@example.com', password='pass', role='receptionist')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='boss@example.com', password='pass', role='admin'))
+
+    def post(self, entries, **extra):
+        payload = {'start_date': '2026-03-01', 'end_date': '2026-03-31', 'entries': entries, **extra}
+        return self.client.post('/api/shift-rosters/bulk/', payload, format='json')
+
+    def test_month_template_is_inserted_in_one_request(self):
+        response = self.post([
+            {'receptionist': self.desk.pk, 'weekdays': [0, 1, 2, 3, 4], 'shift_start': '08:00', 'shift_end': '16:00'},
+            {'receptionist': self.night.pk, 'weekdays': [5, 6], 'shift_start': '22:00', 'shift_end': '06:00'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 22 + 9)  # March 2026: 22 weekdays, 9 weekend days
+        self.assertEqual(ShiftRoster.objects.count(), 31)
+
+    def test_overlaps_reject_the_whole_roster(self):
+        ShiftRoster.objects.create(
+            receptionist=self.night, shift_date=date(2026, 3, 1), shift_start=time(22), shift_end=time(6)
+        )
+        response = self.post([
+            {'receptionist': self.desk.pk, 'weekdays': [0], 'shift_start': '08:00', 'shift_end': '16:00'},
+            {'receptionist': self.desk.pk, 'days': [2], 'shift_start': '15:00', 'shift_end': '18:00'},
+            # Overlaps the stored overnight shift from March 1st
+            {'receptionist': self.night.pk, 'days': [2], 'shift_start': '05:00', 'shift_end': '09:00'},
+        ])
+        self.assertEqual(response.status_code, 409)
+        clashes = {(c['shift']['receptionist'], c['shift']['shift_date']) for c in response.data['conflicts']}
+        self.assertEqual(clashes, {(self.desk.pk, '2026-03-02'), (self.night.pk, '2026-03-02')})
+        self.assertEqual(ShiftRoster.objects.count(), 1)
+
+        self.assertEqual(self.post(
+            [{'receptionist': self.night.pk, 'days': [1], 'shift_start': '20:00', 'shift_end': '23:00'}], replace=True,
+        ).status_code, 201)
+        self.assertEqual(ShiftRoster.objects.get().shift_start, time(20))
+
+    def test_single_shift_overlap_is_a_validation_error(self):
+        ShiftRoster.objects.create(receptionist=self.desk, shift_date=date(2026, 3, 2), shift_start=time(8), shift_end=time(16))
+        response = self.client.post('/api/shift-rosters/', {
+            'receptionist': self.desk.pk, 'shift_date': '2026-03-02', 'shift_start': '12:00', 'shift_end': '20:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url, **params):
+        """Ids from every page, following next links, then back again through previous links."""
+        forward, response = [], self.client.get(url, {'page_size': 3, **params})
+        while True:
+            forward.append([row['id'] for row in response.data['results']])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        backward = [forward[-1]]
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            backward.append([row['id'] for row in response.data['results']])
+        return forward, backward[::-1]
+
+    def test_orders_with_tied_timestamps_are_each_listed_once(self):
+        customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        meal = Meal.objects.create(name='Soup', description='Hot', price=Decimal('5.00'))
+        orders = [Order.objects.create(customer=customer, meal=meal) for _ in range(8)]
+        Order.objects.update(created_at=timezone.now())
+        self.client.force_authenticate(customer)
+
+        forward, backward = self.walk('/api/customer/orders/history/')
+        expected = sorted((order.pk for order in orders), reverse=True)
+        self.assertEqual([pk for page in forward for pk in page], expected)
+        self.assertEqual(backward, forward)
+
+    def test_roster_shifts_on_the_same_date_are_each_listed_once(self):
+        desk = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='desk@example.com', password='pass', role='receptionist')
+        )
+        shifts = [
+            ShiftRoster.objects.create(receptionist=desk, shift_date=date(2026, 3, 2), shift_start=time(hour), shift_end=time(hour + 1))
+            for hour in range(8, 16)
+        ]
+        self.client.force_authenticate(User.objects.create_user(email='boss@example.com', password='pass', role='admin'))
+
+        forward, backward = self.walk('/api/shift-rosters/')
+        self.assertEqual([pk for page in forward for pk in page], sorted((shift.pk for shift in shifts), reverse=True))
+        self.assertEqual(backward, forward)
+
+    def test_garbage_or_tampered_cursor_is_not_found(self):
+        customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        self.client.force_authenticate(customer)
+        # Encoded the way DRF encodes its cursors, so only the position is wrong
+        tampered = [
+            b64encode(urlencode({'p': position}).encode()).decode()
+            for position in ('notadate|1', '2026-03-02 12:00:00+00:00|x', 'no-separator', '|')
+        ]
+        for cursor in ['garbage', *tampered]:
+            response = self.client.get('/api/customer/orders/history/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class CallLogSearchTests(TestCase):
+    def setUp(self):
+        self.desk = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='desk@example.com', password='pass', role='receptionist')
+        )
+        other = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='night@example.com', password='pass', role='receptionist')
+        )
+        self.refund = CRMCallLog.objects.create(
+            receptionist=self.desk, customer_name='Wanjiru', phone_number='0712000000',
+            reason_for_call='Refund request', notes='Cold chapati delivered late, wants a refund',
+        )
+        CRMCallLog.objects.create(
+            receptionist=self.desk, customer_name='Otieno', phone_number='0712000001',
+            reason_for_call='Booking', notes='Table for six on Friday',
+        )
+        CRMCallLog.objects.create(
+            receptionist=other, customer_name='Achieng', phone_number='0712000002',
+            reason_for_call='Refund', notes='Delivered late again',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.desk.user)
+
+    def search(self, q):
+        response = self.client.get('/api/crm-calls/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_match_expression_escapes_user_syntax(self):
+        self.assertEqual(match_expression('delivered lat'), '"delivered" "lat"*')
+        self.assertEqual(match_expression('"delivered late" OR'), '"delivered late" "OR"*')
+        self.assertIsNone(match_expression('  ^*( '))
+
+    def test_ranked_search_with_snippets_scoped_to_receptionist(self):
+        results = self.search('"delivered late"')
+        self.assertEqual([r['id'] for r in results], [self.refund.id])  # the other match belongs to another desk
+        self.assertIn('[delivered late]', results[0]['notes_snippet'])
+
+        self.assertEqual(len(self.search('refun')), 1)  # prefix on the last word, porter stemming
+        self.assertEqual(self.search('friday')[0]['customer_name'], 'Otieno')
+
+    def test_index_follows_updates_and_deletes(self):
+        self.refund.notes = 'Sorted out with a voucher'
+        self.refund.save()
+        self.assertEqual(self.search('chapati'), [])
+        self.assertEqual(len(self.search('voucher')), 1)
+        self.refund.delete()
+        self.assertEqual(self.search('voucher'), [])
+
+
+class CallerLookupTests(TestCase):
+    def test_normalize_phone_variants(self):
+        for raw in ('0712 345 678', '712345678', '254712345678', '+254 (712) 345-678', '00254712345678', '0712-345-678 ext 12'):
+            self.assertEqual(normalize_phone(raw), '+254712345678', raw)
+        self.assertEqual(normalize_phone('+44 20 7946 0958'), '+442079460958')
+        for raw in ('', 'call me', '12345', '+0712345678'):
+            self.assertEqual(normalize_phone(raw), '', raw)
+
+    def test_lookup_resolves_customer_calls_and_orders(self):
+        guest = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        OnlineCustomerProfile.objects.create(
+            user=guest, full_name='Wanjiru K', gender='female', location='Kilimani', phone_number='0712 345 678',
+        )
+        meal = Meal.objects.create(name='Pilau', description='...', price=300)
+        Order.objects.create(customer=guest, meal=meal)
+        desk = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='desk@example.com', password='pass', role='receptionist')
+        )
+        call = CRMCallLog.objects.create(
+            receptionist=desk, customer_name='Wanjiru', phone_number='+254-712-345-678', reason_for_call='Late order',
+        )
+        self.assertEqual((call.phone_e164, call.customer_id), ('+254712345678', guest.id))
+
+        client = APIClient()
+        client.force_authenticate(desk.user)
+        with self.assertNumQueries(3):  # profile, calls, orders
+            response = client.get('/api/crm/caller/', {'phone': '712345678'})
+        self.assertEqual(response.data['customer']['email'], 'guest@example.com')
+        self.assertEqual(response.data['customer']['type'], 'online')
+        self.assertEqual([c['id'] for c in response.data['recent_calls']], [call.id])
+        self.assertEqual(len(response.data['recent_orders']), 1)
+
+        self.assertEqual(client.get('/api/crm/caller/', {'phone': 'nope'}).status_code, 400)
+
+    def test_editing_the_number_relinks_the_customer(self):
+        guest = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        OnlineCustomerProfile.objects.create(
+            user=guest, full_name='Wanjiru K', gender='female', location='Kilimani', phone_number='0712 345 678',
+        )
+        desk = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='desk@example.com', password='pass', role='receptionist')
+        )
+        call = CRMCallLog.objects.create(
+            receptionist=desk, customer_name='Wanjiru', phone_number='0799 000 000', reason_for_call='Late order',
+        )
+        self.assertIsNone(call.customer_id)
+
+        call.phone_number = '0712 345 678'
+        call.save(update_fields=['phone_number'])
+        call.refresh_from_db()
+        self.assertEqual((call.phone_e164, call.customer_id), ('+254712345678', guest.id))
+
+        call.phone_number = '0799 000 000'
+        call.save()
+        call.refresh_from_db()
+        self.assertEqual((call.phone_e164, call.customer_id), ('+254799000000', None))
+
+        # Same number written differently: the link is kept
+        call.customer = guest
+        call.save()
+        call.phone_number = '+254 799 000 000'
+        call.save()
+        self.assertEqual(CRMCallLog.objects.get().customer_id, guest.id)
+
+
+class FollowUpQueueTests(TestCase):
+    def setUp(self):
+        self.desks = [
+            ReceptionistProfile.objects.create(
+                user=User.objects.create_user(email=f'desk{i}@example.com', password='pass', role='receptionist'),
+                full_name=f'Desk {i}',
+            )
+            for i in range(2)
+        ]
+        today = timezone.localdate()
+
+        def log(name, days, **extra):
+            return CRMCallLog.objects.create(
+                receptionist=self.desks[0], customer_name=name, phone_number='0712345678',
+                reason_for_call='Call back', follow_up_date=today + timedelta(days=days), **extra,
+            )
+        self.overdue, self.due = log('Overdue', -2), log('Due', 0)
+        log('Later', 3)
+        log('Done', -1, follow_up_done_at=timezone.now())
+        self.clients = []
+        for desk in self.desks:
+            client = APIClient()
+            client.force_authenticate(desk.user)
+            self.clients.append(client)
+
+    def queue(self, desk):
+        response = self.clients[desk].get('/api/crm-calls/follow-ups/')
+        return [(row['customer_name'], row['overdue']) for row in response.data['results']]
+
+    def test_only_one_receptionist_gets_a_follow_up(self):
+        self.assertEqual(self.queue(1), [('Overdue', True), ('Due', False)])
+        claim = f'/api/crm-calls/{self.due.id}/follow-up/claim/'
+        self.assertEqual(self.clients[0].post(claim).status_code, 200)
+        self.assertEqual(self.clients[1].post(claim).status_code, 409)
+        self.assertEqual(self.queue(1), [('Overdue', True)])
+        self.assertEqual(self.clients[1].post(f'/api/crm-calls/{self.due.id}/follow-up/complete/').status_code, 409)
+        self.assertEqual(self.clients[0].post(f'/api/crm-calls/{self.due.id}/follow-up/complete/').status_code, 200)
+        self.assertEqual(self.queue(0), [('Overdue', True)])
+
+        # An abandoned claim lapses and can be taken over
+        self.clients[0].post(f'/api/crm-calls/{self.overdue.id}/follow-up/claim/')
+        CRMCallLog.objects.filter(pk=self.overdue.pk).update(follow_up_claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.clients[1].post(f'/api/crm-calls/{self.overdue.id}/follow-up/claim/').status_code, 200)
+
+    def test_scheduler_sleeps_until_the_next_due_time(self):
+        announced = []
+        woke = threading.Event()
+
+        class Recorder(FollowUpScheduler):
+            def announce(self, due):
+                announced.extend(log_id for _, log_id in due)
+                woke.set()
+
+        scheduler = Recorder()
+        scheduler.start()
+        try:
+            pending = sorted(log_id for _, log_id in scheduler.heap)
+            self.assertIn(CRMCallLog.objects.get(customer_name='Later').id, pending)
+            with scheduler.condition:
+                heapq.heappush(scheduler.heap, (timezone.now() + timedelta(milliseconds=200), -1))
+                scheduler.condition.notify()
+            self.assertTrue(woke.wait(5))
+            self.assertEqual(announced, [-1])  # later follow-ups are still waiting their turn
+            self.assertEqual(sorted(log_id for _, log_id in scheduler.heap), pending)
+        finally:
+            scheduler.stop()
+        self.assertFalse(get_follow_up_scheduler().running)
+
+    def test_saves_and_deletes_update_the_heap(self):
+        scheduler = FollowUpScheduler()
+        self.enterContext(mock.patch('core.signals.get_follow_up_scheduler', return_value=scheduler))
+        scheduler.start()
+        try:
+            in_five_days = timezone.localdate() + timedelta(days=5)
+            with self.captureOnCommitCallbacks(execute=True):
+                log = CRMCallLog.objects.create(
+                    receptionist=self.desks[1], customer_name='New', phone_number='0712345678',
+                    reason_for_call='Call back', follow_up_date=in_five_days,
+                )
+            first = (follow_up_due_at(in_five_days), log.id)
+            self.assertIn(first, scheduler.heap)
+
+            log.follow_up_date = in_five_days + timedelta(days=1)
+            with self.captureOnCommitCallbacks(execute=True):
+                log.save()
+            moved = (follow_up_due_at(log.follow_up_date), log.id)
+            self.assertIn(moved, scheduler.heap)
+            with mock.patch('core.crm.get_broker') as broker:
+                scheduler.announce([first])  # the old date pops: the row has moved on, nothing to say
+            broker.return_value.publish.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                log.delete()
+            self.assertNotIn(moved, scheduler.heap)
+            self.assertNotIn(moved, scheduler.queued)
+        finally:
+            scheduler.stop()
+
+
+class BulkImportExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='boss@example.com', password='pass', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_import_reports_errors_per_chunk(self):
+        desk = ReceptionistProfile.objects.create(
+            user=User.objects.create_user(email='desk@example.com', password='pass', role='receptionist')
+        )
+        lines = [
+            'receptionist,customer_name,phone_number,call_time,reason_for_call,follow_up_date',
+            f'{desk.pk},Achieng,0712 345 678,2026-03-01 10:00,Refund for cold pilau,',
+            f'{desk.pk},Kamau,not a phone,,Booking,',
+            f'999,Njeri,0722000000,,Allergy question,2026-03-04',
+            f'{desk.pk},Otieno,+254733000000,,Birthday cake,next week',
+        ]
+        reports = list(import_records(DATASETS['call-logs'], read_records(lines, 'csv'), chunk_size=2))
+        self.assertEqual([(r['rows'], r['created']) for r in reports], [(2, 1), (2, 0)])
+        self.assertEqual([e['line'] for e in reports[0]['errors']], [3])
+        self.assertEqual({e['line']: sorted(e['errors']) for e in reports[1]['errors']}, {
+            4: ['receptionist'], 5: ['follow_up_date'],
+        })
+        log = CRMCallLog.objects.get()
+        self.assertEqual(log.phone_e164, '+254712345678')
+        self.assertEqual([r.id for r in search_call_logs('pilau')], [log.id])  # FTS triggers cover bulk_create
+
+    def test_customers_round_trip_through_the_api(self):
+        upload = SimpleUploadedFile('customers.ndjson', (
+            b'{"email": "wanjiru@example.com", "full_name": "Wanjiru", "gender": "female", "location": "Kilimani", "phone_number": "0712345678"}\n'
+            b'{"email": "wanjiru@example.com", "full_name": "Again", "gender": "female", "location": "Kilimani"}\n'
+            b'{"email": "kip@example.com", "full_name": "Kiprop", "gender": "male", "location": "Eldoret"}\n'
+        ))
+        response = self.client.post('/api/admin/import/customers/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(response.data['chunks_with_errors'][0]['errors'][0]['line'], 2)
+        profile = OnlineCustomerProfile.objects.get(user__email='wanjiru@example.com')
+        self.assertEqual((profile.user.role, profile.phone_e164), ('online_customer', '+254712345678'))
+        self.assertFalse(profile.user.has_usable_password())
+        self.assertEqual(self.client.get('/api/admin/stats/').data['users_by_role']['online_customer'], 2)
+
+        response = self.client.get('/api/admin/export/customers.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], 'email,full_name,gender,date_of_birth,location,phone_number,member_since')
+        self.assertEqual([row.split(',')[0] for row in rows[1:]], ['wanjiru@example.com', 'kip@example.com'])
+        self.assertEqual(self.client.get('/api/admin/export/orders.csv').status_code, 404)
+
+    def test_rejects_files_that_are_not_utf8(self):
+        upload = SimpleUploadedFile('meals.csv', 'name,description,price\nPilau,Spiced,300\nCafé,Crème,50\n'.encode('latin-1'))
+        response = self.client.post('/api/admin/import/meals/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Line 3', response.data['error'])
+        self.assertFalse(Meal.objects.exists())
+
+    def test_csv_export_escapes_formulas_and_imports_back(self):
+        Meal.objects.create(name='=HYPERLINK("http://evil.example")', description='-50% today', price=100)
+        response = self.client.get('/api/admin/export/meals.csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[1].split(',', 1)[1].startswith('"\'=HYPERLINK('))
+        self.assertIn(",'-50% today,", lines[1])
+
+        Meal.objects.all().delete()
+        records = list(read_records(lines, 'csv'))
+        self.assertEqual(records[0][1]['name'], '=HYPERLINK("http://evil.example")')
+        list(import_records(DATASETS['meals'], records))
+        self.assertEqual(Meal.objects.get().description, '-50% today')
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.pilau = Meal.objects.create(name='Pilau', description='...', price=Decimal('300.00'))
+        self.chai = Meal.objects.create(name='Chai', description='...', price=Decimal('50.00'))
+        self.courier = User.objects.create_user(email='rider@example.com', password='pass', role='delivery')
+        self.customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        self.admin = User.objects.create_user(email='boss@example.com', password='pass', role='admin')
+        self.morning = datetime(2026, 3, 2, 9, 30, tzinfo=dt_timezone.utc)
+
+    def delivered(self, meal, at, courier=None, tip=None):
+        order = Order.objects.create(
+            customer=self.customer, meal=meal, status='delivered', delivered_at=at, delivery_person=courier,
+        )
+        if tip is not None:
+            Feedback.objects.create(order=order, meal=meal, customer=self.customer, rating=5, tip=tip)
+        return order
+
+    def rollups(self):
+        return list(SalesRollup.objects.order_by('period', 'bucket_start', 'meal_id', 'staff_id').values_list(
+            'period', 'bucket_start', 'meal_id', 'staff_id', 'orders', 'revenue', 'tips',
+        ))
+
+    def test_incremental_updates_match_a_rebuild(self):
+        self.delivered(self.pilau, self.morning, self.courier, tip=Decimal('40'))
+        self.delivered(self.pilau, self.morning + timedelta(minutes=20), self.courier)
+        self.delivered(self.chai, self.morning + timedelta(hours=1))
+        feedback = self.delivered(self.chai, self.morning, tip=Decimal('10')).feedback
+        feedback.tip = Decimal('15')
+        feedback.save()
+        self.delivered(self.pilau, self.morning, tip=Decimal('5')).delete()
+
+        order = Order.objects.create(customer=self.customer, meal=self.pilau, is_delivery=True, delivery_person=self.courier)
+        for status in ('preparing', 'ready', 'delivered'):
+            apply_transition(order, status)
+        self.assertIsNotNone(order.delivered_at)
+
+        incremental = self.rollups()
+        self.assertIn(('hour', self.morning.replace(minute=0), self.pilau.id, self.courier.id, 2, Decimal('600'), Decimal('40')), incremental)
+        rebuild_sales()
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_order_moved_back_out_of_delivered(self):
+        order = self.delivered(self.pilau, self.morning, self.courier, tip=Decimal('40'))
+        self.delivered(self.chai, self.morning, self.courier)
+        order.status = 'ready'  # e.g. corrected in the admin
+        order.save()
+
+        order.refresh_from_db()
+        self.assertIsNone(order.delivered_at)
+        incremental = self.rollups()
+        self.assertEqual([row[2] for row in incremental], [self.chai.id, self.chai.id])
+        rebuild_sales()
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_report_per_meal_per_hour_as_json_and_csv(self):
+        self.delivered(self.pilau, self.morning, self.courier, tip=Decimal('40'))
+        self.delivered(self.pilau, self.morning, tip=Decimal('10'))
+        self.delivered(self.chai, self.morning + timedelta(hours=1))
+        self.delivered(self.chai, self.morning + timedelta(days=1))  # outside the range
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        params = {'start': '2026-03-02', 'end': '2026-03-02', 'period': 'hour', 'group': 'meal'}
+        with self.assertNumQueries(1):
+            response = client.get('/api/admin/sales/', params)
+        self.assertEqual(
+            [(row['bucket_start'].hour, row['meal__name'], row['orders'], row['revenue'], row['tips']) for row in response.data['rows']],
+            [(9, 'Pilau', 2, Decimal('600'), Decimal('50')), (10, 'Chai', 1, Decimal('50'), Decimal('0'))],
+        )
+        self.assertEqual(response.data['totals']['revenue'], Decimal('650'))
+
+        response = client.get('/api/admin/sales.csv', {**params, 'group': 'meal,staff', 'period': 'day'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'bucket_start,meal_id,meal__name,staff_id,staff__email,orders,revenue,tips')
+        self.assertEqual(len(lines), 4)  # pilau with and without courier, chai
+        self.assertEqual(client.get('/api/admin/sales/', {'period': 'minute'}).status_code, 400)
+
+
+class MenuETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.pilau = Meal.objects.create(name='Pilau', description='...', price=300)
+        self.chai = Meal.objects.create(name='Chai', description='...', price=50)
+
+    def etag(self):
+        response = self.client.get('/api/menu/')
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.etag()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/api/menu/', HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.client.get('/api/menu/', HTTP_IF_NONE_MATCH='"menu-stale"').status_code, 200)
+
+        cache.clear()  # a cache miss reads the version from the database again
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_etag_changes_after_save_and_delete(self):
+        first = self.etag()
+        self.pilau.price = 320
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pilau.save()
+        second = self.etag()
+        self.assertNotEqual(second, first)
+        self.assertEqual(self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=first).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chai.delete()
+        response = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=second)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([meal['name'] for meal in response.data], ['Pilau'])
+
+
+class LocationBufferTests(TestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user(email='rider@example.com', password='pass', role='delivery')
+        self.other_rider = User.objects.create_user(email='rider2@example.com', password='pass', role='delivery')
+        for user in (self.rider, self.other_rider):
+            DeliveryPersonnelProfile.objects.create(user=user)
+        self.buffer = LocationBuffer(flush_seconds=3600)
+        self.now = timezone.now()
+
+    def tearDown(self):
+        if self.buffer.timer is not None:
+            self.buffer.timer.cancel()
+
+    def ping(self, lat, lng, seconds_ago):
+        return {'lat': lat, 'lng': lng, 'recorded_at': self.now - timedelta(seconds=seconds_ago)}
+
+    def test_keeps_only_the_newest_ping(self):
+        latest = self.buffer.ingest(self.rider.id, [self.ping(-1.28, 36.81, 30), self.ping(-1.29, 36.82, 10)])
+        self.assertEqual((latest['lat'], latest['lng']), (-1.29, 36.82))
+        self.assertIsNone(self.buffer.ingest(self.rider.id, [self.ping(-1.30, 36.83, 20)]))  # older than what we have
+        self.assertEqual(self.buffer.snapshot([self.rider.id])[self.rider.id][:2], (-1.29, 36.82))
+        self.assertIsNotNone(self.buffer.timer)
+
+    def test_future_timestamps_are_clamped(self):
+        self.buffer.ingest(self.rider.id, [self.ping(-1.28, 36.81, -3600)])  # an hour ahead
+        self.assertLessEqual(self.buffer.snapshot()[self.rider.id][2], timezone.now())
+        self.assertIsNotNone(self.buffer.ingest(self.rider.id, [{'lat': -1.29, 'lng': 36.82, 'recorded_at': timezone.now()}]))
+
+    def test_flush_writes_changed_positions_in_one_update(self):
+        self.buffer.ingest(self.rider.id, [self.ping(-1.28, 36.81, 10)])
+        self.buffer.ingest(self.other_rider.id, [self.ping(-4.04, 39.67, 10)])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(DeliveryPersonnelProfile.objects.get(user=self.other_rider).current_location, '-4.040000,39.670000')
+        self.assertEqual(self.buffer.flush(), 0)  # nothing changed since
+
+    def test_failed_flush_keeps_positions_and_retries(self):
+        self.buffer.ingest(self.rider.id, [self.ping(-1.28, 36.81, 10)])
+        with mock.patch.object(self.buffer, '_write', side_effect=RuntimeError('database is locked')):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.dirty, {self.rider.id})
+        self.assertIsNotNone(self.buffer.timer)  # re-armed without waiting for another ping
+        self.buffer.timer.cancel()
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(DeliveryPersonnelProfile.objects.get(user=self.rider).current_location, '-1.280000,36.810000')
+
+
+class CourierIndexTests(TestCase):
+    def brute_force(self, index, point, trip_km=None):
+        costs = [
+            distance_km(point, c.position) + c.load * LOAD_PENALTY_KM
+            for c in index.couriers.values() if c.load < c.capacity and c.can_reach(trip_km)
+        ]
+        return min(costs, default=None)
+
+    def test_nearest_matches_a_full_scan(self):
+        rng = random.Random(7)
+        index = CourierIndex()
+        for courier_id in range(400):
+            position = (-1.30 + rng.random() * 0.2, 36.70 + rng.random() * 0.2)
+            index.upsert(courier_id, rng.choice(['walk', 'bike', 'car']), position, rng.randrange(4))
+        # Random points plus points exactly on and just either side of cell edges
+        points = [(-1.30 + rng.random() * 0.2, 36.70 + rng.random() * 0.2) for _ in range(100)]
+        points += [(-1.25 + d, 36.80 + d) for d in (0, 1e-9, -1e-9)]
+        for point in points:
+            for trip_km in (None, 1.5, 12.0):
+                courier = index.nearest(point, trip_km)
+                expected = self.brute_force(index, point, trip_km)
+                if expected is None:
+                    self.assertIsNone(courier)
+                else:
+                    cost = distance_km(point, courier.position) + courier.load * LOAD_PENALTY_KM
+                    self.assertAlmostEqual(cost, expected, places=9)
+
+    def test_neighbour_across_a_cell_edge_beats_one_in_the_same_cell(self):
+        index = CourierIndex()
+        # Enough far-off couriers that nearest() walks rings instead of scanning
+        for courier_id in range(100, 150):
+            index.upsert(courier_id, 'car', (0.03 + courier_id * 0.0001, 0.03))
+        index.upsert(1, 'car', (0.0101, 0.015))  # same cell as the query, ~1 km away
+        index.upsert(2, 'car', (0.0201, 0.015))  # next cell, ~20 m away
+        self.assertEqual(index.nearest((0.0199, 0.015)).id, 2)
+
+        index.add_load(index.couriers[2], 5)  # full: unlinked from the grid
+        self.assertEqual(index.nearest((0.0199, 0.015)).id, 1)
+        index.add_load(index.couriers[2], -5)
+        self.assertEqual(index.nearest((0.0199, 0.015)).id, 2)
+
+
+@override_settings(DISPATCH_PICKUP_LOCATION='-1.2860,36.8170')
+class DispatchTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='guest@example.com', password='pass', role='online_customer')
+        self.meal = Meal.objects.create(name='Pilau', description='...', price=300)
+        self.rider = User.objects.create_user(email='rider@example.com', password='pass', role='delivery')
+        self.other_rider = User.objects.create_user(email='rider2@example.com', password='pass', role='delivery')
+        DeliveryPersonnelProfile.objects.create(user=self.rider, transport_method='car', current_location='-1.2861,36.8171')
+        self.orders = [
+            Order.objects.create(customer=self.customer, meal=self.meal, status='ready', is_delivery=True)
+            for _ in range(2)
+        ]
+        self.dispatcher = Dispatcher()
+
+    def test_assignments_are_logged_and_published(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            assignments = self.dispatcher.dispatch()
+        self.assertEqual(assignments, {order.id: self.rider.id for order in self.orders})
+        self.assertEqual(
+            list(OrderEvent.objects.values_list('order_id', 'to_status', 'delivery_person_id')),
+            [(order.id, 'ready', self.rider.id) for order in self.orders],
+        )
+        self.assertEqual(len(callbacks), 1)
+
+    def test_lost_race_is_not_counted(self):
+        taken = self.orders[0]
+        plan = self.dispatcher.plan
+
+        def plan_then_lose_race(batch):
+            planned = plan(batch)
+            Order.objects.filter(pk=taken.pk).update(delivery_person=self.other_rider)  # assigned by hand meanwhile
+            return planned
+
+        with mock.patch.object(self.dispatcher, 'plan', side_effect=plan_then_lose_race):
+            assignments = self.dispatcher.dispatch()
+        self.assertEqual(assignments, {self.orders[1].id: self.rider.id})
+        self.assertEqual(Order.objects.get(pk=taken.pk).delivery_person, self.other_rider)
+        self.assertEqual(self.dispatcher.index.couriers[self.rider.id].load, 1)
+        self.assertEqual(list(OrderEvent.objects.values_list('order_id', flat=True)), [self.orders[1].id])
@@ -0,0 +1,111 @@
+# core/uploads.py
+
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.db import transaction
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from PIL import Image
+
+from .models import ProofOfDelivery
+
+PROOF_MAX_BYTES = 10 * 1024 * 1024  # default for settings.PROOF_UPLOAD_MAX_BYTES
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams each uploaded file to a temporary file in chunk_size pieces (never
+    holding it in memory) and computes its SHA-256 on the way through. The
+    digest is available as `upload.sha256` once parsing finishes.
+    Uploads over `max_bytes` stop parsing and set `too_large`.
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or getattr(settings, 'PROOF_UPLOAD_MAX_BYTES', PROOF_MAX_BYTES)
+        self.too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Refuse before reading a byte when the client announces an oversized body
+        if content_length and content_length > self.max_bytes + 64 * 1024:
+            self.too_large = True
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.too_large = True
+            self.file.close()
+            raise StopUpload(connection_reset=True)
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.hasher.hexdigest()
+        return upload
+
+
+# Pillow format -> extension a proof is stored under; anything else is refused
+IMAGE_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+}
+
+
+def image_extension(upload):
+    """
+    Extension for the format Pillow detects in the upload's header, or None
+    if it is not an image we accept. The client's file name is never trusted.
+    Leaves the file rewound.
+    """
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            image.verify()
+        return IMAGE_EXTENSIONS.get(image_format)
+    except Exception:
+        return None
+    finally:
+        upload.seek(0)
+
+
+def save_proof(order, upload, extension, notes=None):
+    """
+    Stores a hashed upload as the order's ProofOfDelivery, named with the
+    `extension` of its detected format (image_extension). A re-upload of the
+    same bytes (a courier retrying on a flaky connection) returns the existing
+    row without writing anything. Returns (proof, created).
+    """
+    digest = upload.sha256
+    current = ProofOfDelivery.objects.filter(order=order).only('id', 'checksum').first()
+    if current is not None and current.checksum == digest:
+        return ProofOfDelivery.objects.get(pk=current.pk), False
+
+    # Content-addressed: identical bytes already on disk are reused, and a new
+    # file is renamed into place from the temporary upload, never copied
+    storage = ProofOfDelivery._meta.get_field('image').storage
+    filename = f"proofs/proof{extension}"
+    wrote = not storage.exists(storage.content_name(filename, upload))
+    name = storage.save(filename, upload)
+
+    try:
+        with transaction.atomic():
+            proof, created = ProofOfDelivery.objects.update_or_create(
+                order=order,
+                defaults={'image': name, 'checksum': digest, 'notes': notes},
+            )
+    except Exception:
+        if wrote:
+            storage.delete(name)
+        raise
+    return proof, created
@@ -10,14 +10,24 @@ from .views import (
 
     # Order & Feedback
     place_order,
+    place_bulk_order,
     my_orders,
     mark_order_delivered,
+    update_order_status,
     leave_feedback, FeedbackCreateView,
 
     # Admin Stats & Reports
     login_view,
+    logout_view,
     admin_stats_view,
     role_report_view,
+    shift_analytics_view,
+    sales_report_view,
+    sales_report_csv,
+    clock_out_everyone,
+    caller_lookup,
+    bulk_import,
+    bulk_export,
     admin_orders_view,
 
     # Waiter & Clock
@@ -27,7 +37,9 @@ from .views import (
 
     # Delivery
     register_delivery_person,
+    run_dispatch,
     DeliveryPersonnelProfileView,
+    CourierLocationView,
     UploadProofView, ChangeDeliveryPersonView,
 
     # Receptionist
@@ -53,6 +65,8 @@ router.register(r'onsite-customers', OnsiteCustomerProfileViewSet, basename='ons
 urlpatterns = [
     # Auth
     path('api/token/', obtain_auth_token, name='api_token_auth'),
+    path('login/', login_view, name='login'),
+    path('logout/', logout_view, name='logout'),
 
     # Menu
     path('api/menu/', public_menu, name='public_menu'),
@@ -62,8 +76,10 @@ urlpatterns = [
     
     # Orders
      path('api/orders/place/', place_order, name='place_order'),
+     path('api/orders/bulk/', place_bulk_order, name='place_bulk_order'),
      path('api/orders/my/', my_orders, name='my_orders'),
      path('api/orders/<int:order_id>/delivered/', mark_order_delivered, name='mark_delivered'),
+     path('api/orders/<int:order_id>/status/', update_order_status, name='update_order_status'),
      path('api/orders/<int:order_id>/change-delivery/', ChangeDeliveryPersonView.as_view(), name='change-delivery-person'),
      path('orders/history/', customer_order_history, name='order-history'),
      path('orders/<int:order_id>/feedback/', give_feedback, name='give-feedback'),
@@ -77,15 +93,24 @@ urlpatterns = [
     path('api/admin/stats/', admin_stats_view, name='admin_stats'),
     path('dashboard/admin/orders/', admin_orders_view, name='admin_orders'),
     path('api/admin/reports/', role_report_view, name='role_report'),
+    path('api/admin/shifts/', shift_analytics_view, name='shift_analytics'),
+    path('api/admin/sales/', sales_report_view, name='sales_report'),
+    path('api/admin/sales.csv', sales_report_csv, name='sales_report_csv'),
+    path('api/admin/import/<slug:dataset>/', bulk_import, name='bulk_import'),
+    path('api/admin/export/<slug:dataset>.<slug:fmt>', bulk_export, name='bulk_export'),
 
     # Waiter
     path('api/waiter/dashboard/', waiter_dashboard, name='waiter_dashboard'),
     path('api/waiter/clock-in/', ClockInView.as_view(), name='clock_in'),
     path('api/waiter/clock-out/', ClockOutView.as_view(), name='clock_out'),
+    path('api/admin/clock-out-all/', clock_out_everyone, name='clock_out_everyone'),
+    path('api/crm/caller/', caller_lookup, name='caller_lookup'),
 
     # Delivery
     path('api/delivery/register/', register_delivery_person, name='register_delivery'),
+    path('api/delivery/dispatch/', run_dispatch, name='run_dispatch'),
     path('api/delivery/profile/', DeliveryPersonnelProfileView.as_view(), name='delivery_profile'),
+    path('api/delivery/locations/', CourierLocationView.as_view(), name='courier_locations'),
     path('api/delivery/orders/<int:order_id>/upload-proof/', UploadProofView.as_view(), name='upload_proof'),
 
     # Receptionist
@@ -1,7 +1,9 @@
 # core/utils.py
 
-from datetime import date
+from datetime import date, datetime, time, timedelta
 from django.contrib.sessions.models import Session
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 def is_customer_birthday(birthday):
     """Returns True if today is the customer's birthday."""
@@ -35,3 +37,50 @@ def was_greeted_today(request):
         return True
     request.session['last_greet_date'] = today_str
     return False
+
+def parse_date_range(params, start_key='start', end_key='end'):
+    """
+    Reads an optional [start, end) datetime range from query params.
+    Accepts ISO dates or datetimes; a bare end date includes that whole day.
+    Raises ValueError on unparseable input.
+    """
+    def parse(key, is_end):
+        value = params.get(key)
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+            parsed = None if day else parse_datetime(value)
+        except ValueError:
+            day = parsed = None
+        if day:
+            parsed = datetime.combine(day + timedelta(days=1) if is_end else day, time.min)
+        elif parsed is None:
+            raise ValueError(f"Invalid {key}: {value}")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    return parse(start_key, False), parse(end_key, True)
+
+# Leading characters that make spreadsheet apps read a CSV cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def csv_safe(value):
+    """Prefixes text that a spreadsheet would run as a formula with a quote (CSV injection)."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_unsafe(value):
+    """Undoes csv_safe() on a cell read back from an exported file."""
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+class Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a streaming response."""
+
+    def write(self, value):
+        return value
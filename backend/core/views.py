@@ -1,42 +1,74 @@
+import io
+import json
+import posixpath
+from datetime import timedelta
+from decimal import Decimal
+
 # Django Core
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Sum
+from django.utils.http import parse_etags
+from django.views.static import serve
+from django.db.models import Q, Sum
+from django.db.models.functions import Cast, Coalesce
 from django_filters.rest_framework import DjangoFilterBackend
 
 
 # DRF
 from rest_framework import filters , generics, status, permissions, viewsets 
-from rest_framework.decorators import api_view, permission_classes, authentication_classes, action
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, action, parser_classes
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 
 # Local Models
+from .pagination import (
+    CreatedAtCursorPagination, ShiftRosterCursorPagination, MemberSinceCursorPagination,
+)
+from .menu import get_menu_version, get_menu_snapshot, menu_etag
+from .stats import get_stats, bump
+from .shifts import shift_report, close_open_shifts
+from .sales import GROUPS as SALES_GROUPS, PERIODS as SALES_PERIODS, report_csv, sales_report
+from .search import search_call_logs
+from .bulk import DATASETS, FORMATS, export_lines, first_undecodable_line, format_for, import_records, read_records
+from .crm import lookup_caller, due_follow_ups, claim_follow_up, release_follow_up, complete_follow_up
+from .roster import RosterConflict, create_roster, describe, expand_template
+from .realtime import publish_order_event
+from .dispatch import get_dispatcher
+from .locations import get_location_buffer
+from .storage import is_content_addressed
+from .uploads import HashingUploadHandler, image_extension, save_proof
+from .order_state import apply_transition, reassign_courier, IllegalTransition, TransitionConflict
 from .utils import is_customer_birthday
-from .models import User, Meal, Order, WaiterProfile, Feedback, OnsiteCustomerProfile, ClockInRecord, DeliveryPersonnelProfile, ReceptionistProfile, ShiftRoster, CRMCallLog, OnlineCustomerProfile
+from .models import User, Meal, Order, WaiterProfile, Feedback, OnsiteCustomerProfile, ClockInRecord, DeliveryPersonnelProfile, ReceptionistProfile, ShiftRoster, CRMCallLog, OnlineCustomerProfile, ProofOfDelivery
 from .forms import MealForm, FeedbackForm
 from .utils import (
     is_customer_birthday,
+    parse_date_range,
     remember_customer_session,
     get_remembered_customer,
     was_greeted_today
 )
 from .serializers import (
-    FeedbackSerializer, OrderSerializer,
+    FeedbackSerializer, OrderSerializer, BulkOrderSerializer, LocationBatchSerializer,
     MealWithFeedbackSerializer, 
-    MealSerializer, ReceptionistProfileSerializer, CRMCallLogSerializer, ShiftRosterSerializer,
-    ClockInRecordSerializer, OnsiteCustomerProfileSerializer,
-    DeliveryProfileSerializer, OnlineCustomerProfileSerializer,
+    MealSerializer, ReceptionistProfileSerializer, CRMCallLogSerializer, CRMCallLogSearchSerializer, CRMFollowUpSerializer, ShiftRosterSerializer,
+    ClockInRecordSerializer, OnsiteCustomerProfileSerializer, RosterTemplateSerializer,
+    DeliveryProfileSerializer, OnlineCustomerProfileSerializer, ProofOfDeliverySerializer,
 )
 
 # ======================
@@ -60,6 +92,43 @@ class DeliveryPersonnelProfileView(APIView):
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
+# Courier location ingestion (buffered, flushed in bulk by core/locations.py)
+class CourierLocationView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != 'delivery':
+            return Response({'error': 'Only delivery personnel can report locations'}, status=403)
+
+        serializer = LocationBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        pings = serializer.validated_data['pings']
+        now = timezone.now()
+        for ping in pings:
+            ping.setdefault('recorded_at', now)
+
+        latest = get_location_buffer().ingest(request.user.id, pings)
+        if latest is not None:
+            get_dispatcher().move_courier(request.user.id, (latest['lat'], latest['lng']))
+        return Response({'accepted': len(pings)}, status=202)
+
+    def get(self, request):
+        if request.user.role not in ['admin', 'waiter', 'manager', 'delivery']:
+            return Response({'error': 'Access denied'}, status=403)
+
+        courier_ids = None
+        if request.user.role == 'delivery':
+            courier_ids = [request.user.id]
+        elif request.GET.get('courier'):
+            courier_ids = [int(c) for c in request.GET['courier'].split(',') if c.isdigit()]
+
+        positions = get_location_buffer().snapshot(courier_ids)
+        return Response([
+            {'courier': uid, 'lat': lat, 'lng': lng, 'recorded_at': recorded_at}
+            for uid, (lat, lng, recorded_at) in positions.items()
+        ])
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_delivery_person(request):
@@ -75,6 +144,8 @@ def register_delivery_person(request):
     return Response({"message": "Delivery personnel registered successfully."}, status=201)
 
 # Clock Management
+# Both are one statement each; the clockin_one_open_shift partial unique index
+# decides races between double taps
 class ClockInView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -82,11 +153,11 @@ class ClockInView(APIView):
         if request.user.role != 'waiter':
             return Response({'error': 'Only waiters can clock in'}, status=403)
 
-        active_shift = ClockInRecord.objects.filter(waiter=request.user, clock_out_time__isnull=True).first()
-        if active_shift:
+        try:
+            with transaction.atomic():
+                ClockInRecord.objects.create(user=request.user)
+        except IntegrityError:
             return Response({'error': 'Already clocked in. Please clock out first.'}, status=400)
-
-        record = ClockInRecord.objects.create(waiter=request.user)
         return Response({'message': 'Clock-in successful'}, status=201)
 
 class ClockOutView(APIView):
@@ -96,24 +167,33 @@ class ClockOutView(APIView):
         if request.user.role != 'waiter':
             return Response({'error': 'Only waiters can clock out'}, status=403)
 
-        active_shift = ClockInRecord.objects.filter(waiter=request.user, clock_out_time__isnull=True).first()
-        if not active_shift:
+        closed = ClockInRecord.objects.filter(user=request.user, clock_out_time__isnull=True).update(
+            clock_out_time=timezone.now()
+        )
+        if not closed:
             return Response({'error': 'No active shift to clock out from'}, status=400)
-
-        active_shift.clock_out_time = timezone.now()
-        active_shift.save()
         return Response({'message': 'Clock-out successful'}, status=200)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def current_shifts(request):
     active_shifts = ClockInRecord.objects.filter(
-        waiter=request.user,
+        user=request.user,
         clock_out_time__isnull=True
     )
     serializer = ClockInRecordSerializer(active_shifts, many=True)
     return Response(serializer.data)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def clock_out_everyone(request):
+    """End of day: closes every open shift with a single UPDATE."""
+    if request.user.role != 'admin':
+        return Response({'error': 'Access denied'}, status=403)
+
+    closed = close_open_shifts()
+    return Response({'message': f'Clocked out {closed} staff.', 'clocked_out': closed})
+
 # Orders
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -134,20 +214,66 @@ def place_order(request):
     )
     return Response({'message': 'Order placed successfully', 'order_id': order.id}, status=201)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def place_bulk_order(request):
+    if request.user.role not in ['online_customer', 'onsite_customer']:
+        return Response({'error': 'Only customers can place orders'}, status=403)
+
+    serializer = BulkOrderSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    items = serializer.validated_data['items']
+
+    meal_ids = {item['meal_id'] for item in items}
+    is_delivery = request.user.role == 'online_customer'
+    orders = [
+        Order(customer=request.user, meal_id=item['meal_id'], is_delivery=is_delivery)
+        for item in items
+        for _ in range(item['quantity'])
+    ]
+    with transaction.atomic():
+        # Check every requested meal in one query, locking them (in id order) so none
+        # can be withdrawn between the check and the insert
+        available = set(
+            Meal.objects.select_for_update().filter(id__in=meal_ids, is_available=True)
+            .order_by('id').values_list('id', flat=True)
+        )
+        unavailable = sorted(meal_ids - available)
+        if unavailable:
+            return Response({'error': 'Some meals are unavailable', 'meal_ids': unavailable}, status=400)
+
+        created = Order.objects.bulk_create(orders)
+        # bulk_create skips model signals, so update stats and the order board here
+        bump({'orders': len(created)})
+        transaction.on_commit(lambda: [publish_order_event(o, 'order.created') for o in created])
+
+    return Response({
+        'message': 'Orders placed successfully',
+        'order_ids': [order.id for order in created],
+    }, status=201)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_orders(request):
-    orders = Order.objects.filter(customer=request.user).order_by('-created_at')
+    # values() joins meal and feedback in the same query and skips model instantiation
+    orders = Order.objects.filter(customer=request.user).values(
+        'id', 'status', 'created_at',
+        meal_name=models.F('meal__name'),
+        tip=Coalesce('feedback__tip', Decimal('0')),
+    )
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(orders, request)
     data = [
         {
-            'id': o.id,
-            'meal': o.meal.name,
-            'status': o.status,
-            'created_at': o.created_at,
-            'tip': getattr(o.feedback, 'tip', 0)
-        } for o in orders
+            'id': o['id'],
+            'meal': o['meal_name'],
+            'status': o['status'],
+            'created_at': o['created_at'],
+            'tip': o['tip'],
+        } for o in page
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
@@ -157,10 +283,52 @@ def mark_order_delivered(request, order_id):
     except Order.DoesNotExist:
         return Response({'error': 'Order not found or not assigned to you'}, status=404)
 
-    order.status = 'delivered'
-    order.save()
+    try:
+        apply_transition(order, 'delivered', actor=request.user, delivery_person=request.user)
+    except IllegalTransition as e:
+        return Response({'error': str(e)}, status=400)
+    except TransitionConflict as e:
+        return Response({'error': str(e)}, status=409)
     return Response({'message': 'Order marked as delivered'})
 
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def update_order_status(request, order_id):
+    if request.user.role not in ['waiter', 'cook', 'manager', 'admin']:
+        return Response({'error': 'Not authorized to update orders.'}, status=403)
+
+    try:
+        order = Order.objects.get(id=order_id)
+    except Order.DoesNotExist:
+        return Response({'error': 'Order not found'}, status=404)
+
+    # Clients may send the status they last saw; a stale view then gets 409 instead of overwriting
+    expected = request.data.get('expected_status')
+    if expected and expected != order.status:
+        return Response({'error': 'Order was updated by someone else, reload and try again.',
+                         'status': order.status}, status=409)
+
+    try:
+        apply_transition(order, request.data.get('status'), actor=request.user)
+    except IllegalTransition as e:
+        return Response({'error': str(e), 'allowed': Order.STATUS_TRANSITIONS.get(order.status, [])}, status=400)
+    except TransitionConflict as e:
+        return Response({'error': str(e)}, status=409)
+    return Response({'message': 'Order status updated', 'status': order.status})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def run_dispatch(request):
+    if request.user.role != 'admin':
+        return Response({"error": "Access denied"}, status=403)
+
+    # Assigns every ready, unassigned delivery order in one balanced batch
+    assignments = get_dispatcher().dispatch()
+    return Response({
+        'assigned': len(assignments),
+        'assignments': [{'order_id': o, 'delivery_person_id': c} for o, c in assignments.items()],
+    })
+
 # Feedback
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -182,9 +350,11 @@ def leave_feedback(request, order_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def meal_feedback(request, meal_id):
-    feedbacks = Feedback.objects.filter(meal_id=meal_id)
-    serializer = FeedbackSerializer(feedbacks, many=True)
-    return Response(serializer.data)
+    feedbacks = Feedback.objects.filter(meal_id=meal_id).select_related('customer')
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(feedbacks, request)
+    serializer = FeedbackSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 class IsReceptionistOrAdmin(permissions.BasePermission):
@@ -225,34 +395,140 @@ class ShiftRosterViewSet(viewsets.ModelViewSet):
     queryset = ShiftRoster.objects.all()
     serializer_class = ShiftRosterSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ShiftRosterCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'admin':
-            return ShiftRoster.objects.all()
+            return ShiftRoster.objects.select_related('receptionist')
         elif user.role == 'receptionist':
-            return ShiftRoster.objects.filter(receptionist__user=user)
+            return ShiftRoster.objects.filter(receptionist__user=user).select_related('receptionist')
         return ShiftRoster.objects.none()
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Expands a week/month template into shifts for [start_date, end_date]
+        and inserts them all in one transaction, or none if any overlap.
+        """
+        if request.user.role != 'admin':
+            return Response({'error': 'Access denied'}, status=403)
+
+        serializer = RosterTemplateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        rows = expand_template(data['start_date'], data['end_date'], data['entries'])
+        try:
+            created = create_roster(rows, replace=data['replace'])
+        except RosterConflict as e:
+            return Response({
+                'error': 'Overlapping shifts, nothing was saved.',
+                'conflicts': [{'shift': describe(shift), 'overlaps': describe(other)} for shift, other in e.conflicts],
+            }, status=409)
+        return Response({
+            'created': len(created),
+            'start_date': data['start_date'],
+            'end_date': data['end_date'],
+        }, status=201)
+
 
 class CRMCallLogViewSet(viewsets.ModelViewSet):
     queryset = CRMCallLog.objects.all()
     serializer_class = CRMCallLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    lookup_value_regex = r'\d+'
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'admin':
-            return CRMCallLog.objects.all()
+            return CRMCallLog.objects.select_related('receptionist')
         elif user.role == 'receptionist':
-            return CRMCallLog.objects.filter(receptionist__user=user)
+            return CRMCallLog.objects.filter(receptionist__user=user).select_related('receptionist')
         return CRMCallLog.objects.none()
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Ranked full-text search over names, reasons and notes: ?q=words or "a phrase"."""
+        text = request.GET.get('q', '').strip()
+        if not text:
+            return Response({'error': 'Query parameter q is required'}, status=400)
+        try:
+            limit = min(int(request.GET.get('limit', 50)), 200)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=400)
+
+        results = search_call_logs(text, self.get_queryset(), limit=limit)
+        return Response({'query': text, 'results': CRMCallLogSearchSerializer(results, many=True).data})
+
+    # Follow-up queue (core/crm.py), shared by all receptionists
+    def follow_up_receptionist(self, request):
+        """The acting receptionist; admins may act for one with ?receptionist=<id>."""
+        if request.user.role == 'receptionist':
+            return ReceptionistProfile.objects.filter(user=request.user).first()
+        if request.user.role == 'admin':
+            return ReceptionistProfile.objects.filter(pk=request.GET.get('receptionist') or None).first()
+        return None
+
+    @action(detail=False, methods=['get'], url_path='follow-ups')
+    def follow_ups(self, request):
+        """Open follow-ups due today or overdue that nobody else is working on."""
+        receptionist = self.follow_up_receptionist(request)
+        if receptionist is None:
+            return Response({'error': 'Receptionist profile required'}, status=403)
+        logs = due_follow_ups(receptionist)
+        return Response({'date': timezone.localdate(), 'results': CRMFollowUpSerializer(logs, many=True).data})
+
+    def follow_up_action(self, request, pk, change, conflict):
+        receptionist = self.follow_up_receptionist(request)
+        if receptionist is None:
+            return Response({'error': 'Receptionist profile required'}, status=403)
+        if not change(pk, receptionist):
+            return Response({'error': conflict}, status=409)
+        log = CRMCallLog.objects.select_related('receptionist', 'follow_up_claimed_by').get(pk=pk)
+        return Response(CRMFollowUpSerializer(log).data)
+
+    @action(detail=True, methods=['post'], url_path='follow-up/claim')
+    def claim_follow_up(self, request, pk=None):
+        return self.follow_up_action(request, pk, claim_follow_up, 'Follow-up is not due, already done or claimed by someone else')
+
+    @action(detail=True, methods=['post'], url_path='follow-up/release')
+    def release_follow_up(self, request, pk=None):
+        return self.follow_up_action(request, pk, release_follow_up, 'You do not hold this follow-up')
+
+    @action(detail=True, methods=['post'], url_path='follow-up/complete')
+    def complete_follow_up(self, request, pk=None):
+        return self.follow_up_action(request, pk, complete_follow_up, 'Claim the follow-up before completing it')
+
+
+# Caller lookup for incoming calls (core/crm.py)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def caller_lookup(request):
+    if request.user.role not in ['receptionist', 'admin']:
+        return Response({'error': 'Access denied'}, status=403)
+
+    result = lookup_caller(request.GET.get('phone', ''))
+    if result is None:
+        return Response({'error': 'Enter a valid phone number'}, status=400)
+    return Response(result)
+
 
 # Proof of Delivery Upload
 class UploadProofView(APIView):
+    """
+    Courier uploads a proof-of-delivery photo as multipart field `image`
+    (plus optional `notes`). The file is streamed to disk and hashed by
+    HashingUploadHandler; identical re-uploads return the existing proof.
+    """
     permission_classes = [IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [MultiPartParser]
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Must be in place before anything reads the body
+        self.upload_handler = HashingUploadHandler(request)
+        request.upload_handlers = [self.upload_handler]
+        return super().initialize_request(request, *args, **kwargs)
 
     def post(self, request, order_id):
         try:
@@ -260,17 +536,22 @@ class UploadProofView(APIView):
         except Order.DoesNotExist:
             return Response({'error': 'Order not found or not assigned to you'}, status=404)
 
-        serializer = FeedbackSerializer(order, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response({'message': 'Proof uploaded successfully'})
-        return Response(serializer.errors, status=400)
+        upload = request.FILES.get('image')
+        if self.upload_handler.too_large:
+            return Response({'error': f'Image must be at most {self.upload_handler.max_bytes // 1024} KB'}, status=413)
+        extension = image_extension(upload) if upload is not None else None
+        if extension is None:
+            return Response({'error': 'Attach a JPEG, PNG, GIF or WebP image as "image"'}, status=400)
+
+        proof, created = save_proof(order, upload, extension, request.data.get('notes') or None)
+        return Response(ProofOfDeliverySerializer(proof).data, status=201 if created else 200)
 
 
 class OnlineCustomerProfileListCreateView(generics.ListCreateAPIView):
     queryset = OnlineCustomerProfile.objects.all()
     serializer_class = OnlineCustomerProfileSerializer
     permission_classes = [permissions.AllowAny]  #  later restrict this
+    pagination_class = MemberSinceCursorPagination
 
 class OnlineCustomerProfileDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = OnlineCustomerProfile.objects.all()
@@ -288,26 +569,100 @@ def role_report_view(request):
     if role not in dict(User.ROLE_CHOICES):
         return Response({"error": "Invalid role"}, status=400)
 
-    users = User.objects.filter(role=role)
-    data = []
+    try:
+        start, end = parse_date_range(request.GET)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    order_filter = models.Q()
+    if start:
+        order_filter &= models.Q(order__created_at__gte=start)
+    if end:
+        order_filter &= models.Q(order__created_at__lt=end)
+
+    # One grouped query, streamed row by row so memory stays flat
+    rows = (
+        User.objects.filter(role=role)
+        .order_by('id')
+        .values('id', 'email')
+        .annotate(
+            total_orders=models.Count('order', filter=order_filter, distinct=True),
+            total_tips=models.Sum('order__feedback__tip', filter=order_filter),
+        )
+        .iterator(chunk_size=2000)
+    )
+
+    def stream():
+        user_count = 0
+        yield '{"role": %s, ' % json.dumps(role)
+        yield '"start": %s, "end": %s, "report": [' % (
+            json.dumps(start.isoformat() if start else None),
+            json.dumps(end.isoformat() if end else None),
+        )
+        for row in rows:
+            yield (", " if user_count else "") + json.dumps({
+                "id": row['id'],
+                "email": row['email'],
+                "total_orders": row['total_orders'],
+                "total_tips": float(row['total_tips'] or 0),
+            })
+            user_count += 1
+        yield '], "user_count": %d}' % user_count
 
-    for user in users:
-        user_orders = Order.objects.filter(customer=user)
-        total_orders = user_orders.count()
-        total_tips = user_orders.aggregate(total=models.Sum('feedback__tip'))['total'] or 0
+    return StreamingHttpResponse(stream(), content_type='application/json')
 
-        data.append({
-            "name": user.get_full_name(),
-            "email": user.email,
-            "total_orders": total_orders,
-            "total_tips": float(total_tips),
-        })
 
+# Bulk import/export (core/bulk.py)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def bulk_import(request, dataset):
+    """
+    Imports an uploaded `file` (.csv with a header row, or .ndjson) in chunks.
+    Valid rows are created, invalid ones reported by line.
+    """
+    if request.user.role != 'admin':
+        return Response({'error': 'Access denied'}, status=403)
+    if dataset not in DATASETS:
+        return Response({'error': f'Unknown dataset, choose one of {", ".join(DATASETS)}'}, status=404)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload the data as multipart field "file"'}, status=400)
+    fmt = format_for(upload.name)
+    if fmt is None:
+        return Response({'error': 'File must be .csv, .ndjson or .jsonl'}, status=400)
+
+    bad_line = first_undecodable_line(upload.file)
+    if bad_line is not None:
+        return Response({'error': f'Line {bad_line} is not valid UTF-8; save the file as UTF-8 and upload it again'}, status=400)
+
+    lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    rows = created = 0
+    failed = []
+    for report in import_records(DATASETS[dataset], read_records(lines, fmt)):
+        rows += report['rows']
+        created += report['created']
+        if report['errors']:
+            failed.append(report)
     return Response({
-        "role": role,
-        "user_count": users.count(),
-        "report": data
-    })
+        'dataset': dataset,
+        'rows': rows,
+        'created': created,
+        'failed': rows - created,
+        'chunks_with_errors': failed,
+    }, status=201 if created else 400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bulk_export(request, dataset, fmt):
+    if request.user.role != 'admin':
+        return Response({'error': 'Access denied'}, status=403)
+    if dataset not in DATASETS or fmt not in FORMATS:
+        return Response({'error': f'Export one of {", ".join(DATASETS)} as .csv or .ndjson'}, status=404)
+    response = StreamingHttpResponse(export_lines(DATASETS[dataset], fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -315,30 +670,115 @@ def admin_stats_view(request):
     if request.user.role != 'admin':
         return Response({"error": "Access denied"}, status=403)
 
-    total_users = User.objects.count()
-    users_by_role = User.objects.values('role').order_by().annotate(count=models.Count('id'))
-    user_roles_dict = {item['role']: item['count'] for item in users_by_role}
+    # Served from the incrementally maintained rollup (core/stats.py)
+    return Response(get_stats())
+
+# Shift analytics: hours, weekly overtime and 15-minute headcount (core/shifts.py)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def shift_analytics_view(request):
+    if request.user.role != 'admin':
+        return Response({"error": "Access denied"}, status=403)
+
+    try:
+        start, end = parse_date_range(request.GET)
+        user_ids = [int(pk) for pk in request.GET.getlist('user')] or None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    end = end or timezone.now()
+    start = start or end - timedelta(days=7)
+    if start >= end:
+        return Response({"error": "start must be before end"}, status=400)
+
+    return Response(shift_report(start, end, user_ids))
+
+# Sales rollups (core/sales.py)
+SALES_JSON_MAX_ROWS = 10000
+
+
+def sales_params(params):
+    """Validated sales_report() arguments from query params; raises ValueError."""
+    start, end = parse_date_range(params)
+    end = end or timezone.now()
+    start = start or end - timedelta(days=7)
+    if start >= end:
+        raise ValueError("start must be before end")
+    period = params.get('period', 'day')
+    if period not in SALES_PERIODS:
+        raise ValueError(f"period must be one of {', '.join(SALES_PERIODS)}")
+    group = [name for value in params.getlist('group') for name in value.split(',') if name]
+    unknown = set(group) - set(SALES_GROUPS)
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(sorted(unknown))}")
+    try:
+        meals = [int(pk) for pk in params.getlist('meal')]
+        staff = [int(pk) for pk in params.getlist('staff')]
+    except ValueError:
+        raise ValueError("meal and staff must be ids") from None
+    return {'start': start, 'end': end, 'period': period, 'group': list(dict.fromkeys(group)), 'meals': meals, 'staff': staff}
 
-    total_orders = Order.objects.count()
-    total_meals = Meal.objects.count()
-    total_feedback = Feedback.objects.count()
-    total_tips = Feedback.objects.aggregate(total=models.Sum('tip'))['total'] or 0
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sales_report_view(request):
+    """Orders, revenue and tips per hour or day, optionally per meal and/or courier."""
+    if request.user.role != 'admin':
+        return Response({"error": "Access denied"}, status=403)
+    try:
+        options = sales_params(request.GET)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    rows = list(sales_report(**options)[:SALES_JSON_MAX_ROWS + 1])
+    if len(rows) > SALES_JSON_MAX_ROWS:
+        return Response({"error": "Too many rows for JSON, use /api/admin/sales.csv or a coarser period"}, status=400)
     return Response({
-        "total_users": total_users,
-        "users_by_role": user_roles_dict,
-        "total_orders": total_orders,
-        "total_meals": total_meals,
-        "total_feedback": total_feedback,
-        "total_tips": f"{total_tips:.2f}"
+        'start': options['start'],
+        'end': options['end'],
+        'period': options['period'],
+        'group': options['group'],
+        'rows': rows,
+        'totals': {
+            'orders': sum(row['orders'] for row in rows),
+            'revenue': sum((row['revenue'] for row in rows), Decimal(0)),
+            'tips': sum((row['tips'] for row in rows), Decimal(0)),
+        },
     })
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sales_report_csv(request):
+    """The same report as CSV, streamed, for ranges too large for JSON."""
+    if request.user.role != 'admin':
+        return Response({"error": "Access denied"}, status=403)
+    try:
+        options = sales_params(request.GET)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    response = StreamingHttpResponse(report_csv(sales_report(**options), options['group']), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="sales-{options["period"]}.csv"'
+    return response
+
+# Menu snapshot (cached, versioned with a strong ETag)
+def menu_response(request):
+    # A matching ETag is answered from the cached version: no query, no serialization
+    version = get_menu_version()
+    etag = menu_etag(version)
+    client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in client_etags or '*' in client_etags:
+        return Response(status=304, headers={'ETag': etag})
+
+    version, payload = get_menu_snapshot(version)
+    return Response(payload, headers={'ETag': etag})
+
 # Meal Availability Toggle
 @api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
 def available_meals(request):
-    meals = Meal.objects.filter(is_available=True)
-    serializer = MealSerializer(meals, many=True)
-    return Response(serializer.data)
+    return menu_response(request)
 
 
 @api_view(['PATCH'])
@@ -375,10 +815,58 @@ def toggle_meal_availability(request, meal_id):
         return Response({'error': 'Meal not found.'}, status=404)
 
 @api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
 def public_menu(request):
-    meals = Meal.objects.filter(is_available=True)
-    serializer = MealSerializer(meals, many=True)
-    return Response(serializer.data)
+    return menu_response(request)
+
+# Uploaded media (meals/, proofs/, delivery_profiles/, receptionists/, thumbs/)
+PRIVATE_MEDIA = ('proofs/', 'thumbs/proofs/')
+
+
+def can_view_proof(user, path):
+    """Proof photos (and their thumbnails) are for the order's customer, its courier and admins."""
+    if user.role == 'admin':
+        return True
+    if path.startswith('thumbs/'):
+        # Thumbnails have their own content-addressed names, recorded in the proof's meta
+        match = Q(meta_text__contains=json.dumps(path))
+    else:
+        match = Q(image=path)
+    return ProofOfDelivery.objects.annotate(
+        meta_text=Cast('image_meta', models.TextField()),
+    ).filter(match, Q(order__customer=user) | Q(order__delivery_person=user)).exists()
+
+
+def media_file(request, path):
+    """
+    Serves an upload from MEDIA_ROOT. Content-addressed names (core/storage.py)
+    never change content, so they are cacheable forever; legacy names get an hour.
+    Proof photos need a token or session allowed to see them, and stay out of shared caches.
+    """
+    # Checked before serve() normalizes the path: meals/../proofs/... must not slip past the proof check
+    segments = path.split('/')
+    if path.startswith('/') or any(segment in ('', '.', '..') for segment in segments):
+        raise Http404("Invalid media path")
+    path = posixpath.normpath(path)
+    private = path.startswith(PRIVATE_MEDIA)
+    if private:
+        # A plain view, so authenticate the way the API does (token or session)
+        try:
+            user = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]).user
+        except AuthenticationFailed:
+            user = None
+        if user is None or not user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        if not can_view_proof(user, path):
+            return JsonResponse({'error': 'Access denied'}, status=403)
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    scope = 'private' if private else 'public'
+    if is_content_addressed(path):
+        response['Cache-Control'] = f"{scope}, max-age={settings.MEDIA_CACHE_SECONDS}, immutable"
+    else:
+        response['Cache-Control'] = f"{scope}, max-age=3600"
+    return response
 
 # ======================
 # LEGACY TEMPLATE VIEWS (Template-based)
@@ -476,17 +964,51 @@ def leave_feedback(request, order_id):
 # Admin Views
 @staff_member_required
 def admin_orders_view(request):
-    orders = Order.objects.all().order_by('-created_at')
-
     if request.method == 'POST':
         order_id = request.POST.get('order_id')
         new_status = request.POST.get('status')
         order = get_object_or_404(Order, id=order_id)
-        order.status = new_status
-        order.save()
-        return redirect('admin_orders')
-
-    return render(request, 'core/admin_orders.html', {'orders': orders})
+        # The form carries the status the row was rendered with
+        expected = request.POST.get('expected_status')
+        try:
+            if expected and expected != order.status:
+                raise TransitionConflict("Order was updated by someone else, reload and try again.")
+            apply_transition(order, new_status, actor=request.user)
+        except (IllegalTransition, TransitionConflict) as e:
+            messages.error(request, f"Order #{order.id}: {e}")
+        return redirect(request.get_full_path())
+
+    # One joined query per page; rows are fragment-cached in the template
+    orders = Order.objects.select_related('customer', 'meal', 'feedback').order_by('-created_at')
+
+    status_filter = request.GET.get('status')
+    if status_filter:
+        orders = orders.filter(status=status_filter)
+    try:
+        start, end = parse_date_range(request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
+        start = end = None
+    if start:
+        orders = orders.filter(created_at__gte=start)
+    if end:
+        orders = orders.filter(created_at__lt=end)
+
+    paginator = Paginator(orders, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Keep the filters on the pagination links
+    query = request.GET.copy()
+    query.pop('page', None)
+
+    return render(request, 'core/admin_orders.html', {
+        'page_obj': page_obj,
+        'status_choices': Order.STATUS_CHOICES,
+        'status_filter': status_filter or '',
+        'start': request.GET.get('start', ''),
+        'end': request.GET.get('end', ''),
+        'filter_query': query.urlencode(),
+    })
 
 
 @staff_member_required
@@ -533,7 +1055,7 @@ def waiter_dashboard(request):
     if request.user.role != 'waiter':
         return Response({"error": "Access denied"}, status=403)
 
-    meals = Meal.objects.all()
+    meals = Meal.objects.with_feedback_summary()
     serializer = MealWithFeedbackSerializer(meals, many=True)
     return Response(serializer.data)
 
@@ -569,6 +1091,11 @@ class OnsiteCustomerProfileViewSet(viewsets.ModelViewSet):
 class AvailableMealListView(generics.ListAPIView):
     queryset = Meal.objects.filter(is_available=True)
     serializer_class = MealSerializer
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        return menu_response(request)
 
 class FeedbackCreateView(generics.CreateAPIView):
     queryset = Feedback.objects.all()
@@ -578,6 +1105,7 @@ class FeedbackCreateView(generics.CreateAPIView):
 class CustomerOrderHistoryView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return Order.objects.filter(customer=self.request.user).order_by('-created_at')
@@ -596,14 +1124,15 @@ class ChangeDeliveryPersonView(APIView):
             new_delivery_id = request.data.get('new_delivery_personnel_id')
             new_delivery = User.objects.get(id=new_delivery_id, role='delivery')
 
-            order.delivery_personnel = new_delivery
-            order.save()
+            reassign_courier(order, new_delivery, actor=request.user)
 
             return Response({'message': 'Delivery person updated successfully.'})
         except Order.DoesNotExist:
             return Response({'error': 'Order not found.'}, status=404)
         except User.DoesNotExist:
             return Response({'error': 'New delivery person not found.'}, status=404)
+        except TransitionConflict as e:
+            return Response({'error': str(e)}, status=409)
 
 
 @api_view(['GET'])
@@ -634,11 +1163,11 @@ def give_feedback(request, order_id):
 @permission_classes([IsAuthenticated])
 def change_delivery_person(request, order_id):
     try:
-        order = Order.objects.get(id=order_id, user=request.user)
+        order = Order.objects.get(id=order_id, customer=request.user)
     except Order.DoesNotExist:
         return Response({"error": "Order not found."}, status=404)
 
-    if order.status != 'Pending':
+    if order.status != 'pending':
         return Response({"error": "You can only change delivery person for pending orders."}, status=400)
 
     new_delivery_id = request.data.get("delivery_person_id")
@@ -650,8 +1179,10 @@ def change_delivery_person(request, order_id):
     except User.DoesNotExist:
         return Response({"error": "Invalid delivery person ID."}, status=404)
 
-    order.delivery_person = new_delivery
-    order.save()
+    try:
+        reassign_courier(order, new_delivery, actor=request.user)
+    except TransitionConflict as e:
+        return Response({"error": str(e)}, status=409)
     return Response({"message": "Delivery person updated successfully."})
 
 
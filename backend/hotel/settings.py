@@ -56,6 +56,13 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hotel.wsgi.application'
+ASGI_APPLICATION = 'hotel.asgi.application'
+
+# Kitchen pickup point used by the courier dispatcher (core/dispatch.py), as "lat,lng"
+DISPATCH_PICKUP_LOCATION = '-1.2921,36.8219'
+
+# Pub/sub behind the /ws/orders/ board; point at another broker class to fan out across processes
+ORDER_EVENTS_BROKER = 'core.realtime.InProcessBroker'
 
 # Database
 DATABASES = {
@@ -65,6 +72,14 @@ DATABASES = {
     }
 }
 
+# Cache (menu snapshots etc.) - swap for Redis/Memcached in production
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hotel-cache',
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -89,6 +104,20 @@ USE_TZ = True
 
 # Static files
 STATIC_URL = 'static/'
+
+# Uploaded images (meals/, proofs/, delivery_profiles/, receptionists/)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploads are stored under their SHA-256 (core/storage.py) and served as immutable
+STORAGES = {
+    'default': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_CACHE_SECONDS = 60 * 60 * 24 * 365
+
+# Background thumbnail workers (core/images.py)
+IMAGE_WORKERS = 2
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -16,13 +16,15 @@ Including another URLconf
 """
 
 from django.contrib import admin
-from django.urls import path, include
-from core.views import admin_orders_view
+from django.urls import path, re_path, include
+from core.views import admin_orders_view, media_file
 
 urlpatterns = [
     path('', include('core.urls')),
      path('api/', include('core.urls')),
     path('admin/', admin.site.urls),
+    # Only the upload directories, never arbitrary files under MEDIA_ROOT (no empty, . or .. segments)
+    re_path(r'^media/(?P<path>(?!.*/\.{0,2}(?:/|$))(?:thumbs/)?(?:meals|proofs|delivery_profiles|receptionists)/.+)$', media_file),
 
 ]
 